@@ -1332,7 +1332,7 @@ class AdminApp(QMainWindow):
     def load_product_image_preview(self, image_id, preview_label):
         """Загружает изображение товара для предпросмотра"""
         try:
-            response = requests.get(f"{self.base_url}/images/{image_id}")
+            response = requests.get(f"{self.base_url}/images/{image_id}", params={"w": 300})
             if response.status_code == 200:
                 pixmap = QPixmap()
                 pixmap.loadFromData(response.content)
@@ -1922,6 +1922,11 @@ class AdminApp(QMainWindow):
         export_btn.clicked.connect(self.export_report_to_xlsx)  # Изменено на export_report_to_xlsx
         button_layout.addWidget(export_btn)
 
+        export_csv_btn = QPushButton("Выгрузить данные (CSV)")
+        export_csv_btn.setObjectName("exportButton")
+        export_csv_btn.clicked.connect(self.export_data_to_csv)
+        button_layout.addWidget(export_csv_btn)
+
         layout.addLayout(button_layout)
 
         # Report preview area
@@ -2044,6 +2049,44 @@ class AdminApp(QMainWindow):
                     QMessageBox.StandardButton.Ok
                 )
 
+    def export_data_to_csv(self):
+        """Скачивает данные выбранного отчета с сервера в CSV, не загружая их в память"""
+        tables = {
+            "Отчет по продажам": "orders",
+            "Отчет по возвратам": "returns",
+            "Отчет по товарам": "products",
+            "Отчет по клиентам": "users",
+        }
+        table = tables.get(self.report_type_combo.currentText())
+        if table is None:
+            QMessageBox.warning(self, "Ошибка", "Для этого отчета выгрузка в CSV недоступна.")
+            return
+
+        file_name, _ = QFileDialog.getSaveFileName(self, "Выгрузка в CSV", f"{table}.csv", "CSV Files (*.csv)")
+        if not file_name:
+            return
+        if not file_name.endswith('.csv'):
+            file_name += '.csv'
+
+        params = {"bom": True}
+        # Товары и клиенты выгружаются целиком, остальное — за выбранный период
+        if table in ("orders", "returns"):
+            params["date_from"] = self.report_date_from.date().toString("yyyy-MM-dd")
+            params["date_to"] = self.report_date_to.date().toString("yyyy-MM-dd")
+
+        try:
+            with requests.get(f"{self.base_url}/export/{table}.csv", params=params, stream=True) as response:
+                if response.status_code != 200:
+                    QMessageBox.critical(self, "Ошибка выгрузки", f"Ошибка сервера: {response.text}")
+                    return
+                with open(file_name, "wb") as file:
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        file.write(chunk)
+
+            QMessageBox.information(self, "Выгрузка завершена", f"Данные сохранены в {file_name}")
+        except (requests.exceptions.RequestException, OSError) as e:
+            QMessageBox.critical(self, "Ошибка выгрузки", f"Не удалось выгрузить данные: {str(e)}")
+
     def generate_report_from_data(self):
         """Генерирует отчет на основе данных из других вкладок"""
         report_type = self.report_type_combo.currentText()
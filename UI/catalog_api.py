@@ -0,0 +1,129 @@
+"""Общие для окон запросы каталога к API: загрузка изображений и синхронизация товаров."""
+import threading
+
+import requests
+from PySide6.QtCore import QThread, Signal
+from PySide6.QtGui import QPixmap, QImage, QImageReader
+
+try:
+    import msgpack  # Компактные ответы API, если пакет установлен
+except ImportError:
+    msgpack = None
+
+
+def iter_image_batch(content_type, body):
+    """Разбирает ответ /images/batch (multipart/mixed) по частям: (image_id, данные).
+    У каждой части есть заголовки Content-Length и X-Image-Id"""
+    boundary = content_type.split("boundary=", 1)[1].split(";", 1)[0].strip().strip('"')
+    boundary = ("--" + boundary).encode()
+    pos = 0
+    while True:
+        start = body.index(boundary, pos) + len(boundary)
+        if body.startswith(b"--", start):
+            break
+        header_end = body.index(b"\r\n\r\n", start)
+        headers = dict(line.split(": ", 1) for line in body[start + 2:header_end].decode().split("\r\n"))
+        pos = header_end + 4 + int(headers["Content-Length"])
+        yield int(headers["X-Image-Id"]), body[header_end + 4:pos]
+
+
+class CatalogApiThread(QThread):
+    """Основа ApiThread окон с каталогом: адрес API и загрузка изображений товаров"""
+    image_loaded = Signal(int, QPixmap)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.base_url = "http://127.0.0.1:8000"
+        # WebP запрашивается, только если в Qt есть модуль для его чтения
+        formats = [bytes(image_format) for image_format in QImageReader.supportedImageFormats()]
+        self.image_headers = {"Accept": "image/webp,*/*" if b"webp" in formats else "*/*"}
+
+    def fetch_image(self, image_id, width=None):
+        try:
+            # Сервер отдаёт готовое превью нужного размера вместо оригинала
+            params = {"w": width} if width else None
+            response = requests.get(f"{self.base_url}/images/{image_id}", params=params, headers=self.image_headers)
+            if response.status_code == 200:
+                image = QImage()
+                image.loadFromData(response.content)
+                pixmap = QPixmap.fromImage(image)
+                self.image_loaded.emit(image_id, pixmap)
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching image {image_id}: {e}")
+
+    def fetch_images(self, image_ids, width=None):
+        """Загружает изображения каталога пачками через /images/batch вместо запроса на каждое.
+        Если пачку получить или разобрать не удалось, оставшиеся изображения запрашиваются по одному"""
+        image_ids = list(dict.fromkeys(image_id for image_id in image_ids if image_id))
+        for offset in range(0, len(image_ids), 100):
+            batch = image_ids[offset:offset + 100]
+            params = {"ids": ",".join(map(str, batch))}
+            if width:
+                params["w"] = width
+            done = set()
+            try:
+                response = requests.get(f"{self.base_url}/images/batch", params=params, headers=self.image_headers)
+                content_type = response.headers.get("Content-Type", "")
+                if response.status_code == 200 and content_type.startswith("multipart/") and "boundary=" in content_type:
+                    # Ненайденные на сервере изображения повторно не запрашиваем
+                    done.update(int(image_id) for image_id in response.headers.get("X-Missing-Images", "").split(",")
+                                if image_id.strip().isdigit())
+                    for image_id, data in iter_image_batch(content_type, response.content):
+                        image = QImage()
+                        image.loadFromData(data)
+                        self.image_loaded.emit(image_id, QPixmap.fromImage(image))
+                        done.add(image_id)
+            except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+                print(f"Error fetching images: {e}")
+            for image_id in batch:
+                if image_id not in done:
+                    self.fetch_image(image_id, width)
+
+
+class ProductsSyncThread(QThread):
+    """Фоновая синхронизация каталога: запрашивает изменения с последней
+    известной версии, не блокируя окно, и передаёт только изменённые товары"""
+    products_changed = Signal(list, list)  # новые/изменённые товары, id удалённых
+
+    def __init__(self, base_url, interval=5, parent=None):
+        super().__init__(parent)
+        self.base_url = base_url
+        self.interval = interval
+        self.version = None
+        self._wake = threading.Event()
+
+    def refresh(self):
+        """Запросить изменения сейчас, не дожидаясь следующего опроса"""
+        self._wake.set()
+
+    def stop(self):
+        self.requestInterruption()
+        self._wake.set()
+        self.wait()
+
+    def run(self):
+        while not self.isInterruptionRequested():
+            # Запрос обновления во время загрузки не теряется: ожидание сразу завершится
+            self._wake.clear()
+            self.fetch_changes()
+            self._wake.wait(self.interval)
+
+    def fetch_changes(self):
+        try:
+            response = requests.get(
+                f"{self.base_url}/products/changes",
+                params={"since": self.version or 0},
+                headers={"Accept": "application/msgpack"} if msgpack else None,
+                timeout=10
+            )
+            if response.status_code == 200:
+                if response.headers.get('Content-Type') == "application/msgpack":
+                    changes = msgpack.unpackb(response.content)
+                else:
+                    changes = response.json()
+                first_load = self.version is None
+                self.version = changes['version']
+                if first_load or changes['changed'] or changes['deleted']:
+                    self.products_changed.emit(changes['changed'], changes['deleted'])
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching products: {e}")
@@ -1,3 +1,4 @@
+import base64
 import os
 import sys
 from datetime import datetime
@@ -8,41 +9,18 @@ from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                                QScrollArea, QStackedWidget, QSizePolicy, QDialog,
                                QGridLayout, QMessageBox, QLineEdit, QLayout, QTextEdit, QFormLayout, QComboBox,
                                QDialogButtonBox)
-from PySide6.QtCore import Qt, QSize, QThread, Signal, QTimer
-from PySide6.QtGui import QFont, QIcon, QPixmap, QImage, QDoubleValidator, QIntValidator, QAction
+from PySide6.QtCore import Qt, QSize, Signal, QTimer
+from PySide6.QtGui import QFont, QIcon, QPixmap, QDoubleValidator, QIntValidator, QAction
 
+from UI.catalog_api import CatalogApiThread, ProductsSyncThread
 
-class ApiThread(QThread):
-    products_loaded = Signal(list)
-    image_loaded = Signal(int, QPixmap)
+
+class ApiThread(CatalogApiThread):
     orders_loaded = Signal(list)
     individual_orders_loaded = Signal(list)
     order_updated = Signal(bool, str)
     product_updated = Signal(bool, str)
 
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.base_url = "http://127.0.0.1:8000"
-
-    def fetch_products(self):
-        try:
-            response = requests.get(f"{self.base_url}/products/get/all/")
-            if response.status_code == 200:
-                self.products_loaded.emit(response.json())
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching products: {e}")
-
-    def fetch_image(self, image_id):
-        try:
-            response = requests.get(f"{self.base_url}/images/{image_id}")
-            if response.status_code == 200:
-                image = QImage()
-                image.loadFromData(response.content)
-                pixmap = QPixmap.fromImage(image)
-                self.image_loaded.emit(image_id, pixmap)
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching image {image_id}: {e}")
-
     def fetch_orders(self):
         try:
             response = requests.get(f"{self.base_url}/orders/get/all/")
@@ -516,7 +494,6 @@ class JewelryStoreApp(QMainWindow):
 
         # API Thread
         self.api_thread = ApiThread()
-        self.api_thread.products_loaded.connect(self.display_products)
         self.api_thread.image_loaded.connect(self.update_product_image)
         self.api_thread.orders_loaded.connect(self.display_orders)
         self.api_thread.individual_orders_loaded.connect(self.display_individual_orders)
@@ -556,7 +533,13 @@ class JewelryStoreApp(QMainWindow):
         # Load data
         self.api_thread.fetch_orders()
         self.api_thread.fetch_individual_orders()
-        self.api_thread.fetch_products()
+
+        # Каталог подтягивает изменения каждые несколько секунд в отдельном потоке
+        self.product_cards = {}
+        self.no_products_label = None
+        self.products_sync = ProductsSyncThread(self.api_thread.base_url, parent=self)
+        self.products_sync.products_changed.connect(self.apply_product_changes)
+        self.products_sync.start()
 
     def create_sidebar(self, layout):
         sidebar = QFrame()
@@ -614,6 +597,7 @@ class JewelryStoreApp(QMainWindow):
 
     def closeEvent(self, event):
         """Обработчик события закрытия окна"""
+        self.products_sync.stop()
         self.api_thread.quit()
         event.accept()
 
@@ -702,7 +686,7 @@ class JewelryStoreApp(QMainWindow):
         refresh_btn = QPushButton("Обновить")
         refresh_btn.setIcon(QIcon("icons/refresh.png"))
         refresh_btn.setObjectName("refreshButton")
-        refresh_btn.clicked.connect(lambda: self.api_thread.fetch_products())
+        refresh_btn.clicked.connect(lambda: self.products_sync.refresh())
         title_layout.addWidget(refresh_btn)
 
         title_layout.addStretch()
@@ -944,101 +928,122 @@ class JewelryStoreApp(QMainWindow):
         # Добавляем растягивающий элемент в конец
         self.individual_orders_layout.addStretch()
 
-    def display_products(self, products):
-        # Clear existing products
-        while self.products_grid.count():
-            item = self.products_grid.takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
-
-        if not products:
-            no_products = QLabel("Нет товаров")
-            no_products.setFont(QFont('Montserrat', 14))
-            no_products.setStyleSheet("color: white;")
-            no_products.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.products_grid.addWidget(no_products, 0, 0)
-            return
-
-        row, col = 0, 0
+    def apply_product_changes(self, changed, deleted):
+        """Обновляет только карточки изменённых и удалённых товаров"""
+        for product_id in deleted:
+            self.remove_product_card(product_id)
+        for product in changed:
+            self.remove_product_card(product['product_id'])
+            self.product_cards[product['product_id']] = self.create_product_card(product)
+
+        self.layout_product_cards()
+        # Изображения загружаются только для новых карточек
+        self.api_thread.fetch_images([product["image_id"] for product in changed], 300)
+
+    def remove_product_card(self, product_id):
+        card = self.product_cards.pop(product_id, None)
+        if card is not None:
+            self.products_grid.removeWidget(card)
+            card.deleteLater()
+
+    def layout_product_cards(self):
+        """Расставляет карточки по порядку product_id; сами карточки не пересоздаются"""
         max_columns = 4  # Максимальное количество колонок
+        for card in self.product_cards.values():
+            self.products_grid.removeWidget(card)
+
+        if not self.product_cards:
+            if self.no_products_label is None:
+                self.no_products_label = QLabel("Нет товаров")
+                self.no_products_label.setFont(QFont('Montserrat', 14))
+                self.no_products_label.setStyleSheet("color: white;")
+                self.no_products_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+                self.products_grid.addWidget(self.no_products_label, 0, 0)
+            return
+        if self.no_products_label is not None:
+            self.products_grid.removeWidget(self.no_products_label)
+            self.no_products_label.deleteLater()
+            self.no_products_label = None
 
-        for product in products:
-            product_frame = QFrame()
-            product_frame.setObjectName("productFrame")
-            product_frame.setFixedWidth(300)  # Фиксированная ширина плитки
-
-            product_frame.setCursor(Qt.CursorShape.PointingHandCursor)
-
-            def make_click_handler(product_data):
-                def handler(event):
-                    self.edit_product(product_data)
-
-                return handler
-
-            product_frame.mousePressEvent = make_click_handler(product)
-
-            main_layout = QVBoxLayout(product_frame)
-            main_layout.setContentsMargins(0, 0, 0, 0)
-            main_layout.setSpacing(0)
-
-            # Image placeholder
-            image = QLabel()
-            image.setObjectName(f"image_{product['image_id']}")
-            image.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            image.setStyleSheet("""
-                background: #2a2a2a;
-                border-radius: 8px 8px 0 0;
-                min-height: 220px;
-                max-height: 220px;
-            """)
-
-            # Product info
-            info_frame = QFrame()
-            info_frame.setStyleSheet("background: #252525; border-radius: 0 0 8px 8px;")
-            info_layout = QVBoxLayout(info_frame)
-            info_layout.setContentsMargins(15, 15, 15, 15)
-            info_layout.setSpacing(10)
-
-            # Name and details
-            name = QLabel(product["name"])
-            name.setFont(QFont('Montserrat', 14, QFont.Weight.Bold))
-            name.setStyleSheet("color: white; margin-bottom: 5px;")
-            name.setWordWrap(True)
-
-            details = QLabel(f"{product['material']} · {product['weight']}г · {product['stock_quantity']} шт")
-            details.setFont(QFont('Montserrat', 12))
-            details.setStyleSheet("color: #aaaaaa; margin-bottom: 10px;")
+        for index, product_id in enumerate(sorted(self.product_cards)):
+            self.products_grid.addWidget(self.product_cards[product_id], index // max_columns, index % max_columns)
 
-            # Price
-            price = QLabel(f"{product['price']:,} ₽".replace(",", " "))
-            price.setFont(QFont('Montserrat', 16, QFont.Weight.Bold))
-            price.setStyleSheet("color: #d4af37; margin-bottom: 15px;")
+    def create_product_card(self, product):
+        product_frame = QFrame()
+        product_frame.setObjectName("productFrame")
+        product_frame.setFixedWidth(300)  # Фиксированная ширина плитки
 
-            info_layout.addWidget(name)
-            info_layout.addWidget(details)
-            info_layout.addWidget(price)
+        product_frame.setCursor(Qt.CursorShape.PointingHandCursor)
 
-            main_layout.addWidget(image)
-            main_layout.addWidget(info_frame)
+        def make_click_handler(product_data):
+            def handler(event):
+                self.edit_product(product_data)
 
-            self.products_grid.addWidget(product_frame, row, col)
+            return handler
 
-            col += 1
-            if col >= max_columns:
-                col = 0
-                row += 1
+        product_frame.mousePressEvent = make_click_handler(product)
 
-        # Load images for all products
-        for product in products:
-            self.api_thread.fetch_image(product["image_id"])
+        main_layout = QVBoxLayout(product_frame)
+        main_layout.setContentsMargins(0, 0, 0, 0)
+        main_layout.setSpacing(0)
 
-            # Добавляем контекстное меню
-            product_frame.setContextMenuPolicy(Qt.ContextMenuPolicy.ActionsContextMenu)
-            edit_action = QAction("Редактировать", product_frame)
-            edit_action.triggered.connect(lambda _, p=product: self.edit_product(p))
-            product_frame.addAction(edit_action)
+        # Image placeholder
+        image = QLabel()
+        image.setObjectName(f"image_{product['image_id']}")
+        image.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        image.setStyleSheet("""
+            background: #2a2a2a;
+            border-radius: 8px 8px 0 0;
+            min-height: 220px;
+            max-height: 220px;
+        """)
 
-            self.products_grid.addWidget(product_frame, row, col)
+        # Микропревью из списка товаров видно сразу, пока грузится само изображение
+        if product.get("image_placeholder"):
+            preview = QPixmap()
+            if preview.loadFromData(base64.b64decode(product["image_placeholder"].split(",", 1)[1])):
+                image.setPixmap(preview.scaled(
+                    300, 300,
+                    Qt.AspectRatioMode.KeepAspectRatio,
+                    Qt.TransformationMode.SmoothTransformation
+                ))
+
+        # Product info
+        info_frame = QFrame()
+        info_frame.setStyleSheet("background: #252525; border-radius: 0 0 8px 8px;")
+        info_layout = QVBoxLayout(info_frame)
+        info_layout.setContentsMargins(15, 15, 15, 15)
+        info_layout.setSpacing(10)
+
+        # Name and details
+        name = QLabel(product["name"])
+        name.setFont(QFont('Montserrat', 14, QFont.Weight.Bold))
+        name.setStyleSheet("color: white; margin-bottom: 5px;")
+        name.setWordWrap(True)
+
+        details = QLabel(f"{product['material']} · {product['weight']}г · {product['stock_quantity']} шт")
+        details.setFont(QFont('Montserrat', 12))
+        details.setStyleSheet("color: #aaaaaa; margin-bottom: 10px;")
+
+        # Price
+        price = QLabel(f"{product['price']:,} ₽".replace(",", " "))
+        price.setFont(QFont('Montserrat', 16, QFont.Weight.Bold))
+        price.setStyleSheet("color: #d4af37; margin-bottom: 15px;")
+
+        info_layout.addWidget(name)
+        info_layout.addWidget(details)
+        info_layout.addWidget(price)
+
+        main_layout.addWidget(image)
+        main_layout.addWidget(info_frame)
+
+        # Добавляем контекстное меню
+        product_frame.setContextMenuPolicy(Qt.ContextMenuPolicy.ActionsContextMenu)
+        edit_action = QAction("Редактировать", product_frame)
+        edit_action.triggered.connect(lambda _, p=product: self.edit_product(p))
+        product_frame.addAction(edit_action)
+
+        return product_frame
 
     def edit_product(self, product_data):
         dialog = QDialog(self)
@@ -1099,7 +1104,7 @@ class JewelryStoreApp(QMainWindow):
     def handle_product_updated(self, success, message):
         if success:
             QMessageBox.information(self, "Успех", message)
-            self.api_thread.fetch_products()  # Обновляем список
+            self.products_sync.refresh()  # Обновляем список
         else:
             QMessageBox.warning(self, "Ошибка", message)
 
@@ -1,3 +1,4 @@
+import base64
 import os
 import sys
 from datetime import datetime
@@ -7,38 +8,29 @@ from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                                QHBoxLayout, QPushButton, QLabel, QFrame,
                                QScrollArea, QStackedWidget, QSizePolicy, QDialog,
                                QGridLayout, QMessageBox, QLineEdit, QLayout, QTextEdit, QFormLayout, QComboBox)
-from PySide6.QtCore import Qt, QSize, QThread, Signal, QTimer
-from PySide6.QtGui import QFont, QIcon, QPixmap, QImage, QDoubleValidator, QIntValidator
+from PySide6.QtCore import Qt, QSize, Signal, QTimer
+from PySide6.QtGui import QFont, QIcon, QPixmap, QDoubleValidator, QIntValidator
 
+from UI.catalog_api import CatalogApiThread, ProductsSyncThread
 
-class ApiThread(QThread):
-    products_loaded = Signal(list)
-    image_loaded = Signal(int, QPixmap)
-    payment_success = Signal(bool, str)
-    order_created = Signal(bool, str)  # Новый сигнал для результата создания заказа
 
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.base_url = "http://127.0.0.1:8000"
+def stock_problems_message(items, products):
+    """Текст ошибки оформления заказа по позициям из ответа 409 /orders/checkout"""
+    problems = []
+    for item in items:
+        product = products.get(item.get('product_id'), {})
+        name = product.get('name', f"товар #{item.get('product_id')}")
+        if item.get('status') == 'not_found':
+            problems.append(f"{name}: товар не найден")
+        else:
+            problems.append(f"{name}: в наличии {item.get('stock_quantity')}, нужно {item.get('quantity')}")
+    return "Недостаточно товара на складе:\n" + "\n".join(problems)
 
-    def fetch_products(self):
-        try:
-            response = requests.get(f"{self.base_url}/products/get/all/")
-            if response.status_code == 200:
-                self.products_loaded.emit(response.json())
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching products: {e}")
 
-    def fetch_image(self, image_id):
-        try:
-            response = requests.get(f"{self.base_url}/images/{image_id}")
-            if response.status_code == 200:
-                image = QImage()
-                image.loadFromData(response.content)
-                pixmap = QPixmap.fromImage(image)
-                self.image_loaded.emit(image_id, pixmap)
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching image {image_id}: {e}")
+class ApiThread(CatalogApiThread):
+    payment_success = Signal(bool, str)
+    order_created = Signal(bool, str)  # Новый сигнал для результата создания заказа
+    order_rejected = Signal(list)  # Позиции, которых не хватило на складе
 
     def process_payment(self, card_data, total_amount):
         print(card_data, "  ", total_amount)
@@ -56,36 +48,20 @@ class ApiThread(QThread):
 
     def create_order(self, order_data):
         try:
+            # Заказ, позиции и списание остатков — одна транзакция на сервере
             response = requests.post(
-                f"{self.base_url}/orders/create",
+                f"{self.base_url}/orders/checkout",
                 json=order_data
             )
 
             if response.status_code == 200:
-                order_id = response.json().get('order_id')
-                if order_id:
-                    for item in order_data.get('items', []):
-                        product_id = item.get('product_id')
-                        quantity = item.get('quantity', 1)
-
-                        reduce_data = {
-                            "amount": quantity,
-                            "reason": f"Order #{order_id}"
-                        }
-                        reduce_response = requests.patch(
-                            f"{self.base_url}/products/reduce-stock/{product_id}",
-                            json=reduce_data
-                        )
-
-                        if reduce_response.status_code != 200:
-                            print(f"Failed to reduce stock for product {product_id}: {reduce_response.text}")
-
-                    self.order_created.emit(True, "Заказ успешно создан")
-                else:
-                    self.order_created.emit(False, "Не удалось получить ID созданного заказа")
+                self.order_created.emit(True, "Заказ успешно создан")
+            elif response.status_code == 409:
+                # Заказ не создан: каких-то товаров не хватает. Названия товаров знает окно магазина
+                self.order_rejected.emit(response.json().get('detail', {}).get('items', []))
             else:
                 self.order_created.emit(False, f"Ошибка создания заказа: {response.text}")
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, ValueError) as e:
             self.order_created.emit(False, f"Ошибка соединения: {str(e)}")
 
     def fetch_order_details(self, client_id, order_id):
@@ -773,10 +749,9 @@ class JewelryStoreApp(QMainWindow):
 
         # API Thread
         self.api_thread = ApiThread()
-        self.api_thread.products_loaded.connect(self.display_products)
         self.api_thread.image_loaded.connect(self.update_product_image)
-        self.api_thread.products_loaded.connect(self.update_category_filters)  # Добавляем обновление фильтров
         self.api_thread.order_created.connect(self.handle_order_created)
+        self.api_thread.order_rejected.connect(self.handle_order_rejected)
 
         # Central widget
         central_widget = QWidget()
@@ -812,8 +787,16 @@ class JewelryStoreApp(QMainWindow):
         # Apply styles
         self.apply_styles()
 
-        # Load data
-        self.api_thread.fetch_products()
+        # Локальная копия каталога (product_id -> товар) и карточки, показанные с текущим фильтром
+        self.products = {}
+        self.catalog_cards = {}
+        self.materials = None
+        self.current_material = "Все"
+
+        # Каталог подтягивает изменения каждые несколько секунд в отдельном потоке
+        self.products_sync = ProductsSyncThread(self.api_thread.base_url, parent=self)
+        self.products_sync.products_changed.connect(self.apply_product_changes)
+        self.products_sync.start()
 
     def create_sidebar(self, layout):
         sidebar = QFrame()
@@ -886,6 +869,7 @@ class JewelryStoreApp(QMainWindow):
 
     def closeEvent(self, event):
         """Обработчик события закрытия окна"""
+        self.products_sync.stop()
         self.api_thread.quit()
         event.accept()
 
@@ -946,17 +930,13 @@ class JewelryStoreApp(QMainWindow):
 
         return page
 
-    def update_category_filters(self, products):
+    def update_category_filters(self, materials):
         # Clear existing filters
         while self.filters_layout.count():
             item = self.filters_layout.takeAt(0)
             if item.widget():
                 item.widget().deleteLater()
 
-        # Get unique materials from products
-        materials = set(product["material"] for product in products)
-        materials = sorted(materials)  # Sort materials alphabetically
-
         # Add "All" button
         all_btn = QPushButton("Все")
         all_btn.setObjectName("filterButton")
@@ -970,28 +950,21 @@ class JewelryStoreApp(QMainWindow):
             btn.clicked.connect(lambda _, mat=material: self.filter_products(mat))
             self.filters_layout.addWidget(btn)
 
-        # Save all products
-        self.all_products = products
+    def matches_filter(self, product):
+        return self.current_material == "Все" or product["material"] == self.current_material
 
     def filter_products(self, material):
-        # Clear existing products
-        while self.products_grid.count():
-            item = self.products_grid.takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
+        self.current_material = material
+        for product_id in list(self.catalog_cards):
+            self.remove_catalog_card(product_id)
 
         # Filter products by material
-        if material == "Все":
-            filtered_products = self.all_products
-        else:
-            filtered_products = [product for product in self.all_products if product["material"] == material]
-
-        # Display filtered products
+        filtered_products = [product for product in self.products.values() if self.matches_filter(product)]
         for product in filtered_products:
-            item = self.create_product_item(product)
-            self.products_grid.addWidget(item)
-            # Load image for this product
-            self.api_thread.fetch_image(product["image_id"])
+            self.catalog_cards[product["product_id"]] = self.create_product_item(product)
+        self.layout_catalog_cards()
+        # Load images for all products in one request
+        self.api_thread.fetch_images([product["image_id"] for product in filtered_products], 300)
 
     def show_individual_order_dialog(self):
         dialog = IndividualOrderDialog(self)
@@ -1071,6 +1044,9 @@ class JewelryStoreApp(QMainWindow):
         else:
             QMessageBox.warning(self, "Ошибка", message)
 
+    def handle_order_rejected(self, items):
+        QMessageBox.warning(self, "Ошибка", stock_problems_message(items, self.products))
+
     def clear_cart(self):
         """Очищает всю корзину"""
         if not self.cart:
@@ -1218,29 +1194,63 @@ class JewelryStoreApp(QMainWindow):
         dialog = ProductDetailDialog(product, pixmap, self)
         dialog.exec()
 
-    def display_products(self, products):
-        # Clear existing products
+    def apply_product_changes(self, changed, deleted):
+        """Обновляет только карточки изменённых и удалённых товаров, сохраняя выбранный фильтр"""
+        featured_before = self.featured_ids()
+        for product_id in deleted:
+            self.products.pop(product_id, None)
+            self.remove_catalog_card(product_id)
+        for product in changed:
+            self.products[product["product_id"]] = product
+            self.remove_catalog_card(product["product_id"])
+
+        # Кнопки фильтров пересобираются, только если изменился набор материалов
+        materials = sorted(set(product["material"] for product in self.products.values()))
+        if materials != self.materials:
+            self.materials = materials
+            self.update_category_filters(materials)
+        if self.current_material != "Все" and self.current_material not in materials:
+            # Товаров выбранного материала не осталось — показываем все
+            self.filter_products("Все")
+        else:
+            new_cards = [product for product in changed if self.matches_filter(product)]
+            for product in new_cards:
+                self.catalog_cards[product["product_id"]] = self.create_product_item(product)
+            self.layout_catalog_cards()
+            self.api_thread.fetch_images([product["image_id"] for product in new_cards], 300)
+
+        touched = {product["product_id"] for product in changed} | set(deleted)
+        if self.featured_ids() != featured_before or touched & set(featured_before):
+            self.display_featured()
+
+    def featured_ids(self):
+        return sorted(self.products)[:3]
+
+    def display_featured(self):
+        # Display featured products (first 3)
         while self.featured_layout.count():
             item = self.featured_layout.takeAt(0)
             if item.widget():
                 item.widget().deleteLater()
 
-        while self.products_grid.count():
-            item = self.products_grid.takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
-
-        # Display featured products (first 3)
-        for product in products[:3]:
+        featured = [self.products[product_id] for product_id in self.featured_ids()]
+        for product in featured:
             item = self.create_product_item(product)
             self.featured_layout.addWidget(item)
+        self.api_thread.fetch_images([product["image_id"] for product in featured], 300)
 
-        # Display all products in catalog
-        for product in products:
-            item = self.create_product_item(product)
-            self.products_grid.addWidget(item)
-            # Load image for this product
-            self.api_thread.fetch_image(product["image_id"])
+    def remove_catalog_card(self, product_id):
+        card = self.catalog_cards.pop(product_id, None)
+        if card is not None:
+            self.products_grid.removeWidget(card)
+            card.deleteLater()
+
+    def layout_catalog_cards(self):
+        """Расставляет карточки каталога по порядку product_id; сами карточки не пересоздаются"""
+        for card in self.catalog_cards.values():
+            self.products_grid.removeWidget(card)
+        for product_id in sorted(self.catalog_cards):
+            self.products_grid.addWidget(self.catalog_cards[product_id])
 
     def create_product_item(self, product):
         frame = QFrame()
@@ -1262,6 +1272,16 @@ class JewelryStoreApp(QMainWindow):
             max-height: 220px;
         """)
 
+        # Микропревью из списка товаров видно сразу, пока грузится само изображение
+        if product.get("image_placeholder"):
+            preview = QPixmap()
+            if preview.loadFromData(base64.b64decode(product["image_placeholder"].split(",", 1)[1])):
+                image.setPixmap(preview.scaled(
+                    300, 300,
+                    Qt.AspectRatioMode.KeepAspectRatio,
+                    Qt.TransformationMode.SmoothTransformation
+                ))
+
         # Product info
         info_frame = QFrame()
         info_frame.setStyleSheet("background: #252525; border-radius: 0 0 8px 8px;")
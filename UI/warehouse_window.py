@@ -743,7 +743,7 @@ class StorekeeperApp(QMainWindow):
 
     def load_product_image_preview(self, image_id, preview_label):
         try:
-            response = requests.get(f"{self.base_url}/images/{image_id}")
+            response = requests.get(f"{self.base_url}/images/{image_id}", params={"w": 300})
             if response.status_code == 200:
                 pixmap = QPixmap()
                 pixmap.loadFromData(response.content)
@@ -1138,7 +1138,12 @@ class StorekeeperApp(QMainWindow):
                 else:
                     report_text = f"Ошибка при получении данных: {response.text}"
             elif report_type == "Отчет по движению товаров":
-                report_text = "Отчет по движению товаров (функционал в разработке)"
+                response = requests.get(f"{self.base_url}/inventory/movements/summary", params={"period": "month"})
+                products_response = requests.get(f"{self.base_url}/products/get/all/")
+                if response.status_code == 200 and products_response.status_code == 200:
+                    report_text = self.generate_movement_report(response.json(), products_response.json())
+                else:
+                    report_text = f"Ошибка при получении данных: {response.text}"
             else:
                 report_text = f"Отчет '{report_type}' не поддерживается"
 
@@ -1182,6 +1187,33 @@ class StorekeeperApp(QMainWindow):
 
         return report
 
+    def generate_movement_report(self, summary, products):
+        names = {product.get('product_id'): product.get('name', '') for product in products}
+
+        report = "ОТЧЕТ ПО ДВИЖЕНИЮ ТОВАРОВ\n\n"
+        report += f"Дата формирования: {datetime.now().strftime('%d.%m.%Y %H:%M')}\n\n"
+        report += f"Поступило всего: {sum(row.get('incoming', 0) for row in summary)}\n"
+        report += f"Списано всего: {sum(row.get('outgoing', 0) for row in summary)}\n\n"
+
+        report += "ДВИЖЕНИЕ ПО МЕСЯЦАМ:\n"
+        report += "{:<10} {:<8} {:<30} {:<10} {:<10} {:<10}\n".format(
+            "Месяц", "ID", "Название", "Приход", "Расход", "Итого"
+        )
+        report += "-" * 80 + "\n"
+
+        for row in summary:
+            month = datetime.fromisoformat(row.get('period_start')).strftime('%m.%Y')
+            report += "{:<10} {:<8} {:<30} {:<10} {:<10} {:<10}\n".format(
+                month,
+                str(row.get('product_id', '')),
+                names.get(row.get('product_id'), 'Удалённый товар')[:28],
+                str(row.get('incoming', 0)),
+                str(row.get('outgoing', 0)),
+                str(row.get('net', 0))
+            )
+
+        return report
+
     def export_report_to_xlsx(self):
         report_text = self.report_preview.toPlainText()
         if not report_text or "Здесь будет отображаться" in report_text:
@@ -0,0 +1,62 @@
+"""Снимок каталога в памяти процесса: готовый JSON, его gzip-вариант и MessagePack.
+
+Снимок привязан к версии ресурса (см. versioning.py): если версия в
+базе изменилась, он пересобирается при следующем запросе, а при
+неустойчивой версии собирается без сохранения. Роутер
+товаров дополнительно сбрасывает снимок сразу после каждого изменения.
+"""
+import asyncio
+import gzip
+
+import orjson
+from fastapi import Response
+from starlette.concurrency import run_in_threadpool
+
+from responses import MSGPACK_MEDIA_TYPE, dumps_msgpack, wants_msgpack
+
+GZIP_LEVEL = 6
+
+
+class CatalogSnapshot:
+    def __init__(self, statement, adapter):
+        self.statement = statement
+        self.adapter = adapter
+        self.version = None
+        self.body = None
+        self.gzip_body = None
+        self.msgpack_body = None
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self.version = None
+        self.body = None
+        self.gzip_body = None
+        self.msgpack_body = None
+
+    async def get(self, connection, version):
+        if version is None:
+            # Версия неустойчива — снимок собирается для одного ответа и не сохраняется
+            snapshot = CatalogSnapshot(self.statement, self.adapter)
+            return await snapshot.get(connection, 0)
+        if self.version == version:
+            return self
+        async with self._lock:
+            # Пока ждали блокировку, снимок мог собрать другой запрос
+            if self.version != version:
+                rows = await connection.fetch_named(self.statement)
+                body = self.adapter.dump_json(self.adapter.validate_python([dict(row) for row in rows]))
+                gzip_body = await run_in_threadpool(gzip.compress, body, GZIP_LEVEL)
+                self.body, self.gzip_body, self.msgpack_body, self.version = body, gzip_body, None, version
+        return self
+
+    def response(self, request, headers):
+        headers = {**headers, "Vary": "Accept, Accept-Encoding"}
+        if wants_msgpack(request):
+            # MessagePack собирается из готового JSON при первом запросе к версии
+            if self.msgpack_body is None:
+                self.msgpack_body = dumps_msgpack(orjson.loads(self.body))
+            return Response(content=self.msgpack_body, media_type=MSGPACK_MEDIA_TYPE, headers=headers)
+        if "gzip" in request.headers.get("accept-encoding", ""):
+            headers["Content-Encoding"] = "gzip"
+            return Response(content=self.gzip_body, media_type="application/json", headers=headers)
+        return Response(content=self.body, media_type="application/json", headers=headers)
@@ -0,0 +1,226 @@
+"""Уменьшенные копии изображений (превью) фиксированных размеров.
+
+Клиенты показывают картинки в рамках 80 (корзина), 200 (карточка),
+300 (каталог) и 400 px (диалоги) — им отдаётся копия, вписанная в
+квадрат нужной стороны, а не исходная фотография. Копии создаются
+Pillow в отдельных процессах (цикл событий не блокируется), сразу после
+загрузки или при первом запросе, и хранятся на диске рядом с оригиналами:
+media/images/renditions/300/ab/cd/abcd....jpg
+
+Клиенту, принимающему image/webp, отдаётся WebP-версия (превью или
+полного размера — renditions/full/...).
+
+Для списков товаров при загрузке делается заглушка — WebP 24 px в
+data URI (~200 байт), хранится в images.placeholder. Подготовить копии
+и заглушки для уже загруженных изображений:
+
+    python image_renditions.py --workers 4
+"""
+import argparse
+import asyncio
+import base64
+import io
+import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import asyncpg
+from PIL import Image, ImageOps
+
+from database import DATABASE_URL
+from image_store import store
+from statements import STATEMENTS
+
+logger = logging.getLogger(__name__)
+
+RENDITION_WIDTHS = (80, 200, 300, 400)
+IMAGE_RENDITION_WORKERS = int(os.getenv("IMAGE_RENDITION_WORKERS", "2"))
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+PLACEHOLDER_SIZE = 24
+PLACEHOLDER_QUALITY = 40
+
+# content_type оригинала -> (формат Pillow, content_type копии, расширение файла)
+RENDITION_FORMATS = {
+    "image/jpeg": ("JPEG", "image/jpeg", "jpg"),
+    "image/png": ("PNG", "image/png", "png"),
+    "image/webp": ("WEBP", "image/webp", "webp"),
+    "image/gif": ("PNG", "image/png", "png"),
+}
+DEFAULT_RENDITION_FORMAT = ("PNG", "image/png", "png")
+WEBP_FORMAT = ("WEBP", "image/webp", "webp")
+# Оригиналы, которые не перекодируются в WebP: уже WebP или анимированный GIF
+WEBP_KEEP_ORIGINAL = ("image/webp", "image/gif")
+
+_executor = None
+# Путь копии -> Future генерации: параллельные запросы одной копии ждут одну задачу
+_pending = {}
+
+
+def accepts_webp(request):
+    return "image/webp" in request.headers.get("accept", "")
+
+
+def rendition_format(content_type, webp=False):
+    if webp:
+        return WEBP_FORMAT
+    return RENDITION_FORMATS.get(content_type, DEFAULT_RENDITION_FORMAT)
+
+
+def rendition_path(sha256, width, ext):
+    """width=None — копия полного размера в другом формате."""
+    size_dir = str(width) if width else "full"
+    return os.path.join(store.root, "renditions", size_dir, sha256[:2], sha256[2:4], f"{sha256}.{ext}")
+
+
+def render_rendition(source, target, width, image_format):
+    """Выполняется в процессе пула: вписывает изображение в квадрат width×width
+    (width=None — без уменьшения) и сохраняет в image_format."""
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if width:
+            image.thumbnail((width, width), Image.Resampling.LANCZOS)
+        options = {}
+        if image_format == "JPEG":
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            options = {"quality": JPEG_QUALITY, "optimize": True, "progressive": True}
+        elif image_format == "PNG":
+            options = {"optimize": True}
+        elif image_format == "WEBP":
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+            options = {"quality": WEBP_QUALITY, "method": 4}
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_dir = os.path.join(store.root, "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False) as temp:
+            image.save(temp, image_format, **options)
+    os.replace(temp.name, target)
+
+
+def render_placeholder(source):
+    """Выполняется в процессе пула: микропревью в виде data URI."""
+    with Image.open(source) as image:
+        # JPEG сразу декодируется в уменьшенном масштабе — для больших фото в разы быстрее
+        image.draft("RGB", (PLACEHOLDER_SIZE * 4, PLACEHOLDER_SIZE * 4))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.Resampling.LANCZOS)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, "WEBP", quality=PLACEHOLDER_QUALITY)
+    return "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=IMAGE_RENDITION_WORKERS)
+    return _executor
+
+
+async def ensure_rendition(sha256, width, content_type, webp=False):
+    """Возвращает (путь, content_type) копии, создавая её при необходимости.
+
+    width=None без webp (или с оригиналом, который не перекодируется) — сам оригинал.
+    """
+    if width is None and (not webp or content_type in WEBP_KEEP_ORIGINAL):
+        return store.path(sha256), content_type
+    image_format, media_type, ext = rendition_format(content_type, webp)
+    path = rendition_path(sha256, width, ext)
+    if os.path.exists(path):
+        return path, media_type
+
+    future = _pending.get(path)
+    if future is None:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            _get_executor(), render_rendition, store.path(sha256), path, width, image_format
+        )
+        _pending[path] = future
+        future.add_done_callback(lambda _: _pending.pop(path, None))
+    # Отключившийся клиент не отменяет генерацию, которую ждут другие
+    await asyncio.shield(future)
+    return path, media_type
+
+
+async def make_placeholder(sha256):
+    """Заглушка для изображения из хранилища; None, если Pillow не смог его прочитать."""
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_get_executor(), render_placeholder, store.path(sha256))
+    except Exception:
+        logger.warning("Could not create placeholder for %s", sha256, exc_info=True)
+        return None
+
+
+async def create_renditions(sha256, content_type):
+    """Фоновая генерация всех размеров (в исходном формате и WebP) после загрузки."""
+    variants = [(width, False) for width in RENDITION_WIDTHS]
+    variants += [(width, True) for width in (None, *RENDITION_WIDTHS)]
+    for width, webp in variants:
+        try:
+            await ensure_rendition(sha256, width, content_type, webp)
+        except Exception:
+            logger.warning("Could not create %spx rendition of %s", width or "full", sha256, exc_info=True)
+            return False
+    return True
+
+
+def shutdown_rendition_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
+
+
+async def backfill_renditions(dsn=DATABASE_URL, batch_size=100):
+    """Готовит копии всех размеров, WebP и недостающие заглушки для изображений в хранилище.
+
+    Возвращает (обработано, с ошибкой). Уже созданные копии пропускаются.
+    """
+    connection = await asyncpg.connect(dsn)
+    try:
+        images = await connection.fetch("""
+            SELECT DISTINCT ON (sha256) sha256, content_type
+            FROM images
+            WHERE sha256 IS NOT NULL
+            ORDER BY sha256, image_id
+        """)
+        without_placeholder = {
+            row["sha256"] for row in await connection.fetch(STATEMENTS["images.without_placeholder"])
+        }
+
+        done = failed = 0
+        for offset in range(0, len(images), batch_size):
+            batch = images[offset:offset + batch_size]
+            results = await asyncio.gather(*(create_renditions(row["sha256"], row["content_type"]) for row in batch))
+            missing = [row["sha256"] for row in batch if row["sha256"] in without_placeholder]
+            placeholders = await asyncio.gather(*(make_placeholder(sha256) for sha256 in missing))
+            async with connection.transaction():
+                for sha256, placeholder in zip(missing, placeholders):
+                    if placeholder is not None:
+                        await connection.execute(STATEMENTS["images.set_placeholder"], sha256, placeholder)
+            done += len(results)
+            failed += results.count(False)
+            logger.info("Processed %s of %s images", done, len(images))
+        return done, failed
+    finally:
+        await connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Подготовка превью, WebP-копий и заглушек для загруженных изображений")
+    parser.add_argument("--dsn", default=DATABASE_URL, help="строка подключения к PostgreSQL")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="процессов Pillow")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    IMAGE_RENDITION_WORKERS = args.workers
+    try:
+        total, errors = asyncio.run(backfill_renditions(args.dsn))
+    finally:
+        shutdown_rendition_pool()
+    print(f"Processed {total} images, {errors} failed")
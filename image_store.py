@@ -0,0 +1,222 @@
+"""Файловое хранилище изображений с адресацией по содержимому.
+
+Файл хранится под своим SHA-256: media/images/ab/cd/abcd...; одинаковые
+загрузки попадают в один файл. В таблице images остаются только
+метаданные (имя, тип, хеш, размер). Перенос старых изображений из
+images.data в хранилище:
+
+    python image_store.py            # перенести все
+    python image_store.py --batch 50 # по 50 за транзакцию
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+from collections import OrderedDict
+
+import asyncpg
+from starlette.concurrency import run_in_threadpool
+
+from database import DATABASE_URL
+
+logger = logging.getLogger(__name__)
+
+IMAGE_STORE_DIR = os.getenv("IMAGE_STORE_DIR", os.path.join("media", "images"))
+IMAGE_READ_CHUNK_SIZE = 1024 * 1024
+IMAGE_MAX_UPLOAD_SIZE = int(os.getenv("IMAGE_MAX_UPLOAD_SIZE", str(20 * 1024 * 1024)))
+# Метаданные изображений не меняются, поэтому кэшируются без срока жизни
+IMAGE_META_CACHE_SIZE = 10000
+
+
+# Сигнатуры начала файла -> content_type; заявленному клиентом типу не доверяем
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+)
+
+
+class ImageUploadError(Exception):
+    pass
+
+
+class ImageTooLargeError(ImageUploadError):
+    pass
+
+
+class UnsupportedImageTypeError(ImageUploadError):
+    pass
+
+
+def sniff_image_type(head):
+    """Определяет тип изображения по первым байтам; None — не изображение."""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, content_type in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    return None
+
+
+class ImageStore:
+    def __init__(self, root=IMAGE_STORE_DIR):
+        self.root = root
+
+    def path(self, sha256):
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    def exists(self, sha256):
+        return os.path.exists(self.path(sha256))
+
+    def _open_temp(self):
+        tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        return tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False)
+
+    def _commit(self, temp_path, sha256):
+        """Переносит временный файл на место; если такой файл уже есть — удаляет копию."""
+        path = self.path(sha256)
+        if os.path.exists(path):
+            os.unlink(temp_path)
+            return path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+        return path
+
+    async def save_upload(self, upload, max_size=IMAGE_MAX_UPLOAD_SIZE):
+        """Сохраняет UploadFile по частям, считая хеш на лету.
+
+        Возвращает (sha256, size, content_type), где content_type определён по
+        содержимому. Файл больше max_size или не изображение не сохраняется
+        (ImageTooLargeError, UnsupportedImageTypeError).
+        """
+        digest = hashlib.sha256()
+        size = 0
+        content_type = None
+        temp = await run_in_threadpool(self._open_temp)
+        try:
+            while chunk := await upload.read(IMAGE_READ_CHUNK_SIZE):
+                if content_type is None:
+                    content_type = sniff_image_type(chunk)
+                    if content_type is None:
+                        raise UnsupportedImageTypeError("File is not a supported image (JPEG, PNG, GIF, WebP, BMP)")
+                size += len(chunk)
+                if size > max_size:
+                    raise ImageTooLargeError(f"Image is larger than {max_size} bytes")
+                digest.update(chunk)
+                await run_in_threadpool(temp.write, chunk)
+            if content_type is None:
+                raise UnsupportedImageTypeError("File is empty")
+            await run_in_threadpool(temp.close)
+            sha256 = digest.hexdigest()
+            await run_in_threadpool(self._commit, temp.name, sha256)
+        except BaseException:
+            temp.close()
+            if os.path.exists(temp.name):
+                os.unlink(temp.name)
+            raise
+        return sha256, size, content_type
+
+    def save_bytes(self, data):
+        """Синхронное сохранение готовых байтов (для переноса из базы)."""
+        sha256 = hashlib.sha256(data).hexdigest()
+        if not self.exists(sha256):
+            with self._open_temp() as temp:
+                temp.write(data)
+            self._commit(temp.name, sha256)
+        return sha256, len(data)
+
+
+store = ImageStore()
+
+# image_id -> запись с метаданными (LRU)
+_meta_cache = OrderedDict()
+
+
+async def get_image_meta(pool, image_id):
+    """Метаданные изображения; повторные запросы не обращаются к базе.
+
+    Соединение из пула берётся только при промахе кэша.
+    """
+    meta = _meta_cache.get(image_id)
+    if meta is not None:
+        _meta_cache.move_to_end(image_id)
+        return meta
+    async with pool.acquire() as connection:
+        row = await connection.fetchrow_named("images.get", image_id)
+    if row is None:
+        return None
+    return _remember(dict(row))
+
+
+async def get_images_meta(pool, image_ids):
+    """Метаданные нескольких изображений {image_id: meta}; недостающие в кэше — одним запросом."""
+    found = {}
+    for image_id in image_ids:
+        meta = _meta_cache.get(image_id)
+        if meta is not None:
+            _meta_cache.move_to_end(image_id)
+            found[image_id] = meta
+    missing = [image_id for image_id in image_ids if image_id not in found]
+    if missing:
+        async with pool.acquire() as connection:
+            rows = await connection.fetch_named("images.get_many", missing)
+        for row in rows:
+            found[row["image_id"]] = _remember(dict(row))
+    return found
+
+
+def _remember(meta):
+    # Ещё не перенесённые из базы изображения не кэшируем: в них лежат сами байты
+    if meta["sha256"] is not None:
+        _meta_cache[meta["image_id"]] = meta
+        if len(_meta_cache) > IMAGE_META_CACHE_SIZE:
+            _meta_cache.popitem(last=False)
+    return meta
+
+
+async def move_blobs_to_store(dsn=DATABASE_URL, batch_size=100):
+    """Переносит images.data в файловое хранилище. Возвращает число перенесённых изображений."""
+    connection = await asyncpg.connect(dsn)
+    moved = 0
+    try:
+        last_id = 0
+        while True:
+            async with connection.transaction():
+                rows = await connection.fetch("""
+                    SELECT image_id, data FROM images
+                    WHERE image_id > $1 AND sha256 IS NULL AND data IS NOT NULL
+                    ORDER BY image_id
+                    LIMIT $2
+                    FOR UPDATE SKIP LOCKED
+                """, last_id, batch_size)
+                if not rows:
+                    return moved
+                updates = []
+                for row in rows:
+                    sha256, size = await run_in_threadpool(store.save_bytes, row["data"])
+                    updates.append((sha256, size, row["image_id"]))
+                # Байты удаляются из базы только после того, как файл записан
+                await connection.executemany(
+                    "UPDATE images SET sha256 = $1, size = $2, data = NULL WHERE image_id = $3", updates
+                )
+            moved += len(rows)
+            last_id = rows[-1]["image_id"]
+            logger.info("Moved %s images to %s", moved, store.root)
+    finally:
+        await connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Перенос изображений из базы в файловое хранилище")
+    parser.add_argument("--dsn", default=DATABASE_URL, help="строка подключения к PostgreSQL")
+    parser.add_argument("--batch", type=int, default=100, help="изображений за одну транзакцию")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    total = asyncio.run(move_blobs_to_store(args.dsn, args.batch))
+    print(f"Moved {total} images to {store.root}")
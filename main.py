@@ -1,8 +1,39 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI
-from routers import roles, users, auth, products, images, orders, inventory, returns, individual_orders
+from database import init_db_pool, close_db_pool
+from migrations import migrate, DB_MIGRATE_ON_STARTUP
+from stock import partition_maintenance_loop
+from versioning import deletions_maintenance_loop
+from image_renditions import shutdown_rendition_pool
+from responses import FastJSONResponse
+from routers import roles, users, auth, products, images, orders, inventory, returns, individual_orders, admin, export
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Схема должна быть актуальной до того, как пул подготовит запросы
+    if DB_MIGRATE_ON_STARTUP:
+        await migrate()
+    # Пул создаётся и прогревается до приёма первых запросов
+    pool = await init_db_pool()
+    # Секции журнала движения товаров на месяцы вперёд
+    maintenance = asyncio.create_task(partition_maintenance_loop(pool))
+    # Журнал удалений для версий ресурсов
+    deletions_maintenance = asyncio.create_task(deletions_maintenance_loop(pool))
+    try:
+        yield
+    finally:
+        maintenance.cancel()
+        deletions_maintenance.cancel()
+        shutdown_rendition_pool()
+        await close_db_pool()
 
-app = FastAPI()
+
+# Остальные ответы после проверки схемы тоже кодируются orjson
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 app.include_router(auth.router)
 app.include_router(roles.router)
@@ -13,8 +44,9 @@ app.include_router(orders.router)
 app.include_router(inventory.router)
 app.include_router(returns.router)
 app.include_router(individual_orders.router)
+app.include_router(admin.router)
+app.include_router(export.router)
 
 
 if __name__ == "__main__":
     uvicorn.run(app, port=8000)
-
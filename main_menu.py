@@ -1,20 +1,18 @@
+import base64
 import sys
 import requests
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                                QHBoxLayout, QPushButton, QLabel, QFrame,
                                QScrollArea, QStackedWidget, QSizePolicy, QDialog,
                                QGridLayout, QMessageBox)
-from PySide6.QtCore import Qt, QSize, QThread, Signal
-from PySide6.QtGui import QFont, QIcon, QPixmap, QImage
+from PySide6.QtCore import Qt, QSize, Signal
+from PySide6.QtGui import QFont, QIcon, QPixmap
 
+from UI.catalog_api import CatalogApiThread
 
-class ApiThread(QThread):
-    products_loaded = Signal(list)
-    image_loaded = Signal(int, QPixmap)
 
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.base_url = "http://127.0.0.1:8000"
+class ApiThread(CatalogApiThread):
+    products_loaded = Signal(list)
 
     def fetch_products(self):
         try:
@@ -24,17 +22,6 @@ class ApiThread(QThread):
         except requests.exceptions.RequestException as e:
             print(f"Error fetching products: {e}")
 
-    def fetch_image(self, image_id):
-        try:
-            response = requests.get(f"{self.base_url}/images/{image_id}")
-            if response.status_code == 200:
-                image = QImage()
-                image.loadFromData(response.content)
-                pixmap = QPixmap.fromImage(image)
-                self.image_loaded.emit(image_id, pixmap)
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching image {image_id}: {e}")
-
 
 class ProductDetailDialog(QDialog):
     def __init__(self, product, pixmap, parent=None):
@@ -434,8 +421,8 @@ class JewelryStoreApp(QMainWindow):
         for product in products:
             item = self.create_product_item(product)
             self.products_grid.addWidget(item)
-            # Load image for this product
-            self.api_thread.fetch_image(product["image_id"])
+        # Load images for all products in one request
+        self.api_thread.fetch_images([product["image_id"] for product in products], 200)
 
     def create_product_item(self, product):
         frame = QFrame()
@@ -457,6 +444,16 @@ class JewelryStoreApp(QMainWindow):
             max-height: 220px;
         """)
 
+        # Микропревью из списка товаров видно сразу, пока грузится само изображение
+        if product.get("image_placeholder"):
+            preview = QPixmap()
+            if preview.loadFromData(base64.b64decode(product["image_placeholder"].split(",", 1)[1])):
+                image.setPixmap(preview.scaled(
+                    200, 200,
+                    Qt.AspectRatioMode.KeepAspectRatio,
+                    Qt.TransformationMode.SmoothTransformation
+                ))
+
         # Product info
         info_frame = QFrame()
         info_frame.setStyleSheet("background: #252525; border-radius: 0 0 8px 8px;")
@@ -0,0 +1,566 @@
+"""Версионные миграции схемы базы магазина.
+
+Применённые версии записываются в таблицу schema_migrations, каждая
+миграция выполняется в своей транзакции. Запуск:
+
+    python migrations.py            # применить все новые миграции
+    python migrations.py --list     # показать состояние
+
+При старте API миграции применяются автоматически, если не задано
+DB_MIGRATE_ON_STARTUP=0.
+"""
+import argparse
+import asyncio
+import logging
+import os
+from collections import namedtuple
+
+import asyncpg
+
+from database import DATABASE_URL
+
+logger = logging.getLogger(__name__)
+
+DB_MIGRATE_ON_STARTUP = os.getenv("DB_MIGRATE_ON_STARTUP", "1") == "1"
+
+# Произвольный ключ advisory-блокировки: миграции не выполняются параллельно
+MIGRATION_LOCK_ID = 720_301
+
+Migration = namedtuple("Migration", ["version", "description", "sql"])
+
+MIGRATIONS = [
+    Migration(1, "Исходная схема", """
+        CREATE TABLE IF NOT EXISTS roles (
+            role_id SERIAL PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        );
+
+        INSERT INTO roles (role_id, name)
+        SELECT * FROM (VALUES (1, 'Админ'), (2, 'Ювелир'), (3, 'Кладовщик'), (4, 'Клиент')) AS r
+        WHERE NOT EXISTS (SELECT 1 FROM roles);
+        SELECT setval(pg_get_serial_sequence('roles', 'role_id'), (SELECT MAX(role_id) FROM roles));
+
+        CREATE TABLE IF NOT EXISTS users (
+            user_id SERIAL PRIMARY KEY,
+            username TEXT NOT NULL,
+            password_hash TEXT NOT NULL,
+            role INTEGER NOT NULL REFERENCES roles (role_id),
+            created_at TIMESTAMP NOT NULL DEFAULT NOW()
+        );
+
+        CREATE TABLE IF NOT EXISTS images (
+            image_id SERIAL PRIMARY KEY,
+            filename TEXT,
+            content_type TEXT,
+            data BYTEA
+        );
+
+        CREATE TABLE IF NOT EXISTS products (
+            product_id SERIAL PRIMARY KEY,
+            name TEXT NOT NULL,
+            article TEXT NOT NULL,
+            type TEXT NOT NULL,
+            material TEXT NOT NULL,
+            insert_type TEXT NOT NULL,
+            weight NUMERIC(10, 2) NOT NULL,
+            price NUMERIC(12, 2) NOT NULL,
+            stock_quantity INTEGER NOT NULL DEFAULT 0,
+            image_id INTEGER REFERENCES images (image_id),
+            created_at TIMESTAMP NOT NULL DEFAULT NOW()
+        );
+
+        CREATE TABLE IF NOT EXISTS orders (
+            order_id SERIAL PRIMARY KEY,
+            client_id INTEGER NOT NULL REFERENCES users (user_id),
+            order_date TIMESTAMP NOT NULL DEFAULT NOW(),
+            status TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS order_items (
+            item_id SERIAL PRIMARY KEY,
+            order_id INTEGER NOT NULL REFERENCES orders (order_id) ON DELETE CASCADE,
+            product_id INTEGER NOT NULL REFERENCES products (product_id),
+            quantity INTEGER NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS inventory (
+            inventory_id SERIAL PRIMARY KEY,
+            product_id INTEGER NOT NULL REFERENCES products (product_id) ON DELETE CASCADE,
+            quantity INTEGER NOT NULL,
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+        );
+
+        CREATE TABLE IF NOT EXISTS returns (
+            return_id SERIAL PRIMARY KEY,
+            order_id INTEGER NOT NULL REFERENCES orders (order_id) ON DELETE CASCADE,
+            client_id INTEGER NOT NULL REFERENCES users (user_id),
+            return_date TIMESTAMP NOT NULL,
+            description TEXT NOT NULL,
+            status TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS individual_orders (
+            order_id SERIAL PRIMARY KEY,
+            client_id INTEGER NOT NULL REFERENCES users (user_id),
+            order_date TIMESTAMP NOT NULL,
+            status TEXT NOT NULL,
+            description TEXT NOT NULL,
+            total_amount NUMERIC(12, 2) NOT NULL,
+            delivery_address TEXT NOT NULL,
+            contact_phone TEXT NOT NULL
+        );
+    """),
+    Migration(2, "Индексы под фильтры и сортировки роутеров", """
+        -- Вход по имени пользователя, фильтр по роли
+        CREATE INDEX IF NOT EXISTS users_username_idx ON users (username);
+        CREATE INDEX IF NOT EXISTS users_role_idx ON users (role);
+
+        -- Заказы клиента, новые первыми; статус нужен в ответе
+        CREATE INDEX IF NOT EXISTS orders_client_id_order_date_idx
+            ON orders (client_id, order_date DESC) INCLUDE (status);
+        CREATE INDEX IF NOT EXISTS orders_order_date_idx ON orders (order_date);
+
+        -- Состав заказа
+        CREATE INDEX IF NOT EXISTS order_items_order_id_idx
+            ON order_items (order_id) INCLUDE (product_id, quantity);
+        CREATE INDEX IF NOT EXISTS order_items_product_id_idx ON order_items (product_id);
+
+        -- Возвраты по клиенту и по заказу, новые первыми
+        CREATE INDEX IF NOT EXISTS returns_client_id_return_date_idx ON returns (client_id, return_date DESC);
+        CREATE INDEX IF NOT EXISTS returns_order_id_return_date_idx ON returns (order_id, return_date DESC);
+
+        -- Индивидуальные заказы клиента (по статусу и все по дате — см. миграцию 3)
+        CREATE INDEX IF NOT EXISTS individual_orders_client_id_status_order_date_idx
+            ON individual_orders (client_id, status, order_date DESC);
+
+        CREATE INDEX IF NOT EXISTS products_article_idx ON products (article);
+        CREATE INDEX IF NOT EXISTS inventory_product_id_idx ON inventory (product_id);
+    """),
+    Migration(3, "Индексы для keyset-пагинации индивидуальных заказов", """
+        -- Ключ страницы (order_date, order_id). Индексы по одной дате создавала
+        -- прежняя версия миграции 2 — в уже развёрнутых базах они удаляются
+        CREATE INDEX IF NOT EXISTS individual_orders_order_date_order_id_idx
+            ON individual_orders (order_date, order_id);
+        CREATE INDEX IF NOT EXISTS individual_orders_status_order_date_order_id_idx
+            ON individual_orders (status, order_date, order_id);
+        DROP INDEX IF EXISTS individual_orders_order_date_idx;
+        DROP INDEX IF EXISTS individual_orders_status_order_date_idx;
+    """),
+    Migration(4, "Версии ресурсов для ETag", """
+        CREATE TABLE IF NOT EXISTS resource_versions (
+            resource TEXT PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0
+        );
+        INSERT INTO resource_versions (resource)
+        VALUES ('products'), ('orders'), ('returns'), ('individual_orders'), ('users')
+        ON CONFLICT DO NOTHING;
+
+        CREATE OR REPLACE FUNCTION bump_resource_version() RETURNS trigger AS $$
+        BEGIN
+            UPDATE resource_versions SET version = version + 1 WHERE resource = TG_ARGV[0];
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER products_bump_version
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON products
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_resource_version('products');
+        CREATE TRIGGER orders_bump_version
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON orders
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_resource_version('orders');
+        CREATE TRIGGER returns_bump_version
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON returns
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_resource_version('returns');
+        CREATE TRIGGER individual_orders_bump_version
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON individual_orders
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_resource_version('individual_orders');
+        -- Список заказов показывает имя клиента, поэтому зависит и от users
+        CREATE TRIGGER users_bump_version
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON users
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_resource_version('users');
+    """),
+    Migration(5, "Индексы для фильтров и сортировок каталога", """
+        CREATE INDEX IF NOT EXISTS products_material_idx ON products (material);
+        CREATE INDEX IF NOT EXISTS products_type_idx ON products (type);
+        CREATE INDEX IF NOT EXISTS products_insert_type_idx ON products (insert_type);
+        -- Ключи keyset-сортировок: (значение, product_id)
+        CREATE INDEX IF NOT EXISTS products_price_product_id_idx ON products (price, product_id);
+        CREATE INDEX IF NOT EXISTS products_weight_product_id_idx ON products (weight, product_id);
+        CREATE INDEX IF NOT EXISTS products_created_at_product_id_idx ON products (created_at, product_id);
+        CREATE INDEX IF NOT EXISTS products_name_product_id_idx ON products (name, product_id);
+        CREATE INDEX IF NOT EXISTS products_in_stock_idx ON products (product_id) WHERE stock_quantity > 0;
+    """),
+    Migration(6, "Поиск товаров по названию и артикулу", """
+        -- pg_trgm входит в contrib; без него поиск работает через ILIKE без индекса
+        DO $$
+        BEGIN
+            CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        EXCEPTION WHEN OTHERS THEN
+            RAISE NOTICE 'pg_trgm is not available: %', SQLERRM;
+        END;
+        $$;
+
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+                CREATE INDEX IF NOT EXISTS products_name_trgm_idx ON products USING gin (name gin_trgm_ops);
+                CREATE INDEX IF NOT EXISTS products_article_trgm_idx ON products USING gin (article gin_trgm_ops);
+            END IF;
+        END;
+        $$;
+
+        -- Автодополнение по началу артикула или названия
+        CREATE INDEX IF NOT EXISTS products_article_prefix_idx ON products (lower(article) text_pattern_ops);
+        CREATE INDEX IF NOT EXISTS products_name_prefix_idx ON products (lower(name) text_pattern_ops);
+    """),
+    Migration(7, "Уникальный артикул товара (ключ массовой загрузки)", """
+        -- Исходная схема допускала повторы артикулов. Какой из товаров оставить, решает
+        -- человек (на них могут ссылаться заказы), поэтому миграция останавливается с их списком
+        DO $$
+        DECLARE
+            duplicates TEXT;
+        BEGIN
+            SELECT string_agg(format('%L (product_id %s)', article, ids), ', ' ORDER BY article)
+            INTO duplicates
+            FROM (
+                SELECT article, string_agg(product_id::TEXT, ', ' ORDER BY product_id) AS ids
+                FROM products
+                GROUP BY article
+                HAVING COUNT(*) > 1
+            ) AS d;
+
+            IF duplicates IS NOT NULL THEN
+                RAISE EXCEPTION 'Duplicate product articles: %', duplicates
+                    USING HINT = 'Make the articles unique or delete the extra products, then run the migrations again';
+            END IF;
+        END;
+        $$;
+
+        CREATE UNIQUE INDEX IF NOT EXISTS products_article_key ON products (article);
+        DROP INDEX IF EXISTS products_article_idx;
+    """),
+    Migration(8, "Журнал движения товаров (по месяцам)", """
+        CREATE TABLE IF NOT EXISTS stock_movements (
+            movement_id BIGINT GENERATED ALWAYS AS IDENTITY,
+            -- Без внешнего ключа: история остаётся и после удаления товара
+            product_id INTEGER NOT NULL,
+            amount INTEGER NOT NULL,
+            stock_after INTEGER NOT NULL,
+            reason TEXT,
+            created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (created_at, movement_id)
+        ) PARTITION BY RANGE (created_at);
+        CREATE INDEX IF NOT EXISTS stock_movements_product_idx
+            ON stock_movements (product_id, created_at, movement_id);
+        -- Страховка на случай, если секция месяца не была создана заранее
+        CREATE TABLE IF NOT EXISTS stock_movements_default PARTITION OF stock_movements DEFAULT;
+
+        -- Создаёт секции текущего и следующих months_ahead месяцев
+        CREATE OR REPLACE FUNCTION ensure_stock_movement_partitions(months_ahead INTEGER) RETURNS INTEGER AS $$
+        DECLARE
+            month_start DATE := date_trunc('month', NOW())::date;
+            partition_name TEXT;
+            created INTEGER := 0;
+        BEGIN
+            FOR i IN 0..months_ahead LOOP
+                partition_name := 'stock_movements_' || to_char(month_start, 'YYYY_MM');
+                IF to_regclass(partition_name) IS NULL THEN
+                    EXECUTE format(
+                        'CREATE TABLE %I PARTITION OF stock_movements FOR VALUES FROM (%L) TO (%L)',
+                        partition_name, month_start, (month_start + INTERVAL '1 month')::date
+                    );
+                    created := created + 1;
+                END IF;
+                month_start := (month_start + INTERVAL '1 month')::date;
+            END LOOP;
+            RETURN created;
+        END;
+        $$ LANGUAGE plpgsql;
+        SELECT ensure_stock_movement_partitions(3);
+
+        -- Любое изменение остатка пишется в журнал той же транзакцией, одним INSERT на запрос.
+        -- Причина передаётся через set_config('app.stock_reason', ..., true)
+        CREATE OR REPLACE FUNCTION log_stock_movements() RETURNS trigger AS $$
+        DECLARE
+            movement_reason TEXT := NULLIF(current_setting('app.stock_reason', true), '');
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO stock_movements (product_id, amount, stock_after, reason)
+                SELECT product_id, stock_quantity, stock_quantity, COALESCE(movement_reason, 'Новый товар')
+                FROM new_rows
+                WHERE stock_quantity <> 0;
+            ELSE
+                INSERT INTO stock_movements (product_id, amount, stock_after, reason)
+                SELECT n.product_id, n.stock_quantity - o.stock_quantity, n.stock_quantity, movement_reason
+                FROM new_rows n
+                JOIN old_rows o ON o.product_id = n.product_id
+                WHERE n.stock_quantity <> o.stock_quantity;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER products_log_stock_insert
+            AFTER INSERT ON products
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION log_stock_movements();
+        CREATE TRIGGER products_log_stock_update
+            AFTER UPDATE ON products
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION log_stock_movements();
+
+        -- Текущие остатки — начальная точка журнала
+        INSERT INTO stock_movements (product_id, amount, stock_after, reason)
+        SELECT product_id, stock_quantity, stock_quantity, 'Начальный остаток'
+        FROM products
+        WHERE stock_quantity <> 0;
+    """),
+    Migration(9, "Версии изменений товаров и надгробия удалённых", """
+        ALTER TABLE products ADD COLUMN IF NOT EXISTS change_version BIGINT NOT NULL DEFAULT 0;
+        CREATE INDEX IF NOT EXISTS products_change_version_idx ON products (change_version);
+
+        CREATE TABLE IF NOT EXISTS product_tombstones (
+            product_id INTEGER PRIMARY KEY,
+            change_version BIGINT NOT NULL,
+            deleted_at TIMESTAMP NOT NULL DEFAULT NOW()
+        );
+        CREATE INDEX IF NOT EXISTS product_tombstones_change_version_idx ON product_tombstones (change_version);
+
+        -- Одна версия на транзакцию из счётчика resource_versions. Строка счётчика
+        -- заблокирована до конца транзакции, поэтому версии идут в порядке фиксации
+        -- и клиент, прочитавший версию V, не пропустит изменения с версией <= V
+        CREATE OR REPLACE FUNCTION products_change_version() RETURNS BIGINT AS $$
+        DECLARE
+            result BIGINT := NULLIF(current_setting('app.products_change_version', true), '')::BIGINT;
+        BEGIN
+            IF result IS NULL THEN
+                UPDATE resource_versions SET version = version + 1 WHERE resource = 'products'
+                RETURNING version INTO result;
+                PERFORM set_config('app.products_change_version', result::TEXT, true);
+            END IF;
+            RETURN result;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION products_set_change_version() RETURNS trigger AS $$
+        BEGIN
+            NEW.change_version := products_change_version();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION products_add_tombstone() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO product_tombstones (product_id, change_version)
+            VALUES (OLD.product_id, products_change_version())
+            ON CONFLICT (product_id) DO UPDATE
+                SET change_version = EXCLUDED.change_version, deleted_at = NOW();
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER products_change_version
+            BEFORE INSERT OR UPDATE ON products
+            FOR EACH ROW EXECUTE FUNCTION products_set_change_version();
+        CREATE TRIGGER products_tombstone
+            AFTER DELETE ON products
+            FOR EACH ROW EXECUTE FUNCTION products_add_tombstone();
+
+        -- Уже существующие товары получают текущую версию
+        UPDATE products SET change_version = 0;
+    """),
+    Migration(10, "Изображения в файловом хранилище (в базе — только метаданные)", """
+        ALTER TABLE images ADD COLUMN IF NOT EXISTS sha256 TEXT;
+        ALTER TABLE images ADD COLUMN IF NOT EXISTS size BIGINT;
+        ALTER TABLE images ADD COLUMN IF NOT EXISTS created_at TIMESTAMP NOT NULL DEFAULT NOW();
+        CREATE INDEX IF NOT EXISTS images_sha256_idx ON images (sha256);
+    """),
+    Migration(11, "Заглушки изображений (микропревью) для списков товаров", """
+        ALTER TABLE images ADD COLUMN IF NOT EXISTS placeholder TEXT;
+    """),
+    Migration(12, "Версии ресурсов из номеров транзакций вместо общего счётчика", """
+        -- Строка счётчика в resource_versions блокировалась каждой пишущей
+        -- транзакцией до её фиксации и выстраивала всех писателей таблицы в
+        -- очередь. Теперь каждая строка помечается номером своей транзакции,
+        -- а версия ресурса — наибольший номер среди строк и удалений
+        ALTER TABLE orders ADD COLUMN IF NOT EXISTS change_version BIGINT NOT NULL DEFAULT 0;
+        ALTER TABLE returns ADD COLUMN IF NOT EXISTS change_version BIGINT NOT NULL DEFAULT 0;
+        ALTER TABLE individual_orders ADD COLUMN IF NOT EXISTS change_version BIGINT NOT NULL DEFAULT 0;
+        ALTER TABLE users ADD COLUMN IF NOT EXISTS change_version BIGINT NOT NULL DEFAULT 0;
+        CREATE INDEX IF NOT EXISTS orders_change_version_idx ON orders (change_version);
+        CREATE INDEX IF NOT EXISTS returns_change_version_idx ON returns (change_version);
+        CREATE INDEX IF NOT EXISTS individual_orders_change_version_idx ON individual_orders (change_version);
+        CREATE INDEX IF NOT EXISTS users_change_version_idx ON users (change_version);
+
+        -- Журнал удалений: строка на каждую удаляющую инструкцию, без обновления
+        -- общей строки. Старые записи чистит versioning.deletions_maintenance_loop
+        CREATE TABLE IF NOT EXISTS resource_deletions (
+            resource TEXT NOT NULL,
+            change_version BIGINT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS resource_deletions_resource_version_idx
+            ON resource_deletions (resource, change_version);
+
+        CREATE OR REPLACE FUNCTION set_change_version() RETURNS trigger AS $$
+        BEGIN
+            NEW.change_version := pg_current_xact_id()::TEXT::BIGINT;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION log_resource_deletion() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO resource_deletions (resource, change_version)
+            VALUES (TG_ARGV[0], pg_current_xact_id()::TEXT::BIGINT);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION products_add_tombstone() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO product_tombstones (product_id, change_version)
+            VALUES (OLD.product_id, pg_current_xact_id()::TEXT::BIGINT)
+            ON CONFLICT (product_id) DO UPDATE
+                SET change_version = EXCLUDED.change_version, deleted_at = NOW();
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS products_bump_version ON products;
+        DROP TRIGGER IF EXISTS orders_bump_version ON orders;
+        DROP TRIGGER IF EXISTS returns_bump_version ON returns;
+        DROP TRIGGER IF EXISTS individual_orders_bump_version ON individual_orders;
+        DROP TRIGGER IF EXISTS users_bump_version ON users;
+        DROP TRIGGER IF EXISTS products_change_version ON products;
+        DROP FUNCTION IF EXISTS bump_resource_version();
+        DROP FUNCTION IF EXISTS products_set_change_version();
+        DROP FUNCTION IF EXISTS products_change_version();
+        DROP TABLE IF EXISTS resource_versions;
+
+        -- Номера транзакций больше любого значения прежнего счётчика, поэтому
+        -- версии, сохранённые клиентами синхронизации, остаются корректными
+        CREATE TRIGGER products_change_version
+            BEFORE INSERT OR UPDATE ON products
+            FOR EACH ROW EXECUTE FUNCTION set_change_version();
+        CREATE TRIGGER orders_change_version
+            BEFORE INSERT OR UPDATE ON orders
+            FOR EACH ROW EXECUTE FUNCTION set_change_version();
+        CREATE TRIGGER returns_change_version
+            BEFORE INSERT OR UPDATE ON returns
+            FOR EACH ROW EXECUTE FUNCTION set_change_version();
+        CREATE TRIGGER individual_orders_change_version
+            BEFORE INSERT OR UPDATE ON individual_orders
+            FOR EACH ROW EXECUTE FUNCTION set_change_version();
+        -- Список заказов показывает имя клиента, поэтому зависит и от users
+        CREATE TRIGGER users_change_version
+            BEFORE INSERT OR UPDATE ON users
+            FOR EACH ROW EXECUTE FUNCTION set_change_version();
+
+        CREATE TRIGGER products_log_deletion
+            AFTER DELETE OR TRUNCATE ON products
+            FOR EACH STATEMENT EXECUTE FUNCTION log_resource_deletion('products');
+        CREATE TRIGGER orders_log_deletion
+            AFTER DELETE OR TRUNCATE ON orders
+            FOR EACH STATEMENT EXECUTE FUNCTION log_resource_deletion('orders');
+        CREATE TRIGGER returns_log_deletion
+            AFTER DELETE OR TRUNCATE ON returns
+            FOR EACH STATEMENT EXECUTE FUNCTION log_resource_deletion('returns');
+        CREATE TRIGGER individual_orders_log_deletion
+            AFTER DELETE OR TRUNCATE ON individual_orders
+            FOR EACH STATEMENT EXECUTE FUNCTION log_resource_deletion('individual_orders');
+        CREATE TRIGGER users_log_deletion
+            AFTER DELETE OR TRUNCATE ON users
+            FOR EACH STATEMENT EXECUTE FUNCTION log_resource_deletion('users');
+
+        -- Версия набора ресурсов: наибольший номер транзакции среди их строк и
+        -- удалений. Транзакция с меньшим номером, ещё не зафиксированная, может
+        -- изменить данные, не увеличив такую версию, — тогда версия неустойчива
+        -- и функция возвращает NULL (ответ отдаётся без ETag)
+        CREATE OR REPLACE FUNCTION resource_version(resources TEXT[]) RETURNS BIGINT AS $$
+        DECLARE
+            table_name TEXT;
+            latest BIGINT;
+            result BIGINT := 0;
+        BEGIN
+            FOREACH table_name IN ARRAY resources LOOP
+                EXECUTE format('SELECT max(change_version) FROM %I', table_name) INTO latest;
+                result := GREATEST(result, latest);
+            END LOOP;
+            SELECT GREATEST(result, max(d.change_version)) INTO result
+            FROM resource_deletions d
+            WHERE d.resource = ANY(resources);
+            IF result >= pg_snapshot_xmin(pg_current_snapshot())::TEXT::BIGINT THEN
+                RETURN NULL;
+            END IF;
+            RETURN result;
+        END;
+        $$ LANGUAGE plpgsql STABLE;
+    """),
+]
+
+
+async def _ensure_migrations_table(connection):
+    await connection.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+    """)
+
+
+async def get_applied_versions(connection):
+    await _ensure_migrations_table(connection)
+    rows = await connection.fetch("SELECT version FROM schema_migrations")
+    return {row["version"] for row in rows}
+
+
+async def migrate(dsn=DATABASE_URL):
+    """Применяет все ещё не применённые миграции. Возвращает их версии."""
+    connection = await asyncpg.connect(dsn)
+    try:
+        await connection.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK_ID)
+        try:
+            applied = await get_applied_versions(connection)
+            newly_applied = []
+            for migration in MIGRATIONS:
+                if migration.version in applied:
+                    continue
+                async with connection.transaction():
+                    await connection.execute(migration.sql)
+                    await connection.execute(
+                        "INSERT INTO schema_migrations (version, description) VALUES ($1, $2)",
+                        migration.version, migration.description
+                    )
+                logger.info("Applied migration %s: %s", migration.version, migration.description)
+                newly_applied.append(migration.version)
+            return newly_applied
+        finally:
+            await connection.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_ID)
+    finally:
+        await connection.close()
+
+
+async def _print_status(dsn):
+    connection = await asyncpg.connect(dsn)
+    try:
+        applied = await get_applied_versions(connection)
+    finally:
+        await connection.close()
+    for migration in MIGRATIONS:
+        mark = "x" if migration.version in applied else " "
+        print(f"[{mark}] {migration.version:04d} {migration.description}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Миграции схемы базы магазина")
+    parser.add_argument("--dsn", default=DATABASE_URL, help="строка подключения к PostgreSQL")
+    parser.add_argument("--list", action="store_true", help="показать применённые миграции")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.list:
+        asyncio.run(_print_status(args.dsn))
+    else:
+        versions = asyncio.run(migrate(args.dsn))
+        print(f"Applied: {versions}" if versions else "Database is up to date")
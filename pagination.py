@@ -0,0 +1,77 @@
+"""Keyset-пагинация для списков.
+
+Курсор — base64 от JSON со значениями ключа сортировки последней
+записи страницы. Клиент передаёт его как есть в параметре `after`.
+"""
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Generic, List, Optional, TypeVar
+
+from fastapi import HTTPException, Query
+from pydantic import BaseModel
+
+from responses import model_rows
+
+T = TypeVar("T")
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+
+
+class PageParams:
+    """Параметры страницы. Без limit и after список отдаётся целиком, как раньше."""
+
+    def __init__(
+            self,
+            limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы"),
+            after: Optional[str] = Query(None, description="Курсор из next_cursor предыдущей страницы"),
+            with_total: bool = Query(True, description="Посчитать общее количество записей"),
+    ):
+        self.paginated = limit is not None or after is not None
+        self.limit = limit or DEFAULT_PAGE_SIZE
+        self.after = after
+        self.with_total = with_total
+
+
+def _cursor_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(*values):
+    data = json.dumps([_cursor_value(value) for value in values])
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_cursor(cursor, *types):
+    """Разбирает курсор в значения указанных типов (int, Decimal, datetime, ...)."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if len(values) != len(types):
+            raise ValueError(cursor)
+        return [datetime.fromisoformat(value) if type_ is datetime else type_(value)
+                for type_, value in zip(types, values)]
+    except (ValueError, TypeError, ArithmeticError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def build_page(rows, params, key, total=None, model=None):
+    """Собирает страницу из limit + 1 строк: лишняя строка означает, что есть продолжение.
+
+    С model в элементы попадают только поля схемы (для responses.fast_response).
+    """
+    items = rows[:params.limit]
+    next_cursor = encode_cursor(*key(items[-1])) if len(rows) > params.limit else None
+    items = model_rows(model, items) if model is not None else [dict(row) for row in items]
+    return {"items": items, "next_cursor": next_cursor, "total": total}
@@ -0,0 +1,82 @@
+"""Чтение файлов массовой загрузки товаров (CSV и XLSX).
+
+Первая строка файла — заголовки с именами полей API: name, article,
+type, material, insert_type, weight, price, stock_quantity, image_id.
+Результат — список словарей "поле -> значение" в порядке строк файла.
+"""
+import csv
+import io
+
+from openpyxl import load_workbook
+
+PRODUCT_FIELDS = ("name", "article", "type", "material", "insert_type", "weight", "price", "stock_quantity",
+                  "image_id")
+DECIMAL_FIELDS = ("weight", "price")
+TEXT_FIELDS = ("name", "article", "type", "material", "insert_type")
+
+
+class ImportFileError(ValueError):
+    pass
+
+
+def _decode(content):
+    # Excel в русской локали сохраняет CSV в cp1251
+    for encoding in ("utf-8-sig", "cp1251"):
+        try:
+            return content.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    raise ImportFileError("Unsupported CSV encoding, expected UTF-8 or cp1251")
+
+
+def _normalize(row):
+    result = {
+        str(key).strip(): value.strip() if isinstance(value, str) else value
+        for key, value in row.items()
+        if key is not None and str(key).strip() in PRODUCT_FIELDS and value not in (None, "")
+    }
+    # Числовая ячейка XLSX в текстовом поле (артикул 12345): openpyxl отдаёт int/float
+    for field in TEXT_FIELDS:
+        value = result.get(field)
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        if value is not None and not isinstance(value, str):
+            result[field] = str(value)
+    # Десятичная запятая: "2,5" -> "2.5"
+    for field in DECIMAL_FIELDS:
+        if isinstance(result.get(field), str):
+            result[field] = result[field].replace(",", ".")
+    return result
+
+
+def read_csv(content):
+    text = _decode(content)
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    return [_normalize(row) for row in csv.DictReader(io.StringIO(text), dialect=dialect)]
+
+
+def read_xlsx(content):
+    try:
+        workbook = load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+    except Exception as e:
+        raise ImportFileError(f"Cannot read XLSX file: {e}")
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return []
+        return [_normalize(dict(zip(header, values))) for values in rows if any(v is not None for v in values)]
+    finally:
+        workbook.close()
+
+
+def read_products_file(filename, content):
+    name = (filename or "").lower()
+    if name.endswith(".xlsx"):
+        return read_xlsx(content)
+    if name.endswith(".csv") or name.endswith(".txt"):
+        return read_csv(content)
+    raise ImportFileError("Unsupported file type, expected .csv or .xlsx")
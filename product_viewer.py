@@ -121,7 +121,7 @@ class ProductCard(QFrame):
 
     def load_image(self):
         try:
-            response = requests.get(self.product.image_url, stream=True)
+            response = requests.get(self.product.image_url, params={"w": 200}, stream=True)
             if response.status_code == 200:
                 pixmap = QPixmap()
                 pixmap.loadFromData(response.content)
@@ -279,7 +279,7 @@ class ProductDialog(QDialog):
 
     def load_image(self):
         try:
-            response = requests.get(self.product.image_url, stream=True)
+            response = requests.get(self.product.image_url, params={"w": 400}, stream=True)
             if response.status_code == 200:
                 pixmap = QPixmap()
                 pixmap.loadFromData(response.content)
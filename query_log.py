@@ -0,0 +1,104 @@
+"""Журнал медленных запросов с привязкой к маршруту API.
+
+Каждое соединение пула передаёт сюда все выполненные запросы
+(см. database.init_connection). Маршрут берётся из контекста запроса,
+который выставляют зависимости get_db_pool/get_read_pool.
+"""
+import json
+import logging
+import os
+import re
+import time
+from contextvars import ContextVar
+
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+SLOW_QUERY_TOP_N = int(os.getenv("DB_SLOW_QUERY_TOP_N", "20"))
+# Ограничение на число различных (маршрут, запрос) в таблице
+SLOW_QUERY_MAX_ENTRIES = 1000
+
+slow_query_logger = logging.getLogger("slow_query")
+
+current_route = ContextVar("current_route", default="-")
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w$])\d+(?:\.\d+)?\b")
+
+_fingerprints = {}
+# (маршрут, отпечаток) -> статистика медленных выполнений
+_slow_queries = {}
+
+
+def fingerprint(query):
+    """Нормализованный текст запроса: без литералов и лишних пробелов."""
+    result = _fingerprints.get(query)
+    if result is None:
+        result = _WHITESPACE.sub(" ", query).strip()
+        result = _STRING_LITERAL.sub("?", result)
+        result = _NUMBER_LITERAL.sub("?", result)
+        if len(_fingerprints) < SLOW_QUERY_MAX_ENTRIES:
+            _fingerprints[query] = result
+    return result
+
+
+def set_route(request):
+    route = request.scope.get("route")
+    current_route.set(f"{request.method} {route.path if route else request.url.path}")
+
+
+def log_query(record):
+    """Обработчик asyncpg (Connection.add_query_logger) для каждого запроса."""
+    record_query(record.query, record.elapsed, record.exception)
+
+
+def record_query(query, elapsed, exception=None):
+    """Учёт запроса, выполненного мимо add_query_logger (через Connection.prepare)."""
+    elapsed_ms = elapsed * 1000
+    if elapsed_ms < SLOW_QUERY_THRESHOLD_MS:
+        return
+
+    route = current_route.get()
+    query = fingerprint(query)
+    slow_query_logger.warning(json.dumps({
+        "event": "slow_query",
+        "route": route,
+        "query": query,
+        "duration_ms": round(elapsed_ms, 3),
+        "error": type(exception).__name__ if exception else None,
+    }, ensure_ascii=False))
+
+    key = (route, query)
+    entry = _slow_queries.get(key)
+    if entry is None:
+        if len(_slow_queries) >= SLOW_QUERY_MAX_ENTRIES:
+            # Вытесняем запись с наименьшим суммарным временем
+            del _slow_queries[min(_slow_queries, key=lambda k: _slow_queries[k]["total_ms"])]
+        entry = _slow_queries[key] = {
+            "route": route,
+            "query": query,
+            "count": 0,
+            "total_ms": 0.0,
+            "max_ms": 0.0,
+        }
+    entry["count"] += 1
+    entry["total_ms"] += elapsed_ms
+    entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+    entry["last_seen"] = time.time()
+
+
+def get_slow_queries(limit=SLOW_QUERY_TOP_N):
+    """Самые затратные медленные запросы по суммарному времени."""
+    entries = sorted(_slow_queries.values(), key=lambda entry: entry["total_ms"], reverse=True)[:limit]
+    return [
+        {
+            **entry,
+            "total_ms": round(entry["total_ms"], 3),
+            "max_ms": round(entry["max_ms"], 3),
+            "avg_ms": round(entry["total_ms"] / entry["count"], 3),
+        }
+        for entry in entries
+    ]
+
+
+def reset_slow_queries():
+    _slow_queries.clear()
@@ -0,0 +1,90 @@
+"""Быстрая сериализация ответов API.
+
+По умолчанию ответ кодируется orjson, клиенту с заголовком
+`Accept: application/msgpack` отдаётся MessagePack (если пакет msgpack
+установлен; иначе — JSON).
+
+Строки из базы доверенные: запросы реестра возвращают ровно те типы,
+что описаны в схемах ответа. Поэтому списки отдаются через
+fast_response без повторной проверки pydantic — из строки берутся
+только поля схемы (model_rows), схема остаётся в response_model для
+документации.
+"""
+from datetime import date, datetime, time
+from decimal import Decimal
+from functools import lru_cache
+
+import orjson
+from fastapi import Response
+from fastapi.responses import JSONResponse
+
+try:
+    import msgpack
+except ImportError:  # MessagePack необязателен
+    msgpack = None
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def _msgpack_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    raise TypeError(f"Type is not MessagePack serializable: {type(value).__name__}")
+
+
+def dumps_json(content):
+    return orjson.dumps(content, default=_json_default)
+
+
+def dumps_msgpack(content):
+    return msgpack.packb(content, default=_msgpack_default)
+
+
+def wants_msgpack(request):
+    return msgpack is not None and MSGPACK_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+@lru_cache(maxsize=None)
+def _model_fields(model):
+    return tuple(model.model_fields)
+
+
+def model_rows(model, rows):
+    """Записи asyncpg -> словари только с полями схемы ответа, без проверки."""
+    fields = _model_fields(model)
+    return [{field: row[field] for field in fields} for row in rows]
+
+
+def fast_response(request, content, headers=None, status_code=200):
+    """Кодирует готовые данные в MessagePack или JSON в зависимости от Accept."""
+    headers = {**(headers or {}), "Vary": "Accept"}
+    if wants_msgpack(request):
+        return Response(dumps_msgpack(content), status_code=status_code, headers=headers,
+                        media_type=MSGPACK_MEDIA_TYPE)
+    return Response(dumps_json(content), status_code=status_code, headers=headers, media_type="application/json")
+
+
+def json_text_response(request, body, headers=None):
+    """Ответ из JSON, собранного в базе (json_agg/json_build_object): текст отдаётся как есть.
+
+    Клиенту MessagePack тот же документ перекодируется.
+    """
+    headers = {**(headers or {}), "Vary": "Accept"}
+    if wants_msgpack(request):
+        return Response(dumps_msgpack(orjson.loads(body)), headers=headers, media_type=MSGPACK_MEDIA_TYPE)
+    return Response(body, headers=headers, media_type="application/json")
+
+
+class FastJSONResponse(JSONResponse):
+    """Ответ по умолчанию: то же, что JSONResponse, но кодирует orjson."""
+
+    def render(self, content):
+        return dumps_json(content)
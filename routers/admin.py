@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Query
+from query_log import get_slow_queries, reset_slow_queries, SLOW_QUERY_THRESHOLD_MS, SLOW_QUERY_TOP_N
+from statements import get_statement_stats
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+
+# 📊 Статистика подготовленных запросов
+@router.get("/statements")
+async def statement_stats():
+    return get_statement_stats()
+
+
+# 🐢 Самые медленные запросы по маршрутам
+@router.get("/slow-queries")
+async def slow_queries(limit: int = Query(SLOW_QUERY_TOP_N, ge=1, le=1000)):
+    return {
+        "threshold_ms": SLOW_QUERY_THRESHOLD_MS,
+        "queries": get_slow_queries(limit),
+    }
+
+
+@router.delete("/slow-queries")
+async def clear_slow_queries():
+    reset_slow_queries()
+    return {"message": "Slow query log cleared"}
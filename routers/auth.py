@@ -24,9 +24,7 @@ async def login(login_data: LoginRequest, db_pool=Depends(get_db_pool)):
     password = login_data.password
 
     async with db_pool.acquire() as connection:
-        user = await connection.fetchrow(
-            "SELECT user_id, username, password_hash, role FROM users WHERE username = $1", username
-        )
+        user = await connection.fetchrow_named("auth.get_user", username)
 
         if not user:
             raise HTTPException(status_code=401, detail="Invalid credentials")
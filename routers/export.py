@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import os
+from datetime import date, datetime, time, timedelta
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from database import get_read_pool
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/export", tags=["Export"])
+
+# Сколько блоков COPY может ждать отправки клиенту: память процесса не растёт
+# с размером выгрузки, медленный клиент притормаживает чтение из базы
+EXPORT_QUEUE_SIZE = 16
+# Общий лимит на весь COPY, включая ожидание медленного клиента. Без него
+# asyncpg берёт command_timeout пула (DB_COMMAND_TIMEOUT) и обрывает большие выгрузки
+EXPORT_TIMEOUT = float(os.getenv("EXPORT_TIMEOUT", str(60 * 60)))
+
+UTF8_BOM = "\ufeff".encode()
+
+# Таблица -> (запрос, есть ли фильтр по статусу).
+# Параметры: $1, $2 — интервал дат [с, по), $3 — статус или NULL
+EXPORTS = {
+    "products": ("""
+        SELECT product_id, name, article, type, material, insert_type, weight, price,
+               stock_quantity, image_id, created_at
+        FROM products
+        WHERE created_at >= $1 AND created_at < $2
+        ORDER BY product_id
+    """, False),
+    "orders": ("""
+        SELECT o.order_id, o.client_id, u.username, o.order_date, o.status,
+               COALESCE(SUM(oi.quantity), 0) AS items_count,
+               COALESCE(SUM(oi.quantity * p.price), 0) AS total_amount
+        FROM orders o
+        JOIN users u ON o.client_id = u.user_id
+        LEFT JOIN order_items oi ON oi.order_id = o.order_id
+        LEFT JOIN products p ON p.product_id = oi.product_id
+        WHERE o.order_date >= $1 AND o.order_date < $2 AND ($3::text IS NULL OR o.status = $3)
+        GROUP BY o.order_id, u.username
+        ORDER BY o.order_id
+    """, True),
+    "returns": ("""
+        SELECT r.return_id, r.order_id, r.client_id, u.username, r.return_date, r.description, r.status
+        FROM returns r
+        LEFT JOIN users u ON r.client_id = u.user_id
+        WHERE r.return_date >= $1 AND r.return_date < $2 AND ($3::text IS NULL OR r.status = $3)
+        ORDER BY r.return_id
+    """, True),
+    "users": ("""
+        SELECT u.user_id, u.username, r.name AS role, u.created_at
+        FROM users u
+        JOIN roles r ON u.role = r.role_id
+        WHERE u.created_at >= $1 AND u.created_at < $2
+        ORDER BY u.user_id
+    """, False),
+}
+
+
+async def _stream_copy(db, query, args, bom):
+    """Отдаёт результат COPY ... TO STDOUT (CSV) по мере получения из базы."""
+    async with db.acquire() as connection:
+        queue = asyncio.Queue(maxsize=EXPORT_QUEUE_SIZE)
+
+        async def output(chunk):
+            await queue.put(bytes(chunk))
+
+        async def copy():
+            try:
+                await connection.copy_from_query(
+                    query, *args, output=output, format="csv", header=True, timeout=EXPORT_TIMEOUT
+                )
+            finally:
+                await queue.put(None)
+
+        task = asyncio.create_task(copy())
+        try:
+            if bom:
+                yield UTF8_BOM
+            while (chunk := await queue.get()) is not None:
+                yield chunk
+            # Ошибка COPY, если была, поднимается здесь
+            await task
+        finally:
+            if not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+
+
+# 📤 Выгрузка таблицы в CSV (потоково, без загрузки в память)
+@router.get("/{table}.csv")
+async def export_csv(
+        table: Literal["products", "orders", "returns", "users"],
+        date_from: Optional[date] = Query(None, description="С даты (включительно)"),
+        date_to: Optional[date] = Query(None, description="По дату (включительно)"),
+        status: Optional[str] = Query(None, description="Статус (только orders и returns)"),
+        bom: bool = Query(False, description="Добавить BOM, чтобы Excel распознал UTF-8"),
+        db=Depends(get_read_pool)
+):
+    query, has_status = EXPORTS[table]
+    if status is not None and not has_status:
+        raise HTTPException(status_code=400, detail=f"Status filter is not supported for {table}")
+
+    start = datetime.combine(date_from, time.min) if date_from else datetime.min
+    end = datetime.combine(date_to + timedelta(days=1), time.min) if date_to else datetime.max
+    args = (start, end, status) if has_status else (start, end)
+
+    stream = _stream_copy(db, query, args, bom)
+    # Первый блок читаем сразу: ошибки соединения (503) вернутся обычным ответом, а не оборванным файлом
+    first = await anext(stream)
+
+    async def body():
+        yield first
+        try:
+            async for chunk in stream:
+                yield chunk
+        except Exception:
+            # Заголовки уже отправлены: исключение обрывает соединение без завершающего
+            # блока, и клиент видит ошибку загрузки, а не укороченный файл
+            logger.exception(f"Export of {table} failed after the response has started")
+            raise
+
+    filename = f"{table}_{datetime.now():%Y%m%d_%H%M%S}.csv"
+    return StreamingResponse(body(), media_type="text/csv; charset=utf-8", headers={
+        "Content-Disposition": f'attachment; filename="{filename}"'
+    })
@@ -1,33 +1,219 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import StreamingResponse
-from io import BytesIO
+import asyncio
+import logging
+import os
+import uuid
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+import anyio
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Request, Response, Query, BackgroundTasks
+from fastapi.routing import APIRoute
+from fastapi.responses import FileResponse, StreamingResponse
 from database import get_db_pool
+from image_store import (
+    store, get_image_meta, get_images_meta, IMAGE_MAX_UPLOAD_SIZE, IMAGE_READ_CHUNK_SIZE,
+    ImageTooLargeError, UnsupportedImageTypeError
+)
+from image_renditions import RENDITION_WIDTHS, accepts_webp, ensure_rendition, create_renditions, make_placeholder
+
+logger = logging.getLogger(__name__)
+
+# Изображение с данным id никогда не меняется (байты адресуются хешем),
+# поэтому ответ можно кэшировать навсегда
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+IMAGE_BATCH_MAX = 100
+# Тело multipart-запроса: файл плюс заголовки частей и поля формы
+IMAGE_MAX_REQUEST_SIZE = IMAGE_MAX_UPLOAD_SIZE + 64 * 1024
+
+
+class ImageRoute(APIRoute):
+    """Отклоняет слишком большой запрос по Content-Length до разбора формы.
+
+    FastAPI читает всё тело формы до вызова зависимостей и обработчика,
+    поэтому проверка в них срабатывала бы уже после приёма файла. Запрос без
+    Content-Length (chunked) ограничивает store.save_upload при записи.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request):
+            content_length = request.headers.get("content-length", "")
+            if content_length.isdigit() and int(content_length) > IMAGE_MAX_REQUEST_SIZE:
+                raise HTTPException(status_code=413, detail=f"Image is larger than {IMAGE_MAX_UPLOAD_SIZE} bytes")
+            return await handler(request)
+
+        return route_handler
+
+
+router = APIRouter(prefix="/images", tags=["Images"], route_class=ImageRoute)
+
+
+def _cache_headers(image, w, media_type):
+    etag = image["sha256"] + (f"-w{w}" if w else "")
+    # Формат в ETag — тот, что реально отдаётся: WebP-копия, копия в другом
+    # формате или оригинал, если копию сделать не удалось
+    if media_type != image["content_type"]:
+        etag += "." + media_type.split("/")[-1]
+    return {
+        "ETag": f'"{etag}"',
+        "Cache-Control": IMAGE_CACHE_CONTROL,
+        "Last-Modified": format_datetime(image["created_at"], usegmt=True),
+        # Формат ответа зависит от Accept (WebP или исходный)
+        "Vary": "Accept",
+    }
+
+
+def _not_modified(request, headers, created_at):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or headers["ETag"] in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return created_at.replace(microsecond=0) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _check_width(w):
+    if w is not None and w not in RENDITION_WIDTHS:
+        raise HTTPException(status_code=400, detail=f"Unsupported width, allowed: {list(RENDITION_WIDTHS)}")
+
+
+async def _image_file(image, w, webp):
+    """Путь к файлу (оригиналу, превью или WebP-копии) и его content_type; None, если файла нет."""
+    path = store.path(image["sha256"])
+    if not os.path.exists(path):
+        return None, None
+    try:
+        return await ensure_rendition(image["sha256"], w, image["content_type"], webp)
+    except Exception:
+        # Файл, который Pillow не читает, отдаётся как есть
+        logger.warning("Could not create %s rendition of image %s", f"{w}px" if w else "WebP", image["image_id"],
+                       exc_info=True)
+    return path, image["content_type"]
+
+
+async def _batch_part(image, w, webp):
+    """(image_id, content_type, ETag, размер, путь или байты) для части ответа /batch."""
+    if image["sha256"] is None:
+        return image["image_id"], image["content_type"], None, len(image["data"]), image["data"]
+    path, media_type = await _image_file(image, w, webp)
+    if path is None:
+        return None
+    size = await anyio.to_thread.run_sync(os.path.getsize, path)
+    return image["image_id"], media_type, _cache_headers(image, w, media_type)["ETag"], size, path
+
+
+async def _multipart_body(parts, boundary):
+    for image_id, media_type, etag, size, source in parts:
+        headers = [f"--{boundary}", f"Content-Type: {media_type}", f"Content-Length: {size}", f"X-Image-Id: {image_id}"]
+        if etag:
+            headers.append(f"ETag: {etag}")
+        yield ("\r\n".join(headers) + "\r\n\r\n").encode()
+        if isinstance(source, bytes):
+            yield source
+        else:
+            async with await anyio.open_file(source, "rb") as file:
+                while chunk := await file.read(IMAGE_READ_CHUNK_SIZE):
+                    yield chunk
+        yield b"\r\n"
+    yield f"--{boundary}--\r\n".encode()
 
-router = APIRouter(prefix="/images", tags=["Images"])
 
 @router.post("/upload/")
-async def upload_image(file: UploadFile = File(...)):
-    pool = await get_db_pool()
-    content = await file.read()
+async def upload_image(background_tasks: BackgroundTasks, file: UploadFile = File(...), pool=Depends(get_db_pool)):
+    # Размер запроса уже проверен по Content-Length (ImageRoute), файл пишется
+    # на диск по частям с проверкой размера, в базу — только метаданные
+    try:
+        sha256, size, content_type = await store.save_upload(file)
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UnsupportedImageTypeError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+
+    # Микропревью для списков товаров — до записи в базу, чтобы оно было в строке с самого начала
+    placeholder = await make_placeholder(sha256)
 
     async with pool.acquire() as conn:
-        result = await conn.fetchrow("""
-            INSERT INTO images (filename, content_type, data)
-            VALUES ($1, $2, $3)
-            RETURNING image_id
-        """, file.filename, file.content_type, content)
+        async with conn.transaction():
+            await conn.fetchval_named("images.lock_sha", sha256)
+            # Повторная загрузка того же файла возвращает уже существующее изображение
+            existing = await conn.fetchrow_named("images.find_by_sha", sha256)
+            if existing:
+                return {"id": existing["image_id"], "filename": existing["filename"], "duplicate": True}
+            result = await conn.fetchrow_named("images.create", file.filename, content_type, sha256, size,
+                                               placeholder)
 
-    return {"id": result["image_id"], "filename": file.filename}
+    # Превью всех размеров готовятся после ответа клиенту
+    background_tasks.add_task(create_renditions, sha256, content_type)
+
+    return {"id": result["image_id"], "filename": file.filename, "duplicate": False}
+
+# 🖼 Несколько изображений одним ответом (multipart/mixed) — для сетки каталога.
+# Каждая часть несёт Content-Length и X-Image-Id; ненайденные id — в заголовке X-Missing-Images
+@router.get("/batch")
+async def get_images_batch(
+        request: Request,
+        ids: str = Query(..., description="id изображений через запятую"),
+        w: Optional[int] = Query(None, description=f"Размер превью: {', '.join(map(str, RENDITION_WIDTHS))}"),
+        pool=Depends(get_db_pool)
+):
+    _check_width(w)
+    try:
+        image_ids = list(dict.fromkeys(int(image_id) for image_id in ids.split(",") if image_id.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+    if not image_ids:
+        raise HTTPException(status_code=400, detail="No image ids given")
+    if len(image_ids) > IMAGE_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {IMAGE_BATCH_MAX} images per request")
+
+    images = await get_images_meta(pool, image_ids)
+    # Превью готовятся параллельно в пуле процессов
+    webp = accepts_webp(request)
+    parts = await asyncio.gather(*(
+        _batch_part(images[image_id], w, webp) for image_id in image_ids if image_id in images
+    ))
+    parts = [part for part in parts if part is not None]
+    found = {part[0] for part in parts}
+    missing = [str(image_id) for image_id in image_ids if image_id not in found]
+
+    boundary = uuid.uuid4().hex
+    return StreamingResponse(_multipart_body(parts, boundary), media_type=f"multipart/mixed; boundary={boundary}",
+                             headers={"X-Missing-Images": ",".join(missing), "Vary": "Accept"})
 
 @router.get("/{image_id}")
-async def get_image(image_id: int):
-    pool = await get_db_pool()
+async def get_image(
+        request: Request,
+        image_id: int,
+        w: Optional[int] = Query(None, description=f"Размер превью: {', '.join(map(str, RENDITION_WIDTHS))}"),
+        pool=Depends(get_db_pool)
+):
+    _check_width(w)
 
-    async with pool.acquire() as conn:
-        row = await conn.fetchrow("SELECT filename, content_type, data FROM images WHERE image_id = $1", image_id)
-        if not row:
-            raise HTTPException(status_code=404, detail="Image not found")
+    image = await get_image_meta(pool, image_id)
+    if not image:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    # Ещё не перенесённое в хранилище изображение отдаётся из базы
+    if image["sha256"] is None:
+        return Response(image["data"], media_type=image["content_type"], headers={
+            "Content-Disposition": f'inline; filename="{image["filename"]}"'
+        })
+
+    # Готовая копия не перечитывается: _image_file только проверяет, что она есть
+    path, media_type = await _image_file(image, w, accepts_webp(request))
+    if path is None:
+        raise HTTPException(status_code=404, detail="Image file not found")
+
+    headers = _cache_headers(image, w, media_type)
+    if _not_modified(request, headers, image["created_at"]):
+        return Response(status_code=304, headers=headers)
 
-    return StreamingResponse(BytesIO(row["data"]), media_type=row["content_type"], headers={
-        "Content-Disposition": f'inline; filename="{row["filename"]}"'
-    })
+    # FileResponse обслуживает Range/If-Range (докачка больших оригиналов)
+    return FileResponse(path, media_type=media_type, filename=image["filename"],
+                        content_disposition_type="inline", headers=headers)
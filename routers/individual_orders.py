@@ -1,8 +1,11 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Union
 from datetime import datetime
-from database import get_db_pool
+from database import get_db_pool, get_read_pool
+from versioning import check_not_modified, get_version
+from pagination import Page, PageParams, build_page, decode_cursor
+from responses import fast_response, model_rows
 
 router = APIRouter(prefix="/individual-orders", tags=["Individual Orders"])
 
@@ -37,33 +40,53 @@ class IndividualOrderUpdate(BaseModel):
     status: Optional[str] = None
 
 
-# 📄 Получить все индивидуальные заказы
-@router.get("/get/all/", response_model=List[IndividualOrderOut])
+# 📄 Получить все индивидуальные заказы (постранично, если передан limit или after)
+@router.get("/get/all/", response_model=Union[List[IndividualOrderOut], Page[IndividualOrderOut]])
 async def get_all_individual_orders(
+        request: Request,
+        response: Response,
         status: Optional[str] = Query(None, description="Фильтр по статусу"),
-        db=Depends(get_db_pool)
+        page: PageParams = Depends(),
+        db=Depends(get_read_pool)
 ):
     async with db.acquire() as connection:
+        version = await get_version(connection, "individual_orders")
+        not_modified = check_not_modified(request, response, "individual_orders", version)
+        if not_modified:
+            return not_modified
+
+        if not page.paginated:
+            if status:
+                rows = await connection.fetch_named("individual_orders.get_all_by_status", status)
+            else:
+                rows = await connection.fetch_named("individual_orders.get_all")
+            return fast_response(request, model_rows(IndividualOrderOut, rows), response.headers)
+
+        # Первая страница начинается "после" самой поздней возможной записи
+        after_date, after_id = decode_cursor(page.after, datetime, int) if page.after else (datetime.max, 2 ** 31 - 1)
+        total = None
         if status:
-            rows = await connection.fetch(
-                "SELECT * FROM individual_orders WHERE status = $1 ORDER BY order_date DESC",
-                status
+            rows = await connection.fetch_named(
+                "individual_orders.get_page_by_status", after_date, after_id, page.limit + 1, status
             )
+            if page.with_total:
+                total = await connection.fetchval_named("individual_orders.count_by_status", status)
         else:
-            rows = await connection.fetch(
-                "SELECT * FROM individual_orders ORDER BY order_date DESC"
-            )
-        return [dict(row) for row in rows]
+            rows = await connection.fetch_named("individual_orders.get_page", after_date, after_id, page.limit + 1)
+            if page.with_total:
+                total = await connection.fetchval_named("individual_orders.count")
+        return fast_response(
+            request,
+            build_page(rows, page, lambda row: (row["order_date"], row["order_id"]), total, IndividualOrderOut),
+            response.headers
+        )
 
 
 # 🔎 Получить заказ по ID
 @router.get("/get/{order_id}", response_model=IndividualOrderOut)
 async def get_individual_order_by_id(order_id: int, db=Depends(get_db_pool)):
     async with db.acquire() as connection:
-        row = await connection.fetchrow(
-            "SELECT * FROM individual_orders WHERE order_id = $1",
-            order_id
-        )
+        row = await connection.fetchrow_named("individual_orders.get", order_id)
         if not row:
             raise HTTPException(status_code=404, detail="Individual order not found")
         return dict(row)
@@ -78,15 +101,9 @@ async def get_individual_orders_by_client(
 ):
     async with db.acquire() as connection:
         if status:
-            rows = await connection.fetch(
-                "SELECT * FROM individual_orders WHERE client_id = $1 AND status = $2 ORDER BY order_date DESC",
-                client_id, status
-            )
+            rows = await connection.fetch_named("individual_orders.get_by_client_status", client_id, status)
         else:
-            rows = await connection.fetch(
-                "SELECT * FROM individual_orders WHERE client_id = $1 ORDER BY order_date DESC",
-                client_id
-            )
+            rows = await connection.fetch_named("individual_orders.get_by_client", client_id)
         if not rows:
             raise HTTPException(
                 status_code=404,
@@ -102,18 +119,12 @@ async def create_individual_order(
         db=Depends(get_db_pool)
 ):
     async with db.acquire() as connection:
-        row = await connection.fetchrow("""
-            INSERT INTO individual_orders (
-                client_id, order_date, status, description, 
-                total_amount, delivery_address, contact_phone
-            ) VALUES (
-                $1, $2, $3, $4, $5, $6, $7
-            )
-            RETURNING *
-        """,
-                                        order_data.client_id, order_data.order_date, order_data.status,
-                                        order_data.description, order_data.total_amount,
-                                        order_data.delivery_address, order_data.contact_phone)
+        row = await connection.fetchrow_named(
+            "individual_orders.create",
+            order_data.client_id, order_data.order_date, order_data.status,
+            order_data.description, order_data.total_amount,
+            order_data.delivery_address, order_data.contact_phone
+        )
         return dict(row)
 
 
@@ -125,12 +136,7 @@ async def update_individual_order_status(
         db=Depends(get_db_pool)
 ):
     async with db.acquire() as connection:
-        row = await connection.fetchrow("""
-            UPDATE individual_orders
-            SET status = $1
-            WHERE order_id = $2
-            RETURNING *
-        """, status_update.status, order_id)
+        row = await connection.fetchrow_named("individual_orders.update_status", status_update.status, order_id)
         if not row:
             raise HTTPException(status_code=404, detail="Individual order not found")
         return dict(row)
@@ -167,7 +173,7 @@ async def update_individual_order(
         values = list(update_fields.values())
         values.append(order_id)
 
-        row = await connection.fetchrow(f"""
+        row = await connection.fetchrow_dynamic(f"""
             UPDATE individual_orders
             SET {set_clause}
             WHERE order_id = ${len(update_fields) + 1}
@@ -183,10 +189,7 @@ async def update_individual_order(
 @router.delete("/delete/{order_id}")
 async def delete_individual_order(order_id: int, db=Depends(get_db_pool)):
     async with db.acquire() as connection:
-        result = await connection.execute(
-            "DELETE FROM individual_orders WHERE order_id = $1",
-            order_id
-        )
+        result = await connection.execute_named("individual_orders.delete", order_id)
         if result == "DELETE 0":
             raise HTTPException(
                 status_code=404,
@@ -1,8 +1,10 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
 from pydantic import BaseModel
-from typing import List
+from typing import List, Literal, Optional, Union
 from datetime import datetime
-from database import get_db_pool
+from database import get_db_pool, get_read_pool
+from pagination import Page, PageParams, build_page, decode_cursor
+from responses import fast_response, model_rows
 
 router = APIRouter(prefix="/inventory", tags=["Inventory"])
 
@@ -20,18 +22,86 @@ class InventoryOut(BaseModel):
     quantity: int
     updated_at: datetime
 
-# 📄 Получить весь инвентарь
-@router.get("/", response_model=List[InventoryOut])
-async def get_inventory(db=Depends(get_db_pool)):
+class StockMovementOut(BaseModel):
+    movement_id: int
+    product_id: int
+    amount: int  # Положительное — поступление, отрицательное — списание
+    stock_after: int
+    reason: Optional[str] = None
+    created_at: datetime
+
+class StockMovementSummaryOut(BaseModel):
+    product_id: int
+    period_start: datetime
+    incoming: int
+    outgoing: int
+    net: int
+    movements: int
+
+# 📄 Получить весь инвентарь (постранично, если передан limit или after)
+@router.get("/", response_model=Union[List[InventoryOut], Page[InventoryOut]])
+async def get_inventory(request: Request, page: PageParams = Depends(), db=Depends(get_db_pool)):
+    async with db.acquire() as connection:
+        if not page.paginated:
+            rows = await connection.fetch_named("inventory.get_all")
+            return fast_response(request, model_rows(InventoryOut, rows))
+
+        after_id, = decode_cursor(page.after, int) if page.after else (0,)
+        rows = await connection.fetch_named("inventory.get_page", after_id, page.limit + 1)
+        total = await connection.fetchval_named("inventory.count") if page.with_total else None
+        return fast_response(request, build_page(rows, page, lambda row: (row["inventory_id"],), total, InventoryOut))
+
+# 📒 Журнал движения товаров (всегда постранично, от новых к старым)
+@router.get("/movements", response_model=Page[StockMovementOut])
+async def get_stock_movements(
+        request: Request,
+        product_id: Optional[int] = Query(None),
+        date_from: Optional[datetime] = Query(None, description="Начало интервала (включительно)"),
+        date_to: Optional[datetime] = Query(None, description="Конец интервала (не включительно)"),
+        page: PageParams = Depends(),
+        db=Depends(get_read_pool)
+):
+    date_from = date_from or datetime.min
+    date_to = date_to or datetime.max
+    after_date, after_id = decode_cursor(page.after, datetime, int) if page.after else (datetime.max, 0)
+    async with db.acquire() as connection:
+        if product_id is None:
+            rows = await connection.fetch_named(
+                "stock_movements.get_page", date_from, date_to, after_date, after_id, page.limit + 1
+            )
+        else:
+            rows = await connection.fetch_named(
+                "stock_movements.get_page_by_product", date_from, date_to, after_date, after_id, page.limit + 1,
+                product_id
+            )
+        total = await connection.fetchval_named(
+            "stock_movements.count", date_from, date_to, product_id
+        ) if page.with_total else None
+        return fast_response(
+            request, build_page(rows, page, lambda row: (row["created_at"], row["movement_id"]), total, StockMovementOut)
+        )
+
+# 📊 Итоги движения по товарам за период (день/неделя/месяц/год)
+@router.get("/movements/summary", response_model=List[StockMovementSummaryOut])
+async def get_stock_movement_summary(
+        request: Request,
+        period: Literal["day", "week", "month", "year"] = Query("month"),
+        product_id: Optional[int] = Query(None),
+        date_from: Optional[datetime] = Query(None, description="Начало интервала (включительно)"),
+        date_to: Optional[datetime] = Query(None, description="Конец интервала (не включительно)"),
+        db=Depends(get_read_pool)
+):
     async with db.acquire() as connection:
-        rows = await connection.fetch("SELECT * FROM inventory ORDER BY inventory_id")
-        return [dict(row) for row in rows]
+        rows = await connection.fetch_named(
+            "stock_movements.summary", period, date_from or datetime.min, date_to or datetime.max, product_id
+        )
+        return fast_response(request, model_rows(StockMovementSummaryOut, rows))
 
 # 🔎 Получить запись инвентаря по ID
 @router.get("/{inventory_id}", response_model=InventoryOut)
 async def get_inventory_item(inventory_id: int, db=Depends(get_db_pool)):
     async with db.acquire() as connection:
-        row = await connection.fetchrow("SELECT * FROM inventory WHERE inventory_id = $1", inventory_id)
+        row = await connection.fetchrow_named("inventory.get", inventory_id)
         if not row:
             raise HTTPException(status_code=404, detail="Inventory item not found")
         return dict(row)
@@ -40,7 +110,7 @@ async def get_inventory_item(inventory_id: int, db=Depends(get_db_pool)):
 @router.get("/product/{product_id}", response_model=InventoryOut)
 async def get_inventory_by_product(product_id: int, db=Depends(get_db_pool)):
     async with db.acquire() as connection:
-        row = await connection.fetchrow("SELECT * FROM inventory WHERE product_id = $1", product_id)
+        row = await connection.fetchrow_named("inventory.get_by_product", product_id)
         if not row:
             raise HTTPException(status_code=404, detail="Inventory item for this product not found")
         return dict(row)
@@ -49,9 +119,5 @@ async def get_inventory_by_product(product_id: int, db=Depends(get_db_pool)):
 @router.post("/", response_model=InventoryOut)
 async def create_inventory_item(item: InventoryItemCreate, db=Depends(get_db_pool)):
     async with db.acquire() as connection:
-        row = await connection.fetchrow("""
-            INSERT INTO inventory (product_id, quantity, updated_at)
-            VALUES ($1, $2, NOW())
-            RETURNING *
-        """, item.product_id, item.quantity)
+        row = await connection.fetchrow_named("inventory.create", item.product_id, item.quantity)
         return dict(row)
@@ -1,8 +1,13 @@
-from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional, Union
 from datetime import datetime
-from database import get_db_pool
+from database import get_db_pool, get_read_pool
+from versioning import check_not_modified, get_version
+from pagination import Page, PageParams, build_page, decode_cursor
+from responses import fast_response, json_text_response
+from stock import adjust_stock_batch, merge_amounts, set_movement_reason
+import asyncpg
 import logging
 
 # Настройка логирования
@@ -47,59 +52,64 @@ class OrderDetailOut(OrderOut):
 class OrderStatusUpdate(BaseModel):
     status: str
 
-# 📄 Получить все заказы
-@router.get("/get/all", response_model=List[OrderOut])
-async def get_orders(db=Depends(get_db_pool)):
+
+# 🛒 Оформление заказа со списанием остатков
+class CheckoutItem(BaseModel):
+    product_id: int
+    quantity: int = Field(..., gt=0)
+
+
+class CheckoutRequest(BaseModel):
+    client_id: int
+    status: str
+    items: List[CheckoutItem] = Field(..., min_length=1, max_length=1000)
+
+
+class CheckoutItemResult(BaseModel):
+    product_id: int
+    quantity: int
+    stock_quantity: Optional[int] = None  # Остаток после списания (или текущий, если не хватило)
+    status: Literal["ok", "insufficient", "not_found"]
+
+
+class CheckoutResult(BaseModel):
+    order_id: int
+    items: List[CheckoutItemResult]
+
+# 📄 Получить все заказы (постранично, если передан limit или after)
+@router.get("/get/all", response_model=Union[List[OrderOut], Page[OrderOut]])
+async def get_orders(
+        request: Request,
+        response: Response,
+        page: PageParams = Depends(),
+        db=Depends(get_read_pool)
+):
     async with db.acquire() as connection:
-        rows = await connection.fetch("""
-            SELECT o.*, u.username
-            FROM orders o
-            JOIN users u ON o.client_id = u.user_id
-            ORDER BY o.order_id
-        """)
-        return [dict(row) for row in rows]
+        version = await get_version(connection, "orders", "users")
+        not_modified = check_not_modified(request, response, "orders", version)
+        if not_modified:
+            return not_modified
+
+        if not page.paginated:
+            body = await connection.fetchval_named("orders.get_all_json")
+            return json_text_response(request, body, response.headers)
+
+        after_id, = decode_cursor(page.after, int) if page.after else (0,)
+        rows = await connection.fetch_named("orders.get_page", after_id, page.limit + 1)
+        total = await connection.fetchval_named("orders.count") if page.with_total else None
+        return fast_response(
+            request, build_page(rows, page, lambda row: (row["order_id"],), total, OrderOut), response.headers
+        )
 
 # 🔎 Получить заказ по ID
 @router.get("/get/{order_id}", response_model=OrderDetailOut)
-async def get_order(order_id: int, db=Depends(get_db_pool)):
+async def get_order(request: Request, order_id: int, db=Depends(get_db_pool)):
     async with db.acquire() as connection:
-        order = await connection.fetchrow("""
-            SELECT o.*, u.username
-            FROM orders o
-            JOIN users u ON o.client_id = u.user_id
-            WHERE o.order_id = $1
-        """, order_id)
-        if not order:
+        # Заказ с позициями одним запросом, JSON собирает база
+        body = await connection.fetchval_named("orders.get_json", order_id, None)
+        if body is None:
             raise HTTPException(status_code=404, detail="Order not found")
-
-        items = await connection.fetch("""
-            SELECT
-                oi.*,
-                p.price,
-                p.name as product_name,
-                p.article
-            FROM order_items oi
-            JOIN products p ON oi.product_id = p.product_id
-            WHERE oi.order_id = $1
-        """, order_id)
-
-        items_list = []
-        for item in items:
-            item_dict = dict(item)
-            items_list.append({
-                "item_id": item_dict["item_id"],
-                "order_id": item_dict["order_id"],
-                "product_id": item_dict["product_id"],
-                "product_name": item_dict["product_name"],
-                "article": item_dict["article"],
-                "quantity": item_dict["quantity"],
-                "price": item_dict["price"]
-            })
-
-        return {
-            **dict(order),
-            "items": items_list
-        }
+        return json_text_response(request, body)
 
 # ➕ Создать заказ с товарами
 @router.post("/create")
@@ -108,22 +118,16 @@ async def create_order(order: OrderCreate, db=Depends(get_db_pool)):
         async with connection.transaction():
             try:
                 # 1. Создаём заказ и получаем order_id
-                order_row = await connection.fetchrow("""
-                    INSERT INTO orders (client_id, order_date, status)
-                    VALUES ($1, NOW(), $2)
-                    RETURNING order_id
-                """, order.client_id, order.status)
+                order_row = await connection.fetchrow_named("orders.create", order.client_id, order.status)
                 order_id = order_row["order_id"]
                 logger.info(f"Order created with ID: {order_id}")
 
-                # 2. Добавляем все товары к заказу
-                for item in order.items:
-                    await connection.execute("""
-                        INSERT INTO order_items (order_id, product_id, quantity)
-                        VALUES ($1, $2, $3)
-                    """, order_id, item.product_id, item.quantity)
-                    logger.info(
-                        f"Added item to order {order_id}: product_id={item.product_id}, quantity={item.quantity}")
+                # 2. Добавляем все товары к заказу одним запросом
+                await connection.execute_named(
+                    "orders.add_items", order_id,
+                    [item.product_id for item in order.items], [item.quantity for item in order.items]
+                )
+                logger.info(f"Added {len(order.items)} item(s) to order {order_id}")
 
                 return {"message": "Order created successfully", "order_id": order_id}
 
@@ -132,11 +136,49 @@ async def create_order(order: OrderCreate, db=Depends(get_db_pool)):
                 raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
+# 🛒 Оформить заказ: заказ, позиции и списание остатков в одной транзакции.
+# Если хоть одного товара не хватает, ничего не сохраняется — 409 со списком проблемных позиций
+@router.post("/checkout", response_model=CheckoutResult)
+async def checkout(order: CheckoutRequest, db=Depends(get_db_pool)):
+    # Повторы одного товара в корзине — одна позиция
+    quantities = merge_amounts((item.product_id, item.quantity) for item in order.items)
+    async with db.acquire() as connection:
+        async with connection.transaction():
+            try:
+                order_row = await connection.fetchrow_named("orders.create", order.client_id, order.status)
+            except asyncpg.ForeignKeyViolationError:
+                raise HTTPException(status_code=404, detail="Client not found")
+            order_id = order_row["order_id"]
+
+            await set_movement_reason(connection, f"Order #{order_id}")
+            applied, results = await adjust_stock_batch(
+                connection, {product_id: -quantity for product_id, quantity in quantities.items()}
+            )
+            items = [
+                {"product_id": item["product_id"], "quantity": -item["amount"],
+                 "stock_quantity": item["stock_quantity"], "status": item["status"]}
+                for item in results
+            ]
+            if not applied:
+                # Исключение откатывает транзакцию вместе с созданным заказом
+                raise HTTPException(status_code=409, detail={
+                    "message": "Not enough stock",
+                    "items": [item for item in items if item["status"] != "ok"],
+                })
+
+            await connection.execute_named(
+                "orders.add_items", order_id, list(quantities), list(quantities.values())
+            )
+
+    logger.info(f"Checkout: order {order_id} with {len(quantities)} item(s)")
+    return {"order_id": order_id, "items": items}
+
+
 # ❌ Удалить заказ
 @router.delete("/{order_id}")
 async def delete_order(order_id: int, db=Depends(get_db_pool)):
     async with db.acquire() as connection:
-        result = await connection.execute("DELETE FROM orders WHERE order_id = $1", order_id)
+        result = await connection.execute_named("orders.delete", order_id)
         if result == "DELETE 0":
             raise HTTPException(status_code=404, detail="Order not found")
         return {"message": "Order deleted"}
@@ -144,53 +186,22 @@ async def delete_order(order_id: int, db=Depends(get_db_pool)):
 
 # 👤 Клиентские заказы
 @router.get("/client/{client_id}", response_model=List[OrderOut])
-async def get_client_orders(client_id: int, db=Depends(get_db_pool)):
+async def get_client_orders(request: Request, client_id: int, db=Depends(get_db_pool)):
     """Получить все заказы конкретного клиента"""
     async with db.acquire() as connection:
-        rows = await connection.fetch("""
-            SELECT o.*, u.username
-            FROM orders o
-            JOIN users u ON o.client_id = u.user_id
-            WHERE o.client_id = $1
-            ORDER BY o.order_date DESC
-        """, client_id)
-        return [dict(row) for row in rows]
+        body = await connection.fetchval_named("orders.get_by_client_json", client_id)
+        return json_text_response(request, body)
 
 
 @router.get("/client/{client_id}/{order_id}", response_model=OrderDetailOut)
-async def get_client_order(client_id: int, order_id: int, db=Depends(get_db_pool)):
+async def get_client_order(request: Request, client_id: int, order_id: int, db=Depends(get_db_pool)):
     """Получить конкретный заказ клиента"""
     async with db.acquire() as connection:
-        # Проверяем, что заказ принадлежит клиенту и получаем username
-        order = await connection.fetchrow("""
-            SELECT o.*, u.username
-            FROM orders o
-            JOIN users u ON o.client_id = u.user_id
-            WHERE o.order_id = $1 AND o.client_id = $2
-        """, order_id, client_id)
-
-        if not order:
+        # Заказ ищется только среди заказов клиента, позиции — в том же запросе
+        body = await connection.fetchval_named("orders.get_json", order_id, client_id)
+        if body is None:
             raise HTTPException(status_code=404, detail="Order not found for this client")
-
-        # Получаем items с полной информацией о продукте
-        items = await connection.fetch("""
-            SELECT 
-                oi.*, 
-                p.price,
-                p.name as product_name,
-                p.article
-            FROM order_items oi
-            JOIN products p ON oi.product_id = p.product_id
-            WHERE oi.order_id = $1
-        """, order_id)
-
-        return {
-            "order_id": order["order_id"],
-            "username": order["username"],
-            "order_date": order["order_date"],
-            "status": order["status"],
-            "items": [dict(item) for item in items]
-        }
+        return json_text_response(request, body)
 
 
 @router.post("/client/{client_id}/create")
@@ -209,10 +220,7 @@ async def create_client_order(client_id: int, order: OrderCreate, db=Depends(get
 async def delete_client_order(client_id: int, order_id: int, db=Depends(get_db_pool)):
     """Удалить заказ клиента (проверяя принадлежность)"""
     async with db.acquire() as connection:
-        result = await connection.execute(
-            "DELETE FROM orders WHERE order_id = $1 AND client_id = $2",
-            order_id, client_id
-        )
+        result = await connection.execute_named("orders.delete_for_client", order_id, client_id)
         if result == "DELETE 0":
             raise HTTPException(status_code=404, detail="Order not found or doesn't belong to client")
         return {"message": "Order deleted successfully"}
@@ -222,20 +230,13 @@ async def delete_client_order(client_id: int, order_id: int, db=Depends(get_db_p
 async def update_order_status(order_id: int, status_update: OrderStatusUpdate, db=Depends(get_db_pool)):
     async with db.acquire() as connection:
         # Обновляем статус заказа
-        updated_order = await connection.fetchrow("""
-            UPDATE orders
-            SET status = $1
-            WHERE order_id = $2
-            RETURNING order_id, client_id, order_date, status
-        """, status_update.status, order_id)
+        updated_order = await connection.fetchrow_named("orders.update_status", status_update.status, order_id)
 
         if not updated_order:
             raise HTTPException(status_code=404, detail="Order not found")
 
         # Получаем имя пользователя для ответа
-        username_row = await connection.fetchrow("""
-            SELECT username FROM users WHERE user_id = $1
-        """, updated_order['client_id'])
+        username_row = await connection.fetchrow_named("users.get_username", updated_order['client_id'])
 
         if not username_row:
             raise HTTPException(status_code=404, detail="User not found")
@@ -1,8 +1,18 @@
-from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, Body, UploadFile, File
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Dict, List, Literal, Optional, Union
 from datetime import datetime
-from database import get_db_pool
+from decimal import Decimal
+import html
+from database import get_db_pool, get_read_pool
+from versioning import check_not_modified, get_version, get_watermark
+from pagination import Page, PageParams, build_page, decode_cursor
+from catalog_snapshot import CatalogSnapshot
+from product_import import PRODUCT_FIELDS, ImportFileError, read_products_file
+from stock import adjust_stock_batch, merge_amounts, set_movement_reason
+from responses import fast_response, model_rows
+import asyncpg
 
 router = APIRouter(prefix="/products", tags=["Products"])
 
@@ -26,6 +36,8 @@ class ProductCreate(ProductBase):
 class ProductOut(ProductBase):
     product_id: int
     created_at: datetime
+    # Микропревью изображения (data:image/webp;base64,...), пока грузится само изображение
+    image_placeholder: Optional[str] = None
 
 
 class StockQuantityUpdate(BaseModel):
@@ -33,19 +45,374 @@ class StockQuantityUpdate(BaseModel):
     reason: Optional[str] = None  # Причина изменения (например, "продажа", "поступление", "списание")
 
 
-# 📄 Получить все товары
-@router.get("/get/all/", response_model=List[ProductOut])
-async def get_products(db=Depends(get_db_pool)):
+class StockBatchItem(BaseModel):
+    product_id: int
+    amount: int  # Как в StockQuantityUpdate: отрицательное — списание/резерв
+
+
+class StockBatchRequest(BaseModel):
+    items: List[StockBatchItem] = Field(..., min_length=1, max_length=1000)
+    reason: Optional[str] = None
+    # True — либо применяются все позиции, либо ни одна
+    atomic: bool = True
+
+
+class StockBatchItemResult(BaseModel):
+    product_id: int
+    amount: int
+    stock_quantity: Optional[int] = None
+    status: Literal["ok", "insufficient", "not_found"]
+
+
+class StockBatchResult(BaseModel):
+    applied: bool
+    items: List[StockBatchItemResult]
+
+
+class ProductQueryOut(Page[ProductOut]):
+    # Количество товаров по каждому значению: {"material": {"Золото": 12}, "type": {...}}
+    facets: Optional[Dict[str, Dict[str, int]]] = None
+
+
+class ProductChangesOut(BaseModel):
+    version: int  # Передать как since в следующем запросе
+    changed: List[ProductOut]  # Созданные и изменённые товары
+    deleted: List[int]  # ID удалённых товаров
+
+
+# Ключ сортировки -> (колонка, направление, тип значения в курсоре)
+SORT_KEYS = {
+    "id": ("product_id", "ASC", int),
+    "price_asc": ("price", "ASC", Decimal),
+    "price_desc": ("price", "DESC", Decimal),
+    "weight_asc": ("weight", "ASC", Decimal),
+    "weight_desc": ("weight", "DESC", Decimal),
+    "newest": ("created_at", "DESC", datetime),
+    "name": ("name", "ASC", str),
+}
+
+FACET_COLUMNS = ("material", "type")
+
+
+class ProductSearchOut(ProductOut):
+    rank: float
+    # Поля с найденной подстрокой, выделенной тегом <b>
+    highlights: Dict[str, str]
+
+
+class ProductSuggestionOut(BaseModel):
+    product_id: int
+    name: str
+    article: str
+
+
+# Установлено ли расширение pg_trgm (проверяется один раз на процесс)
+_has_trigram = None
+
+
+def _like_pattern(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _highlight(text, query):
+    start = text.lower().find(query.lower())
+    if start < 0:
+        return None
+    end = start + len(query)
+    return f"{html.escape(text[:start])}<b>{html.escape(text[start:end])}</b>{html.escape(text[end:])}"
+
+
+class ProductFilters:
+    """Условия WHERE с нумерованными параметрами для asyncpg.
+
+    Условия хранятся по измерениям, чтобы фасет по измерению можно было
+    посчитать без его собственного фильтра.
+    """
+
+    def __init__(self):
+        self.args = []
+        self.conditions = {}
+
+    def param(self, value):
+        self.args.append(value)
+        return f"${len(self.args)}"
+
+    def add(self, dimension, condition):
+        self.conditions[dimension] = condition
+
+    def where(self, exclude=None, extra=None):
+        parts = [condition for dimension, condition in self.conditions.items() if dimension != exclude]
+        if extra:
+            parts.append(extra)
+        return f"WHERE {' AND '.join(parts)}" if parts else ""
+
+
+class BulkRowError(BaseModel):
+    row: int  # Номер строки данных, начиная с 1 (без заголовка файла)
+    article: Optional[str] = None
+    errors: List[str]
+
+
+class BulkRowResult(BaseModel):
+    row: int
+    product_id: int
+    article: str
+    status: Literal["inserted", "updated"]
+
+
+class BulkResult(BaseModel):
+    inserted: int
+    updated: int
+    items: List[BulkRowResult]
+    errors: List[BulkRowError]
+
+
+BULK_MAX_ROWS = 10000
+
+
+def _validation_messages(error):
+    return [f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error.errors()]
+
+
+async def _bulk_upsert(connection, raw_rows):
+    """Проверяет строки по отдельности и вливает корректные одной транзакцией."""
+    if len(raw_rows) > BULK_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"Too many rows, maximum is {BULK_MAX_ROWS}")
+
+    errors = []
+    valid = {}  # article -> (номер строки, товар)
+    for row_number, raw in enumerate(raw_rows, start=1):
+        article = raw.get("article") if isinstance(raw, dict) else None
+        # В JSON артикул может прийти числом — в отчёте об ошибке он всё равно строка
+        article = str(article) if article is not None else None
+        try:
+            product = ProductCreate.model_validate(raw)
+        except ValidationError as e:
+            errors.append(BulkRowError(row=row_number, article=article, errors=_validation_messages(e)))
+            continue
+        if product.article in valid:
+            errors.append(BulkRowError(
+                row=row_number, article=product.article,
+                errors=[f"Duplicate article, already given in row {valid[product.article][0]}"]
+            ))
+            continue
+        valid[product.article] = (row_number, product)
+
+    # Ссылки на несуществующие изображения отсеиваем до загрузки, иначе упадёт вся транзакция
+    image_ids = list({product.image_id for _, product in valid.values()})
+    known_images = {row["image_id"] for row in await connection.fetch_named("images.existing", image_ids)}
+    for article, (row_number, product) in list(valid.items()):
+        if product.image_id not in known_images:
+            errors.append(BulkRowError(row=row_number, article=article,
+                                       errors=[f"image_id: image {product.image_id} not found"]))
+            del valid[article]
+
+    items = []
+    if valid:
+        records = [
+            (row_number, *(getattr(product, field) for field in PRODUCT_FIELDS))
+            for row_number, product in valid.values()
+        ]
+        async with connection.transaction():
+            await set_movement_reason(connection, "Массовая загрузка")
+            await connection.execute_named("products.bulk_staging")
+            await connection.copy_records_to_table(
+                "products_staging", records=records, columns=["row_number", *PRODUCT_FIELDS]
+            )
+            rows = await connection.fetch_named("products.bulk_upsert")
+        catalog.invalidate()
+        items = [
+            BulkRowResult(row=valid[row["article"]][0], product_id=row["product_id"], article=row["article"],
+                          status="inserted" if row["inserted"] else "updated")
+            for row in rows
+        ]
+        items.sort(key=lambda item: item.row)
+
+    errors.sort(key=lambda error: error.row)
+    inserted = sum(1 for item in items if item.status == "inserted")
+    return BulkResult(inserted=inserted, updated=len(items) - inserted, items=items, errors=errors)
+
+
+# Полный каталог, готовый к отправке; сбрасывается при любом изменении товаров
+catalog = CatalogSnapshot("products.get_all", TypeAdapter(List[ProductOut]))
+
+
+# 📄 Получить все товары (постранично, если передан limit или after)
+@router.get("/get/all/", response_model=Union[List[ProductOut], Page[ProductOut]])
+async def get_products(
+        request: Request,
+        response: Response,
+        page: PageParams = Depends(),
+        db=Depends(get_read_pool)
+):
+    async with db.acquire() as connection:
+        version = await get_version(connection, "products")
+        not_modified = check_not_modified(request, response, "products", version)
+        if not_modified:
+            return not_modified
+
+        if not page.paginated:
+            snapshot = await catalog.get(connection, version)
+            return snapshot.response(request, response.headers)
+
+        after_id, = decode_cursor(page.after, int) if page.after else (0,)
+        rows = await connection.fetch_named("products.get_page", after_id, page.limit + 1)
+        total = await connection.fetchval_named("products.count") if page.with_total else None
+        return fast_response(
+            request, build_page(rows, page, lambda row: (row["product_id"],), total, ProductOut), response.headers
+        )
+
+
+# 🔍 Каталог с фильтрами, сортировкой и фасетами
+@router.get("/", response_model=ProductQueryOut)
+async def query_products(
+        request: Request,
+        response: Response,
+        material: Optional[List[str]] = Query(None, description="Материал (можно несколько)"),
+        type: Optional[List[str]] = Query(None, description="Тип изделия (можно несколько)"),
+        insert_type: Optional[List[str]] = Query(None, description="Тип вставки (можно несколько)"),
+        min_price: Optional[Decimal] = Query(None, ge=0),
+        max_price: Optional[Decimal] = Query(None, ge=0),
+        min_weight: Optional[Decimal] = Query(None, ge=0),
+        max_weight: Optional[Decimal] = Query(None, ge=0),
+        in_stock: bool = Query(False, description="Только товары в наличии"),
+        sort: Literal[tuple(SORT_KEYS)] = Query("id"),
+        facets: bool = Query(True, description="Посчитать количество по материалам и типам"),
+        page: PageParams = Depends(),
+        db=Depends(get_read_pool)
+):
+    filters = ProductFilters()
+    for dimension, values in (("material", material), ("type", type), ("insert_type", insert_type)):
+        if values:
+            filters.add(dimension, f"{dimension} = ANY({filters.param(values)}::text[])")
+    if min_price is not None:
+        filters.add("min_price", f"price >= {filters.param(min_price)}")
+    if max_price is not None:
+        filters.add("max_price", f"price <= {filters.param(max_price)}")
+    if min_weight is not None:
+        filters.add("min_weight", f"weight >= {filters.param(min_weight)}")
+    if max_weight is not None:
+        filters.add("max_weight", f"weight <= {filters.param(max_weight)}")
+    if in_stock:
+        filters.add("in_stock", "stock_quantity > 0")
+
+    column, direction, value_type = SORT_KEYS[sort]
+    filter_args = list(filters.args)
+
+    keyset = None
+    if page.after:
+        operator = ">" if direction == "ASC" else "<"
+        if column == "product_id":
+            after_id, = decode_cursor(page.after, int)
+            keyset = f"product_id {operator} {filters.param(after_id)}"
+        else:
+            after_value, after_id = decode_cursor(page.after, value_type, int)
+            keyset = f"({column}, product_id) {operator} ({filters.param(after_value)}, {filters.param(after_id)})"
+    order_by = f"{column} {direction}" if column == "product_id" else f"{column} {direction}, product_id {direction}"
+
+    async with db.acquire() as connection:
+        version = await get_version(connection, "products")
+        not_modified = check_not_modified(request, response, "products", version)
+        if not_modified:
+            return not_modified
+
+        rows = await connection.fetch_dynamic(f"""
+            SELECT products.*,
+                   (SELECT placeholder FROM images WHERE images.image_id = products.image_id) AS image_placeholder
+            FROM products
+            {filters.where(extra=keyset)}
+            ORDER BY {order_by}
+            LIMIT {filters.param(page.limit + 1)}
+        """, *filters.args)
+
+        total = None
+        if page.with_total:
+            total = await connection.fetchval_dynamic(f"SELECT COUNT(*) FROM products {filters.where()}", *filter_args)
+
+        facet_counts = None
+        if facets:
+            # Фасет по измерению считается без фильтра по этому же измерению
+            facet_rows = await connection.fetch_dynamic(" UNION ALL ".join(
+                f"SELECT '{dimension}' AS facet, {dimension} AS value, COUNT(*) AS count "
+                f"FROM products {filters.where(exclude=dimension)} GROUP BY {dimension}"
+                for dimension in FACET_COLUMNS
+            ), *filter_args)
+            facet_counts = {dimension: {} for dimension in FACET_COLUMNS}
+            for row in facet_rows:
+                facet_counts[row["facet"]][row["value"]] = row["count"]
+
+    if column == "product_id":
+        result = build_page(rows, page, lambda row: (row["product_id"],), total, ProductOut)
+    else:
+        result = build_page(rows, page, lambda row: (row[column], row["product_id"]), total, ProductOut)
+    result["facets"] = facet_counts
+    return fast_response(request, result, response.headers)
+
+
+# 🔤 Поиск по названию и артикулу (mode=prefix — автодополнение)
+@router.get("/search", response_model=Union[List[ProductSearchOut], List[ProductSuggestionOut]])
+async def search_products(
+        q: str = Query(..., min_length=1, max_length=100, description="Строка поиска"),
+        mode: Literal["full", "prefix"] = Query("full"),
+        limit: int = Query(20, ge=1, le=100),
+        db=Depends(get_read_pool)
+):
+    global _has_trigram
+    q = q.strip()
+    if not q:
+        raise HTTPException(status_code=400, detail="Empty search query")
+
+    async with db.acquire() as connection:
+        if mode == "prefix":
+            rows = await connection.fetch_named("products.autocomplete", _like_pattern(q.lower()) + "%", limit)
+            # Товар мог совпасть и по артикулу, и по названию
+            suggestions = {}
+            for row in rows:
+                suggestions.setdefault(row["product_id"], dict(row))
+            return list(suggestions.values())[:limit]
+
+        if _has_trigram is None:
+            _has_trigram = await connection.fetchval_named("extensions.has_trigram")
+        pattern = f"%{_like_pattern(q)}%"
+        if _has_trigram:
+            rows = await connection.fetch_named("products.search_trigram", q, pattern, limit)
+        else:
+            rows = await connection.fetch_named("products.search_plain", pattern, limit)
+
+    results = []
+    for row in rows:
+        item = dict(row)
+        item["highlights"] = {
+            field: marked for field in ("name", "article")
+            if (marked := _highlight(item[field], q)) is not None
+        }
+        results.append(item)
+    return results
+
+
+# 🔄 Изменения каталога с версии since (since=0 — весь каталог)
+@router.get("/changes", response_model=ProductChangesOut)
+async def get_product_changes(request: Request, since: int = Query(0, ge=0), db=Depends(get_read_pool)):
     async with db.acquire() as connection:
-        rows = await connection.fetch("SELECT * FROM products ORDER BY product_id")
-        return [dict(row) for row in rows]
+        # Версия и изменения читаются из одного снимка базы
+        async with connection.transaction(isolation="repeatable_read", readonly=True):
+            version = await get_watermark(connection)
+            if since >= version:
+                return {"version": version, "changed": [], "deleted": []}
+            changed = await connection.fetch_named("products.changed_since", since)
+            deleted = await connection.fetch_named("products.deleted_since", since)
+    return fast_response(request, {
+        "version": version,
+        "changed": model_rows(ProductOut, changed),
+        "deleted": [row["product_id"] for row in deleted],
+    })
 
 
 # 🔎 Получить один товар
 @router.get("/get/{product_id}", response_model=ProductOut)
 async def get_product(product_id: int, db=Depends(get_db_pool)):
     async with db.acquire() as connection:
-        row = await connection.fetchrow("SELECT * FROM products WHERE product_id = $1", product_id)
+        row = await connection.fetchrow_named("products.get", product_id)
         if not row:
             raise HTTPException(status_code=404, detail="Product not found")
         return dict(row)
@@ -55,16 +422,16 @@ async def get_product(product_id: int, db=Depends(get_db_pool)):
 @router.post("/create", response_model=ProductOut)
 async def create_product(product: ProductCreate, db=Depends(get_db_pool)):
     async with db.acquire() as connection:
-        row = await connection.fetchrow("""
-            INSERT INTO products (
-                name, article, type, material, insert_type, weight, price, stock_quantity, image_id, created_at
-            ) VALUES (
-                $1, $2, $3, $4, $5, $6, $7, $8, $9, NOW()
+        try:
+            row = await connection.fetchrow_named(
+                "products.create",
+                product.name, product.article, product.type, product.material,
+                product.insert_type, product.weight, product.price, product.stock_quantity,
+                product.image_id
             )
-            RETURNING *
-        """, product.name, product.article, product.type, product.material,
-                                        product.insert_type, product.weight, product.price, product.stock_quantity,
-                                        product.image_id)
+        except asyncpg.UniqueViolationError:
+            raise HTTPException(status_code=409, detail="Product with this article already exists")
+        catalog.invalidate()
         return dict(row)
 
 
@@ -76,35 +443,21 @@ async def update_product_stock(
         db=Depends(get_db_pool)
 ):
     async with db.acquire() as connection:
-        # Получаем текущее количество товара
-        product = await connection.fetchrow(
-            "SELECT stock_quantity FROM products WHERE product_id = $1",
-            product_id
-        )
-        if not product:
-            raise HTTPException(status_code=404, detail="Product not found")
-
-        current_quantity = product['stock_quantity']
-        new_quantity = current_quantity + stock_update.amount
-
-        # Проверка на отрицательное количество после уменьшения
-        if new_quantity < 0:
+        async with connection.transaction():
+            await set_movement_reason(connection, stock_update.reason)
+            # Проверка остатка и изменение — один UPDATE, без гонки между чтением и записью
+            row = await connection.fetchrow_named("products.adjust_stock", product_id, stock_update.amount)
+        if not row:
+            # Строка не обновилась: товара нет или остатка не хватает
+            product = await connection.fetchrow_named("products.get_stock", product_id)
+            if not product:
+                raise HTTPException(status_code=404, detail="Product not found")
             raise HTTPException(
                 status_code=400,
-                detail=f"Not enough stock. Current: {current_quantity}, attempted to reduce by: {-stock_update.amount}"
+                detail=f"Not enough stock. Current: {product['stock_quantity']}, "
+                       f"attempted to reduce by: {-stock_update.amount}"
             )
-
-        # Обновляем количество
-        row = await connection.fetchrow("""
-            UPDATE products
-            SET stock_quantity = $1
-            WHERE product_id = $2
-            RETURNING *
-        """, new_quantity, product_id)
-
-        # Здесь можно добавить логирование изменения количества
-        # await log_stock_change(connection, product_id, stock_update.amount, stock_update.reason)
-
+        catalog.invalidate()
         return dict(row)
 
 
@@ -131,6 +484,44 @@ async def reduce_product_stock(
     return await update_product_stock(product_id, stock_update, db)
 
 
+# 📦 Изменить остатки нескольких товаров одной транзакцией (резерв/списание/поступление)
+@router.post("/stock/batch", response_model=StockBatchResult)
+async def adjust_stock_batch_endpoint(batch: StockBatchRequest, db=Depends(get_db_pool)):
+    amounts = merge_amounts((item.product_id, item.amount) for item in batch.items)
+    async with db.acquire() as connection:
+        async with connection.transaction():
+            await set_movement_reason(connection, batch.reason)
+            applied, results = await adjust_stock_batch(connection, amounts, atomic=batch.atomic)
+    if applied:
+        catalog.invalidate()
+    if batch.atomic and not applied:
+        # Ничего не изменено — в ответе позиции, из-за которых пакет отклонён
+        raise HTTPException(status_code=409, detail={
+            "message": "Stock batch rejected",
+            "items": [item for item in results if item["status"] != "ok"],
+        })
+    return {"applied": applied, "items": results}
+
+
+# 📥 Массовое создание/обновление товаров (ключ — артикул)
+@router.post("/bulk", response_model=BulkResult)
+async def bulk_upsert_products(products: List[Dict[str, Any]] = Body(...), db=Depends(get_db_pool)):
+    async with db.acquire() as connection:
+        return await _bulk_upsert(connection, products)
+
+
+# 📥 Массовая загрузка товаров из CSV или XLSX
+@router.post("/bulk/upload", response_model=BulkResult)
+async def bulk_upload_products(file: UploadFile = File(...), db=Depends(get_db_pool)):
+    content = await file.read()
+    try:
+        rows = await run_in_threadpool(read_products_file, file.filename, content)
+    except ImportFileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    async with db.acquire() as connection:
+        return await _bulk_upsert(connection, rows)
+
+
 # ✏️ Обновить информацию о товаре
 @router.patch("/update/{product_id}", response_model=ProductOut)
 async def update_product(
@@ -139,34 +530,26 @@ async def update_product(
         db=Depends(get_db_pool)
 ):
     async with db.acquire() as connection:
-        row = await connection.fetchrow("""
-            UPDATE products
-            SET 
-                name = $1,
-                article = $2,
-                type = $3,
-                material = $4,
-                insert_type = $5,
-                weight = $6,
-                price = $7,
-                stock_quantity = $8,
-                image_id = $9
-            WHERE product_id = $10
-            RETURNING *
-        """,
-                                        product_update.name,
-                                        product_update.article,
-                                        product_update.type,
-                                        product_update.material,
-                                        product_update.insert_type,
-                                        product_update.weight,
-                                        product_update.price,
-                                        product_update.stock_quantity,
-                                        product_update.image_id,
-                                        product_id)
+        try:
+            row = await connection.fetchrow_named(
+                "products.update",
+                product_update.name,
+                product_update.article,
+                product_update.type,
+                product_update.material,
+                product_update.insert_type,
+                product_update.weight,
+                product_update.price,
+                product_update.stock_quantity,
+                product_update.image_id,
+                product_id
+            )
+        except asyncpg.UniqueViolationError:
+            raise HTTPException(status_code=409, detail="Product with this article already exists")
 
         if not row:
             raise HTTPException(status_code=404, detail="Product not found")
+        catalog.invalidate()
         return dict(row)
 
 # 🗑️ Удалить товар
@@ -174,11 +557,12 @@ async def update_product(
 async def delete_product(product_id: int, db=Depends(get_db_pool)):
     async with db.acquire() as connection:
         # Проверяем, существует ли продукт
-        product = await connection.fetchrow("SELECT product_id FROM products WHERE product_id = $1", product_id)
+        product = await connection.fetchrow_named("products.exists", product_id)
         if not product:
             raise HTTPException(status_code=404, detail="Product not found")
 
         # Удаляем продукт
-        await connection.execute("DELETE FROM products WHERE product_id = $1", product_id)
+        await connection.execute_named("products.delete", product_id)
+        catalog.invalidate()
 
         return {"message": "Product deleted successfully", "product_id": product_id}
\ No newline at end of file
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Request, Response, Query
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Union
 from datetime import datetime
-from database import get_db_pool
+from database import get_db_pool, get_read_pool
+from versioning import check_not_modified, get_version
+from pagination import Page, PageParams, build_page, decode_cursor
+from responses import fast_response, model_rows
 
 router = APIRouter(prefix="/returns", tags=["Returns"])
 
@@ -27,19 +30,37 @@ class ReturnStatusUpdate(BaseModel):
     status: str
 
 
-# 📄 Получить все возвраты
-@router.get("/get/all/", response_model=List[ReturnOut])
-async def get_returns(db=Depends(get_db_pool)):
+# 📄 Получить все возвраты (постранично, если передан limit или after)
+@router.get("/get/all/", response_model=Union[List[ReturnOut], Page[ReturnOut]])
+async def get_returns(
+        request: Request,
+        response: Response,
+        page: PageParams = Depends(),
+        db=Depends(get_read_pool)
+):
     async with db.acquire() as connection:
-        rows = await connection.fetch("SELECT * FROM returns ORDER BY return_id")
-        return [dict(row) for row in rows]
+        version = await get_version(connection, "returns")
+        not_modified = check_not_modified(request, response, "returns", version)
+        if not_modified:
+            return not_modified
+
+        if not page.paginated:
+            rows = await connection.fetch_named("returns.get_all")
+            return fast_response(request, model_rows(ReturnOut, rows), response.headers)
+
+        after_id, = decode_cursor(page.after, int) if page.after else (0,)
+        rows = await connection.fetch_named("returns.get_page", after_id, page.limit + 1)
+        total = await connection.fetchval_named("returns.count") if page.with_total else None
+        return fast_response(
+            request, build_page(rows, page, lambda row: (row["return_id"],), total, ReturnOut), response.headers
+        )
 
 
 # 🔎 Получить возврат по ID
 @router.get("/get/{return_id}", response_model=ReturnOut)
 async def get_return_by_id(return_id: int, db=Depends(get_db_pool)):
     async with db.acquire() as connection:
-        row = await connection.fetchrow("SELECT * FROM returns WHERE return_id = $1", return_id)
+        row = await connection.fetchrow_named("returns.get", return_id)
         if not row:
             raise HTTPException(status_code=404, detail="Return not found")
         return dict(row)
@@ -49,7 +70,7 @@ async def get_return_by_id(return_id: int, db=Depends(get_db_pool)):
 @router.get("/get/by-client/{client_id}", response_model=List[ReturnOut])
 async def get_returns_by_client(client_id: int, db=Depends(get_db_pool)):
     async with db.acquire() as connection:
-        rows = await connection.fetch("SELECT * FROM returns WHERE client_id = $1 ORDER BY return_date DESC", client_id)
+        rows = await connection.fetch_named("returns.get_by_client", client_id)
         if not rows:
             raise HTTPException(status_code=404, detail="No returns found for this client")
         return [dict(row) for row in rows]
@@ -59,7 +80,7 @@ async def get_returns_by_client(client_id: int, db=Depends(get_db_pool)):
 @router.get("/get/by-order/{order_id}", response_model=List[ReturnOut])
 async def get_returns_by_order(order_id: int, db=Depends(get_db_pool)):
     async with db.acquire() as connection:
-        rows = await connection.fetch("SELECT * FROM returns WHERE order_id = $1 ORDER BY return_date DESC", order_id)
+        rows = await connection.fetch_named("returns.get_by_order", order_id)
         if not rows:
             raise HTTPException(status_code=404, detail="No returns found for this order")
         return [dict(row) for row in rows]
@@ -69,15 +90,11 @@ async def get_returns_by_order(order_id: int, db=Depends(get_db_pool)):
 @router.post("/create", response_model=ReturnOut)
 async def create_return(return_data: ReturnCreate, db=Depends(get_db_pool)):
     async with db.acquire() as connection:
-        row = await connection.fetchrow("""
-            INSERT INTO returns (
-                order_id, client_id, return_date, description, status
-            ) VALUES (
-                $1, $2, $3, $4, $5
-            )
-            RETURNING *
-        """, return_data.order_id, return_data.client_id, return_data.return_date,
-                                        return_data.description, return_data.status)
+        row = await connection.fetchrow_named(
+            "returns.create",
+            return_data.order_id, return_data.client_id, return_data.return_date,
+            return_data.description, return_data.status
+        )
         return dict(row)
 
 
@@ -89,12 +106,7 @@ async def update_return_status(
         db=Depends(get_db_pool)
 ):
     async with db.acquire() as connection:
-        row = await connection.fetchrow("""
-            UPDATE returns
-            SET status = $1
-            WHERE return_id = $2
-            RETURNING *
-        """, status_update.status, return_id)
+        row = await connection.fetchrow_named("returns.update_status", status_update.status, return_id)
         if not row:
             raise HTTPException(status_code=404, detail="Return not found")
         return dict(row)
@@ -104,7 +116,7 @@ async def update_return_status(
 @router.delete("/delete/{return_id}")
 async def delete_return(return_id: int, db=Depends(get_db_pool)):
     async with db.acquire() as connection:
-        result = await connection.execute("DELETE FROM returns WHERE return_id = $1", return_id)
+        result = await connection.execute_named("returns.delete", return_id)
         if result == "DELETE 0":
             raise HTTPException(status_code=404, detail="Return not found")
         return {"message": "Return deleted successfully"}
\ No newline at end of file
@@ -6,5 +6,5 @@ router = APIRouter()
 @router.get("/roles")
 async def get_roles(db_pool=Depends(get_db_pool)):
     async with db_pool.acquire() as connection:
-        rows = await connection.fetch("SELECT role_id, name FROM roles")
+        rows = await connection.fetch_named("roles.get_all")
         return [{"role_id": row["role_id"], "name": row["name"]} for row in rows]
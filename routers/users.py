@@ -1,10 +1,12 @@
 from datetime import datetime
 import bcrypt
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel
 
-from database import get_db_pool
+from database import get_db_pool, get_read_pool
+from pagination import PageParams, build_page, decode_cursor
+from responses import fast_response
 
 router = APIRouter(tags=["users"])
 
@@ -20,39 +22,22 @@ class UserUpdate(BaseModel):
     password: str = None
 
 @router.get("/users")
-async def get_users(db_pool=Depends(get_db_pool)):
+async def get_users(request: Request, page: PageParams = Depends(), db_pool=Depends(get_read_pool)):
     async with db_pool.acquire() as connection:
-        rows = await connection.fetch("""
-            SELECT
-                u.user_id,
-                u.created_at,
-                u.username,
-                r.name AS role_name
-            FROM users u
-            JOIN roles r ON u.role = r.role_id
-        """)
-        return [
-            {
-                "user_id": row["user_id"],
-                "created_at": row["created_at"],
-                "username": row["username"],
-                "role": row["role_name"]
-            } for row in rows
-        ]
+        if page.paginated:
+            after_id, = decode_cursor(page.after, int) if page.after else (0,)
+            rows = await connection.fetch_named("users.get_page", after_id, page.limit + 1)
+            total = await connection.fetchval_named("users.count") if page.with_total else None
+            return fast_response(request, build_page(rows, page, lambda row: (row["user_id"],), total))
+
+        # Запрос выбирает ровно поля ответа: user_id, created_at, username, role
+        rows = await connection.fetch_named("users.get_all")
+        return fast_response(request, [dict(row) for row in rows])
 
 @router.get("/users/{user_id}")
 async def get_user_by_id(user_id: int, db_pool=Depends(get_db_pool)):
     async with db_pool.acquire() as connection:
-        row = await connection.fetchrow("""
-            SELECT
-                u.user_id,
-                u.created_at,
-                u.username,
-                r.name AS role
-            FROM users u
-            JOIN roles r ON u.role = r.role_id
-            WHERE u.user_id = $1
-        """, user_id)
+        row = await connection.fetchrow_named("users.get", user_id)
 
         if row is None:
             return {"error": "User not found"}
@@ -67,16 +52,7 @@ async def get_user_by_id(user_id: int, db_pool=Depends(get_db_pool)):
 @router.get("/users/by-role/{role_name}")
 async def get_users_by_role(role_name: str, db_pool=Depends(get_db_pool)):
     async with db_pool.acquire() as connection:
-        rows = await connection.fetch("""
-            SELECT
-                u.user_id,
-                u.created_at,
-                u.username,
-                r.name AS role
-            FROM users u
-            JOIN roles r ON u.role = r.role_id
-            WHERE r.name = $1
-        """, role_name)
+        rows = await connection.fetch_named("users.get_by_role", role_name)
 
         return [
             {
@@ -92,9 +68,7 @@ async def create_user(user: UserCreate, db_pool=Depends(get_db_pool)):
     async with db_pool.acquire() as connection:
         # Устанавливаем роль по умолчанию равной 5
         default_role = "Клиент"  # Замените на фактическое имя роли
-        role_row = await connection.fetchrow(
-            "SELECT role_id FROM roles WHERE name = $1", default_role
-        )
+        role_row = await connection.fetchrow_named("roles.get_id_by_name", default_role)
 
         if role_row is None:
             raise HTTPException(status_code=400, detail="Default role not found")
@@ -104,11 +78,9 @@ async def create_user(user: UserCreate, db_pool=Depends(get_db_pool)):
         # Хэшируем пароль
         hashed_password = bcrypt.hashpw(user.password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
 
-        user_id = await connection.fetchval("""
-                    INSERT INTO users (username, password_hash, role, created_at)
-                    VALUES ($1, $2, $3, $4)
-                    RETURNING user_id
-                """, user.username, hashed_password, role_id, datetime.utcnow())
+        user_id = await connection.fetchval_named(
+            "users.create", user.username, hashed_password, role_id, datetime.utcnow()
+        )
 
         return {"message": "User created successfully", "user_id": user_id}
 
@@ -116,7 +88,7 @@ async def create_user(user: UserCreate, db_pool=Depends(get_db_pool)):
 async def update_user(user_id: int, user_update: UserUpdate, db_pool=Depends(get_db_pool)):
     async with db_pool.acquire() as connection:
         # Check if the user exists
-        existing_user = await connection.fetchrow("SELECT user_id FROM users WHERE user_id = $1", user_id)
+        existing_user = await connection.fetchrow_named("users.exists", user_id)
         if not existing_user:
             raise HTTPException(status_code=404, detail="User not found")
 
@@ -139,7 +111,7 @@ async def update_user(user_id: int, user_update: UserUpdate, db_pool=Depends(get
         update_values.append(user_id)
 
         # Execute the update query
-        updated_user_id = await connection.fetchval(update_query, *update_values)
+        updated_user_id = await connection.fetchval_dynamic(update_query, *update_values)
 
         if updated_user_id is None:
             raise HTTPException(status_code=500, detail="Failed to update user")
@@ -150,12 +122,12 @@ async def update_user(user_id: int, user_update: UserUpdate, db_pool=Depends(get
 async def delete_user(user_id: int, db_pool=Depends(get_db_pool)):
     async with db_pool.acquire() as connection:
         # Проверяем, существует ли пользователь
-        existing_user = await connection.fetchrow("SELECT user_id FROM users WHERE user_id = $1", user_id)
+        existing_user = await connection.fetchrow_named("users.exists", user_id)
         if not existing_user:
             raise HTTPException(status_code=404, detail="User not found")
 
         # Удаляем пользователя
-        deleted_user_id = await connection.execute("DELETE FROM users WHERE user_id = $1 RETURNING user_id", user_id)
+        deleted_user_id = await connection.execute_named("users.delete", user_id)
 
         if deleted_user_id == "DELETE 0":
             raise HTTPException(status_code=500, detail="Failed to delete user")
@@ -166,9 +138,7 @@ async def delete_user(user_id: int, db_pool=Depends(get_db_pool)):
 async def create_user(user: UserAdminCreate, db_pool=Depends(get_db_pool)):
     async with db_pool.acquire() as connection:
         # Получаем role_id для указанной роли
-        role_row = await connection.fetchrow(
-            "SELECT role_id FROM roles WHERE name = $1", user.role
-        )
+        role_row = await connection.fetchrow_named("roles.get_id_by_name", user.role)
 
         if role_row is None:
             raise HTTPException(status_code=400, detail="Specified role not found")
@@ -179,10 +149,8 @@ async def create_user(user: UserAdminCreate, db_pool=Depends(get_db_pool)):
         hashed_password = bcrypt.hashpw(user.password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
 
         # Создаем пользователя с указанной ролью
-        user_id = await connection.fetchval("""
-            INSERT INTO users (username, password_hash, role, created_at)
-            VALUES ($1, $2, $3, $4)
-            RETURNING user_id
-        """, user.username, hashed_password, role_id, datetime.utcnow())
+        user_id = await connection.fetchval_named(
+            "users.create", user.username, hashed_password, role_id, datetime.utcnow()
+        )
 
         return {"message": "User created successfully", "user_id": user_id}
\ No newline at end of file
@@ -0,0 +1,492 @@
+"""Реестр именованных SQL-запросов сервиса.
+
+Запросы подготавливаются один раз для каждого соединения пула (при
+первом вызове) и остаются в его кэше выражений (см. database.StoreConnection);
+роутеры вызывают их по имени:
+
+    rows = await connection.fetch_named("products.get_all")
+
+Динамические запросы (фильтры каталога, частичные UPDATE) в реестр не
+входят и выполняются через fetch_dynamic и подобные, мимо кэша.
+"""
+from collections import defaultdict
+
+STATEMENTS = {
+    # 🔐 Авторизация
+    "auth.get_user": """
+        SELECT user_id, username, password_hash, role FROM users WHERE username = $1
+    """,
+
+    # 🏷️ Версии ресурсов (наибольший номер транзакции, изменившей любой из них; NULL — неустойчива)
+    "versions.get": "SELECT resource_version($1::text[])",
+    # Все транзакции с номером не больше этого завершены — граница для синхронизации
+    "versions.watermark": "SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint - 1",
+    "versions.prune_deletions": """
+        DELETE FROM resource_deletions d
+        USING (SELECT resource, max(change_version) AS latest FROM resource_deletions GROUP BY resource) l
+        WHERE d.resource = l.resource AND d.change_version < l.latest
+    """,
+
+    # 👥 Роли
+    "roles.get_all": "SELECT role_id, name FROM roles",
+    "roles.get_id_by_name": "SELECT role_id FROM roles WHERE name = $1",
+
+    # 👤 Пользователи
+    "users.get_all": """
+        SELECT
+            u.user_id,
+            u.created_at,
+            u.username,
+            r.name AS role
+        FROM users u
+        JOIN roles r ON u.role = r.role_id
+    """,
+    "users.get_page": """
+        SELECT
+            u.user_id,
+            u.created_at,
+            u.username,
+            r.name AS role
+        FROM users u
+        JOIN roles r ON u.role = r.role_id
+        WHERE u.user_id > $1
+        ORDER BY u.user_id
+        LIMIT $2
+    """,
+    "users.count": "SELECT COUNT(*) FROM users",
+    "users.get": """
+        SELECT
+            u.user_id,
+            u.created_at,
+            u.username,
+            r.name AS role
+        FROM users u
+        JOIN roles r ON u.role = r.role_id
+        WHERE u.user_id = $1
+    """,
+    "users.get_by_role": """
+        SELECT
+            u.user_id,
+            u.created_at,
+            u.username,
+            r.name AS role
+        FROM users u
+        JOIN roles r ON u.role = r.role_id
+        WHERE r.name = $1
+    """,
+    "users.get_username": "SELECT username FROM users WHERE user_id = $1",
+    "users.exists": "SELECT user_id FROM users WHERE user_id = $1",
+    "users.create": """
+        INSERT INTO users (username, password_hash, role, created_at)
+        VALUES ($1, $2, $3, $4)
+        RETURNING user_id
+    """,
+    "users.delete": "DELETE FROM users WHERE user_id = $1",
+
+    # 💍 Товары
+    # Списки товаров несут заглушку изображения (images.placeholder) для мгновенного превью
+    "products.get_all": """
+        SELECT p.*, i.placeholder AS image_placeholder
+        FROM products p
+        LEFT JOIN images i ON i.image_id = p.image_id
+        ORDER BY p.product_id
+    """,
+    "products.get_page": """
+        SELECT p.*, i.placeholder AS image_placeholder
+        FROM products p
+        LEFT JOIN images i ON i.image_id = p.image_id
+        WHERE p.product_id > $1
+        ORDER BY p.product_id
+        LIMIT $2
+    """,
+    "products.count": "SELECT COUNT(*) FROM products",
+    # Автодополнение: сначала совпадения по артикулу, затем по названию
+    "products.autocomplete": """
+        (SELECT product_id, name, article FROM products
+         WHERE lower(article) LIKE $1 ORDER BY lower(article) LIMIT $2)
+        UNION ALL
+        (SELECT product_id, name, article FROM products
+         WHERE lower(name) LIKE $1 ORDER BY lower(name) LIMIT $2)
+    """,
+    "extensions.has_trigram": "SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')",
+    # Поиск с pg_trgm: совпадение подстроки (по GIN-индексу) + нечёткое сходство
+    "products.search_trigram": """
+        SELECT p.*, i.placeholder AS image_placeholder,
+               (p.name ILIKE $2 OR p.article ILIKE $2)::int
+                   + GREATEST(similarity(p.name, $1), similarity(p.article, $1)) AS rank
+        FROM products p
+        LEFT JOIN images i ON i.image_id = p.image_id
+        WHERE p.name ILIKE $2 OR p.article ILIKE $2 OR p.name % $1 OR p.article % $1
+        ORDER BY rank DESC, p.product_id
+        LIMIT $3
+    """,
+    # Без pg_trgm: только совпадение подстроки, артикул важнее названия
+    "products.search_plain": """
+        SELECT p.*, i.placeholder AS image_placeholder,
+               ((p.article ILIKE $1)::int * 2 + (p.name ILIKE $1)::int)::float / 3 AS rank
+        FROM products p
+        LEFT JOIN images i ON i.image_id = p.image_id
+        WHERE p.name ILIKE $1 OR p.article ILIKE $1
+        ORDER BY rank DESC, p.product_id
+        LIMIT $2
+    """,
+    # Синхронизация: товары и удаления с версией изменения больше $1
+    "products.changed_since": """
+        SELECT p.*, i.placeholder AS image_placeholder
+        FROM products p
+        LEFT JOIN images i ON i.image_id = p.image_id
+        WHERE p.change_version > $1
+        ORDER BY p.product_id
+    """,
+    "products.deleted_since": """
+        SELECT product_id FROM product_tombstones WHERE change_version > $1 ORDER BY product_id
+    """,
+    "products.get": """
+        SELECT p.*, i.placeholder AS image_placeholder
+        FROM products p
+        LEFT JOIN images i ON i.image_id = p.image_id
+        WHERE p.product_id = $1
+    """,
+    "products.exists": "SELECT product_id FROM products WHERE product_id = $1",
+    "products.get_stock": "SELECT stock_quantity FROM products WHERE product_id = $1",
+    "products.create": """
+        INSERT INTO products (
+            name, article, type, material, insert_type, weight, price, stock_quantity, image_id, created_at
+        ) VALUES (
+            $1, $2, $3, $4, $5, $6, $7, $8, $9, NOW()
+        )
+        RETURNING *
+    """,
+    "products.update": """
+        UPDATE products
+        SET
+            name = $1,
+            article = $2,
+            type = $3,
+            material = $4,
+            insert_type = $5,
+            weight = $6,
+            price = $7,
+            stock_quantity = $8,
+            image_id = $9
+        WHERE product_id = $10
+        RETURNING *
+    """,
+    # Остаток меняется одним запросом: при нехватке товара строка не обновляется
+    "products.adjust_stock": """
+        UPDATE products
+        SET stock_quantity = stock_quantity + $2
+        WHERE product_id = $1 AND stock_quantity + $2 >= 0
+        RETURNING *
+    """,
+    # Блокировки строк берутся в порядке product_id, чтобы параллельные пакеты не взаимоблокировались
+    "products.lock_stock": """
+        SELECT product_id, stock_quantity FROM products
+        WHERE product_id = ANY($1::int[])
+        ORDER BY product_id
+        FOR UPDATE
+    """,
+    "products.adjust_stock_many": """
+        UPDATE products p
+        SET stock_quantity = p.stock_quantity + d.amount
+        FROM unnest($1::int[], $2::int[]) AS d(product_id, amount)
+        WHERE p.product_id = d.product_id
+        RETURNING p.product_id, p.stock_quantity
+    """,
+    "products.delete": "DELETE FROM products WHERE product_id = $1",
+    # Массовая загрузка: строки копируются во временную таблицу и вливаются в products одним запросом
+    "products.bulk_staging": """
+        CREATE TEMP TABLE products_staging (
+            row_number INTEGER,
+            name TEXT,
+            article TEXT,
+            type TEXT,
+            material TEXT,
+            insert_type TEXT,
+            weight NUMERIC,
+            price NUMERIC,
+            stock_quantity INTEGER,
+            image_id INTEGER
+        ) ON COMMIT DROP
+    """,
+    "products.bulk_upsert": """
+        INSERT INTO products (
+            name, article, type, material, insert_type, weight, price, stock_quantity, image_id, created_at
+        )
+        SELECT name, article, type, material, insert_type, weight, price, stock_quantity, image_id, NOW()
+        FROM products_staging
+        ORDER BY row_number
+        ON CONFLICT (article) DO UPDATE SET
+            name = EXCLUDED.name,
+            type = EXCLUDED.type,
+            material = EXCLUDED.material,
+            insert_type = EXCLUDED.insert_type,
+            weight = EXCLUDED.weight,
+            price = EXCLUDED.price,
+            stock_quantity = EXCLUDED.stock_quantity,
+            image_id = EXCLUDED.image_id
+        RETURNING product_id, article, (xmax = 0) AS inserted
+    """,
+
+    # 📒 Журнал движения товаров (пишется триггером на products)
+    "stock_movements.set_reason": "SELECT set_config('app.stock_reason', COALESCE($1, ''), true)",
+    "stock_movements.ensure_partitions": "SELECT ensure_stock_movement_partitions($1)",
+    # Страницы по (created_at, movement_id) от новых к старым в интервале [$1, $2)
+    "stock_movements.get_page": """
+        SELECT * FROM stock_movements
+        WHERE created_at >= $1 AND created_at < $2 AND (created_at, movement_id) < ($3, $4)
+        ORDER BY created_at DESC, movement_id DESC
+        LIMIT $5
+    """,
+    "stock_movements.get_page_by_product": """
+        SELECT * FROM stock_movements
+        WHERE product_id = $6 AND created_at >= $1 AND created_at < $2 AND (created_at, movement_id) < ($3, $4)
+        ORDER BY created_at DESC, movement_id DESC
+        LIMIT $5
+    """,
+    "stock_movements.count": """
+        SELECT COUNT(*) FROM stock_movements
+        WHERE created_at >= $1 AND created_at < $2 AND ($3::int IS NULL OR product_id = $3)
+    """,
+    # Итоги по товару за период: $1 — 'day', 'week', 'month' или 'year'
+    "stock_movements.summary": """
+        SELECT
+            product_id,
+            date_trunc($1, created_at) AS period_start,
+            COALESCE(SUM(amount) FILTER (WHERE amount > 0), 0) AS incoming,
+            COALESCE(-SUM(amount) FILTER (WHERE amount < 0), 0) AS outgoing,
+            SUM(amount) AS net,
+            COUNT(*) AS movements
+        FROM stock_movements
+        WHERE created_at >= $2 AND created_at < $3 AND ($4::int IS NULL OR product_id = $4)
+        GROUP BY product_id, period_start
+        ORDER BY period_start, product_id
+    """,
+
+    # 🖼️ Изображения
+    # Файлы лежат в image_store; data заполнена только у ещё не перенесённых изображений
+    "images.create": """
+        INSERT INTO images (filename, content_type, sha256, size, placeholder)
+        VALUES ($1, $2, $3, $4, $5)
+        RETURNING image_id
+    """,
+    # Загрузки с одинаковым хешем сериализуются, чтобы не создать две записи
+    "images.lock_sha": "SELECT pg_advisory_xact_lock(hashtextextended($1, 0))",
+    "images.find_by_sha": """
+        SELECT image_id, filename FROM images
+        WHERE sha256 = $1
+        ORDER BY image_id
+        LIMIT 1
+    """,
+    "images.without_placeholder": """
+        SELECT DISTINCT ON (sha256) sha256
+        FROM images
+        WHERE sha256 IS NOT NULL AND placeholder IS NULL
+        ORDER BY sha256
+    """,
+    # Пустая правка товаров с этим изображением: триггеры выдают им новую версию,
+    # и клиенты синхронизации получают заглушку
+    "images.set_placeholder": """
+        WITH updated AS (
+            UPDATE images SET placeholder = $2
+            WHERE sha256 = $1 AND placeholder IS NULL
+            RETURNING image_id
+        )
+        UPDATE products SET change_version = 0
+        WHERE image_id IN (SELECT image_id FROM updated)
+    """,
+    "images.existing": "SELECT image_id FROM images WHERE image_id = ANY($1::int[])",
+    "images.get": """
+        SELECT image_id, filename, content_type, sha256, size, created_at::timestamptz AS created_at,
+               CASE WHEN sha256 IS NULL THEN data END AS data
+        FROM images
+        WHERE image_id = $1
+    """,
+    "images.get_many": """
+        SELECT image_id, filename, content_type, sha256, size, created_at::timestamptz AS created_at,
+               CASE WHEN sha256 IS NULL THEN data END AS data
+        FROM images
+        WHERE image_id = ANY($1::int[])
+    """,
+
+    # 📦 Заказы
+    "orders.get_page": """
+        SELECT o.*, u.username
+        FROM orders o
+        JOIN users u ON o.client_id = u.user_id
+        WHERE o.order_id > $1
+        ORDER BY o.order_id
+        LIMIT $2
+    """,
+    "orders.count": "SELECT COUNT(*) FROM orders",
+    # Готовый JSON ответа собирается в базе: заказ с позициями за один запрос.
+    # $2 — client_id для проверки принадлежности или NULL
+    "orders.get_json": """
+        SELECT json_build_object(
+            'order_id', o.order_id,
+            'username', u.username,
+            'order_date', o.order_date,
+            'status', o.status,
+            'items', COALESCE((
+                SELECT json_agg(json_build_object(
+                    'item_id', oi.item_id,
+                    'order_id', oi.order_id,
+                    'product_id', oi.product_id,
+                    'product_name', p.name,
+                    'article', p.article,
+                    'quantity', oi.quantity,
+                    'price', p.price
+                ) ORDER BY oi.item_id)
+                FROM order_items oi
+                JOIN products p ON oi.product_id = p.product_id
+                WHERE oi.order_id = o.order_id
+            ), '[]'::json)
+        )::text
+        FROM orders o
+        JOIN users u ON o.client_id = u.user_id
+        WHERE o.order_id = $1 AND ($2::int IS NULL OR o.client_id = $2)
+    """,
+    "orders.get_all_json": """
+        SELECT COALESCE(json_agg(json_build_object(
+            'order_id', o.order_id,
+            'username', u.username,
+            'order_date', o.order_date,
+            'status', o.status
+        ) ORDER BY o.order_id), '[]'::json)::text
+        FROM orders o
+        JOIN users u ON o.client_id = u.user_id
+    """,
+    "orders.get_by_client_json": """
+        SELECT COALESCE(json_agg(json_build_object(
+            'order_id', o.order_id,
+            'username', u.username,
+            'order_date', o.order_date,
+            'status', o.status
+        ) ORDER BY o.order_date DESC), '[]'::json)::text
+        FROM orders o
+        JOIN users u ON o.client_id = u.user_id
+        WHERE o.client_id = $1
+    """,
+    "orders.create": """
+        INSERT INTO orders (client_id, order_date, status)
+        VALUES ($1, NOW(), $2)
+        RETURNING order_id
+    """,
+    # Все позиции заказа одним запросом: $2 — product_id, $3 — количества
+    "orders.add_items": """
+        INSERT INTO order_items (order_id, product_id, quantity)
+        SELECT $1, item.product_id, item.quantity
+        FROM unnest($2::int[], $3::int[]) AS item(product_id, quantity)
+    """,
+    "orders.update_status": """
+        UPDATE orders
+        SET status = $1
+        WHERE order_id = $2
+        RETURNING order_id, client_id, order_date, status
+    """,
+    "orders.delete": "DELETE FROM orders WHERE order_id = $1",
+    "orders.delete_for_client": "DELETE FROM orders WHERE order_id = $1 AND client_id = $2",
+
+    # 🗃️ Инвентарь
+    "inventory.get_all": "SELECT * FROM inventory ORDER BY inventory_id",
+    "inventory.get_page": "SELECT * FROM inventory WHERE inventory_id > $1 ORDER BY inventory_id LIMIT $2",
+    "inventory.count": "SELECT COUNT(*) FROM inventory",
+    "inventory.get": "SELECT * FROM inventory WHERE inventory_id = $1",
+    "inventory.get_by_product": "SELECT * FROM inventory WHERE product_id = $1",
+    "inventory.create": """
+        INSERT INTO inventory (product_id, quantity, updated_at)
+        VALUES ($1, $2, NOW())
+        RETURNING *
+    """,
+
+    # ↩️ Возвраты
+    "returns.get_all": "SELECT * FROM returns ORDER BY return_id",
+    "returns.get_page": "SELECT * FROM returns WHERE return_id > $1 ORDER BY return_id LIMIT $2",
+    "returns.count": "SELECT COUNT(*) FROM returns",
+    "returns.get": "SELECT * FROM returns WHERE return_id = $1",
+    "returns.get_by_client": "SELECT * FROM returns WHERE client_id = $1 ORDER BY return_date DESC",
+    "returns.get_by_order": "SELECT * FROM returns WHERE order_id = $1 ORDER BY return_date DESC",
+    "returns.create": """
+        INSERT INTO returns (
+            order_id, client_id, return_date, description, status
+        ) VALUES (
+            $1, $2, $3, $4, $5
+        )
+        RETURNING *
+    """,
+    "returns.update_status": """
+        UPDATE returns
+        SET status = $1
+        WHERE return_id = $2
+        RETURNING *
+    """,
+    "returns.delete": "DELETE FROM returns WHERE return_id = $1",
+
+    # ✨ Индивидуальные заказы
+    "individual_orders.get_all": "SELECT * FROM individual_orders ORDER BY order_date DESC",
+    "individual_orders.get_all_by_status": """
+        SELECT * FROM individual_orders WHERE status = $1 ORDER BY order_date DESC
+    """,
+    # Страницы по (order_date, order_id) от новых к старым
+    "individual_orders.get_page": """
+        SELECT * FROM individual_orders
+        WHERE (order_date, order_id) < ($1, $2)
+        ORDER BY order_date DESC, order_id DESC
+        LIMIT $3
+    """,
+    "individual_orders.get_page_by_status": """
+        SELECT * FROM individual_orders
+        WHERE status = $4 AND (order_date, order_id) < ($1, $2)
+        ORDER BY order_date DESC, order_id DESC
+        LIMIT $3
+    """,
+    "individual_orders.count": "SELECT COUNT(*) FROM individual_orders",
+    "individual_orders.count_by_status": "SELECT COUNT(*) FROM individual_orders WHERE status = $1",
+    "individual_orders.get": "SELECT * FROM individual_orders WHERE order_id = $1",
+    "individual_orders.get_by_client": """
+        SELECT * FROM individual_orders WHERE client_id = $1 ORDER BY order_date DESC
+    """,
+    "individual_orders.get_by_client_status": """
+        SELECT * FROM individual_orders WHERE client_id = $1 AND status = $2 ORDER BY order_date DESC
+    """,
+    "individual_orders.create": """
+        INSERT INTO individual_orders (
+            client_id, order_date, status, description,
+            total_amount, delivery_address, contact_phone
+        ) VALUES (
+            $1, $2, $3, $4, $5, $6, $7
+        )
+        RETURNING *
+    """,
+    "individual_orders.update_status": """
+        UPDATE individual_orders
+        SET status = $1
+        WHERE order_id = $2
+        RETURNING *
+    """,
+    "individual_orders.delete": "DELETE FROM individual_orders WHERE order_id = $1",
+}
+
+# Статистика вызовов: имя запроса -> [количество вызовов, суммарное время в секундах]
+_stats = defaultdict(lambda: [0, 0.0])
+
+
+def record_call(name, elapsed):
+    stat = _stats[name]
+    stat[0] += 1
+    stat[1] += elapsed
+
+
+def get_statement_stats():
+    """Статистика по каждому запросу реестра, самые затратные — первыми."""
+    result = []
+    for name in STATEMENTS:
+        calls, total = _stats.get(name, (0, 0.0))
+        result.append({
+            "name": name,
+            "calls": calls,
+            "total_ms": round(total * 1000, 3),
+            "avg_ms": round(total * 1000 / calls, 3) if calls else 0.0,
+        })
+    result.sort(key=lambda item: item["total_ms"], reverse=True)
+    return result
@@ -0,0 +1,91 @@
+"""Пакетное изменение остатков товаров.
+
+Строки товаров блокируются в порядке product_id (SELECT ... FOR UPDATE),
+поэтому параллельные пакеты с пересекающимися товарами ждут друг друга,
+а не попадают во взаимную блокировку. Проверка и изменение остатка
+выполняются в одной транзакции — продать больше, чем есть, нельзя.
+
+Каждое изменение остатка попадает в журнал stock_movements триггером на
+products (миграция 8). Причину изменения задаёт set_movement_reason.
+"""
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# На сколько месяцев вперёд держать готовые секции журнала
+STOCK_MOVEMENT_MONTHS_AHEAD = int(os.getenv("STOCK_MOVEMENT_MONTHS_AHEAD", "3"))
+STOCK_MOVEMENT_MAINTENANCE_INTERVAL = 24 * 60 * 60
+
+
+def merge_amounts(items):
+    """Складывает изменения по одному товару: [(product_id, amount), ...] -> {product_id: amount}."""
+    amounts = OrderedDict()
+    for product_id, amount in items:
+        amounts[product_id] = amounts.get(product_id, 0) + amount
+    return amounts
+
+
+async def adjust_stock_batch(connection, amounts, atomic=True):
+    """Изменяет остатки по словарю {product_id: amount}.
+
+    Должна вызываться внутри транзакции. Возвращает (applied, results), где
+    results — список {"product_id", "amount", "stock_quantity", "status"} со
+    статусом "ok", "insufficient" или "not_found". При atomic=True остатки
+    меняются только если все позиции проходят, иначе применяются только
+    успешные.
+    """
+    product_ids = sorted(amounts)
+    locked = {
+        row["product_id"]: row["stock_quantity"]
+        for row in await connection.fetch_named("products.lock_stock", product_ids)
+    }
+
+    results = []
+    for product_id in product_ids:
+        amount = amounts[product_id]
+        current = locked.get(product_id)
+        if current is None:
+            status = "not_found"
+        elif current + amount < 0:
+            status = "insufficient"
+        else:
+            status = "ok"
+        results.append({"product_id": product_id, "amount": amount, "stock_quantity": current, "status": status})
+
+    accepted = [item for item in results if item["status"] == "ok"]
+    applied = bool(accepted) and (not atomic or len(accepted) == len(results))
+    if applied:
+        rows = await connection.fetch_named(
+            "products.adjust_stock_many",
+            [item["product_id"] for item in accepted],
+            [item["amount"] for item in accepted],
+        )
+        new_quantities = {row["product_id"]: row["stock_quantity"] for row in rows}
+        for item in accepted:
+            item["stock_quantity"] = new_quantities[item["product_id"]]
+    return applied, results
+
+
+async def set_movement_reason(connection, reason):
+    """Причина для записей журнала до конца текущей транзакции."""
+    await connection.fetchval_named("stock_movements.set_reason", reason)
+
+
+async def ensure_movement_partitions(pool):
+    async with pool.acquire() as connection:
+        created = await connection.fetchval_named("stock_movements.ensure_partitions", STOCK_MOVEMENT_MONTHS_AHEAD)
+    if created:
+        logger.info("Created %s stock movement partition(s)", created)
+
+
+async def partition_maintenance_loop(pool):
+    """Раз в сутки создаёт секции журнала на месяцы вперёд."""
+    while True:
+        try:
+            await ensure_movement_partitions(pool)
+        except Exception:
+            logger.exception("Stock movement partition maintenance failed")
+        await asyncio.sleep(STOCK_MOVEMENT_MAINTENANCE_INTERVAL)
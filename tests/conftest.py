@@ -0,0 +1,112 @@
+"""Общие фикстуры тестов API.
+
+Тесты работают с настоящей базой PostgreSQL из TEST_DATABASE_URL: схема
+public в ней пересоздаётся перед запуском, поэтому рабочую базу
+указывать нельзя. Без TEST_DATABASE_URL тесты пропускаются.
+
+    TEST_DATABASE_URL=postgresql://postgres@localhost/jewerly_test python -m pytest -q
+"""
+import asyncio
+import io
+import itertools
+import os
+import sys
+import tempfile
+
+import asyncpg
+import pytest
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if TEST_DATABASE_URL:
+    # Настройки читаются модулями при импорте — до импорта main
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+    os.environ["DATABASE_REPLICA_URLS"] = ""
+    os.environ["IMAGE_STORE_DIR"] = tempfile.mkdtemp(prefix="jewerly_images_")
+
+
+class Database:
+    """Прямые запросы к тестовой базе — проверка состояния после запроса к API."""
+
+    def __init__(self, dsn):
+        self.dsn = dsn
+
+    async def _run(self, method, sql, *args):
+        connection = await asyncpg.connect(self.dsn)
+        try:
+            return await getattr(connection, method)(sql, *args)
+        finally:
+            await connection.close()
+
+    def fetch(self, sql, *args):
+        return asyncio.run(self._run("fetch", sql, *args))
+
+    def fetchrow(self, sql, *args):
+        return asyncio.run(self._run("fetchrow", sql, *args))
+
+    def fetchval(self, sql, *args):
+        return asyncio.run(self._run("fetchval", sql, *args))
+
+    def execute(self, sql, *args):
+        return asyncio.run(self._run("execute", sql, *args))
+
+
+@pytest.fixture(scope="session")
+def db():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    database = Database(TEST_DATABASE_URL)
+    database.execute("DROP SCHEMA public CASCADE; CREATE SCHEMA public;")
+    return database
+
+
+@pytest.fixture(scope="session")
+def client(db):
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+_numbers = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def user_id(client):
+    response = client.post("/create/users", json={"username": "test_client", "password": "secret"})
+    assert response.status_code == 200, response.text
+    return response.json()["user_id"]
+
+
+@pytest.fixture(scope="session")
+def image_id(client):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (40, 30), (180, 150, 40)).save(buffer, "PNG")
+    response = client.post("/images/upload/", files={"file": ("ring.png", buffer.getvalue(), "image/png")})
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+@pytest.fixture
+def make_product(client, image_id):
+    """Создаёт товар с уникальным артикулом; возвращает его JSON."""
+
+    def make(stock_quantity=10, price=100, **fields):
+        number = next(_numbers)
+        data = dict(name=f"Кольцо {number}", article=f"T-{number}", type="Кольцо", material="Золото",
+                    insert_type="Нет", weight=2.5, price=price, stock_quantity=stock_quantity, image_id=image_id)
+        data.update(fields)
+        response = client.post("/products/create", json=data)
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    return make
+
+
+def next_article(prefix="T"):
+    return f"{prefix}-{next(_numbers)}"
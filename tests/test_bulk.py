@@ -0,0 +1,97 @@
+"""Массовая загрузка товаров (/products/bulk, /products/bulk/upload)."""
+import io
+
+from openpyxl import Workbook
+
+from conftest import next_article
+
+
+def _row(image_id, article, **fields):
+    row = dict(name="Серьги", article=article, type="Серьги", material="Серебро", insert_type="Нет",
+               weight=1.5, price=50, stock_quantity=3, image_id=image_id)
+    row.update(fields)
+    return row
+
+
+def test_bulk_inserts_valid_rows_and_reports_errors(client, db, image_id, make_product):
+    existing = make_product(stock_quantity=1, price=10)
+    new_article = next_article("BK")
+    rows = [
+        _row(image_id, new_article),
+        _row(image_id, existing["article"], price=77, stock_quantity=9),
+        _row(image_id, next_article("BK"), weight="много"),
+        _row(image_id, new_article, name="Повтор"),
+        _row(999999, next_article("BK")),
+    ]
+
+    response = client.post("/products/bulk", json=rows)
+
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert (result["inserted"], result["updated"]) == (1, 1)
+    assert [(item["row"], item["status"]) for item in result["items"]] == [(1, "inserted"), (2, "updated")]
+    assert [error["row"] for error in result["errors"]] == [3, 4, 5]
+    assert "Duplicate article" in result["errors"][1]["errors"][0]
+    assert "image 999999 not found" in result["errors"][2]["errors"][0]
+
+    inserted = db.fetchrow("SELECT name, stock_quantity FROM products WHERE article = $1", new_article)
+    assert (inserted["name"], inserted["stock_quantity"]) == ("Серьги", 3)
+    updated = db.fetchrow("SELECT price, stock_quantity FROM products WHERE article = $1", existing["article"])
+    assert (updated["price"], updated["stock_quantity"]) == (77, 9)
+    assert db.fetchval("SELECT COUNT(*) FROM products WHERE article = ANY($1::text[])",
+                       [rows[2]["article"], rows[4]["article"]]) == 0
+
+
+def test_bulk_numeric_article_in_json_is_a_row_error(client, db, image_id):
+    response = client.post("/products/bulk", json=[_row(image_id, 12345)])
+
+    assert response.status_code == 200, response.text
+    assert response.json()["errors"][0]["article"] == "12345"
+    assert db.fetchval("SELECT COUNT(*) FROM products WHERE article = '12345'") == 0
+
+
+def test_bulk_upload_xlsx_with_numeric_article(client, db, image_id):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["name", "article", "type", "material", "insert_type", "weight", "price", "stock_quantity",
+                  "image_id"])
+    sheet.append(["Кулон", 912345, "Кулон", "Золото", "Нет", 2, 300, 4, image_id])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+
+    response = client.post("/products/bulk/upload", files={"file": ("products.xlsx", buffer.getvalue())})
+
+    assert response.status_code == 200, response.text
+    assert response.json()["inserted"] == 1
+    row = db.fetchrow("SELECT name, stock_quantity FROM products WHERE article = '912345'")
+    assert (row["name"], row["stock_quantity"]) == ("Кулон", 4)
+
+
+def test_bulk_upload_csv_with_decimal_comma(client, db, image_id):
+    article = next_article("CSV")
+    body = ("name;article;type;material;insert_type;weight;price;stock_quantity;image_id\n"
+            f"Браслет;{article};Браслет;Серебро;Нет;3,5;120,50;2;{image_id}\n")
+
+    response = client.post("/products/bulk/upload", files={"file": ("products.csv", body.encode("cp1251"))})
+
+    assert response.status_code == 200, response.text
+    row = db.fetchrow("SELECT weight, price FROM products WHERE article = $1", article)
+    assert (float(row["weight"]), float(row["price"])) == (3.5, 120.5)
+
+
+def test_bulk_runs_through_registry(client, db, image_id):
+    from statements import get_statement_stats
+
+    calls = {row["name"]: row["calls"] for row in get_statement_stats()}
+    articles = [next_article("BK"), next_article("BK")]
+
+    # Повторная загрузка на том же соединении использует уже подготовленный запрос к новой временной таблице
+    for article in articles:
+        response = client.post("/products/bulk", json=[_row(image_id, article)])
+        assert response.status_code == 200, response.text
+        assert response.json()["inserted"] == 1
+
+    after = {row["name"]: row["calls"] for row in get_statement_stats()}
+    assert after["products.bulk_staging"] == calls["products.bulk_staging"] + 2
+    assert after["products.bulk_upsert"] == calls["products.bulk_upsert"] + 2
+    assert db.fetchval("SELECT COUNT(*) FROM products WHERE article = ANY($1::text[])", articles) == 2
@@ -0,0 +1,26 @@
+"""Разбор пачки изображений в окнах каталога (нужны PySide6 и requests)."""
+import pytest
+
+pytest.importorskip("PySide6")
+pytest.importorskip("requests")
+
+from UI.catalog_api import iter_image_batch
+
+
+def test_iter_image_batch_reads_server_response(client, db, image_id):
+    response = client.get("/images/batch", params={"ids": f"{image_id},999999"})
+
+    parts = list(iter_image_batch(response.headers["content-type"], response.content))
+
+    assert [part_id for part_id, _ in parts] == [image_id]
+    assert len(parts[0][1]) == db.fetchval("SELECT size FROM images WHERE image_id = $1", image_id)
+    assert response.headers["x-missing-images"] == "999999"
+
+
+def test_iter_image_batch_stops_on_truncated_part():
+    body = b'--abc\r\nContent-Length: 3\r\nX-Image-Id: 7\r\n\r\nxyz\r\n--abc\r\nContent-Len'
+    parts = iter_image_batch('multipart/mixed; boundary="abc"', body)
+
+    assert next(parts) == (7, b"xyz")
+    with pytest.raises(ValueError):
+        next(parts)
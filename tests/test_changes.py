@@ -0,0 +1,43 @@
+"""Синхронизация каталога по версиям (/products/changes)."""
+import msgpack
+
+
+def test_changes_returns_integer_version(client):
+    response = client.get("/products/changes")
+
+    assert response.status_code == 200, response.text
+    assert type(response.json()["version"]) is int
+    packed = msgpack.unpackb(client.get("/products/changes", headers={"Accept": "application/msgpack"}).content)
+    assert type(packed["version"]) is int
+
+
+def test_changes_since_version_returns_updates_and_tombstones(client, db, make_product):
+    kept = make_product()
+    removed = make_product()
+    version = client.get("/products/changes").json()["version"]
+
+    assert client.patch(f"/products/update-stock/{kept['product_id']}", json={"amount": 5}).status_code == 200
+    assert client.delete(f"/products/delete/{removed['product_id']}").status_code == 200
+    added = make_product()
+
+    response = client.get("/products/changes", params={"since": version})
+
+    assert response.status_code == 200, response.text
+    changes = response.json()
+    changed = {product["product_id"]: product for product in changes["changed"]}
+    assert set(changed) >= {kept["product_id"], added["product_id"]}
+    assert removed["product_id"] not in changed
+    assert changed[kept["product_id"]]["stock_quantity"] == kept["stock_quantity"] + 5
+    assert changes["deleted"] == [removed["product_id"]]
+    assert changes["version"] > version
+
+    # Состояние базы совпадает с ответом: товар удалён, надгробие с версией после since
+    assert db.fetchval("SELECT COUNT(*) FROM products WHERE product_id = $1", removed["product_id"]) == 0
+    assert db.fetchval("SELECT change_version FROM product_tombstones WHERE product_id = $1",
+                       removed["product_id"]) > version
+    assert db.fetchval("SELECT change_version FROM products WHERE product_id = $1", kept["product_id"]) > version
+
+    # С новой версии изменений нет
+    again = client.get("/products/changes", params={"since": changes["version"]}).json()
+    assert (again["changed"], again["deleted"]) == ([], [])
+
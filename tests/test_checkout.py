@@ -0,0 +1,66 @@
+"""Оформление заказа со списанием остатков (/orders/checkout)."""
+
+
+def _stock(db, product_id):
+    return db.fetchval("SELECT stock_quantity FROM products WHERE product_id = $1", product_id)
+
+
+def test_checkout_shortage_rolls_back_order(client, db, user_id, make_product):
+    available = make_product(stock_quantity=5)
+    scarce = make_product(stock_quantity=1)
+    orders = db.fetchval("SELECT COUNT(*) FROM orders")
+    order_items = db.fetchval("SELECT COUNT(*) FROM order_items")
+
+    response = client.post("/orders/checkout", json={
+        "client_id": user_id, "status": "Новый",
+        "items": [{"product_id": available["product_id"], "quantity": 2},
+                  {"product_id": scarce["product_id"], "quantity": 2}],
+    })
+
+    assert response.status_code == 409, response.text
+    detail = response.json()["detail"]
+    assert detail["items"] == [
+        {"product_id": scarce["product_id"], "quantity": 2, "stock_quantity": 1, "status": "insufficient"},
+    ]
+    assert db.fetchval("SELECT COUNT(*) FROM orders") == orders
+    assert db.fetchval("SELECT COUNT(*) FROM order_items") == order_items
+    assert (_stock(db, available["product_id"]), _stock(db, scarce["product_id"])) == (5, 1)
+    assert db.fetchval("SELECT COUNT(*) FROM stock_movements WHERE reason LIKE 'Order #%' "
+                       "AND product_id = $1", available["product_id"]) == 0
+
+
+def test_checkout_creates_order_and_writes_off_stock(client, db, user_id, make_product):
+    first = make_product(stock_quantity=5)
+    second = make_product(stock_quantity=3)
+
+    response = client.post("/orders/checkout", json={
+        "client_id": user_id, "status": "Новый",
+        "items": [{"product_id": first["product_id"], "quantity": 1},
+                  {"product_id": second["product_id"], "quantity": 3},
+                  {"product_id": first["product_id"], "quantity": 1}],
+    })
+
+    assert response.status_code == 200, response.text
+    order_id = response.json()["order_id"]
+    assert db.fetchrow("SELECT client_id, status FROM orders WHERE order_id = $1", order_id) == (user_id, "Новый")
+    items = db.fetch("SELECT product_id, quantity FROM order_items WHERE order_id = $1", order_id)
+    assert {row["product_id"]: row["quantity"] for row in items} == {first["product_id"]: 2, second["product_id"]: 3}
+    assert (_stock(db, first["product_id"]), _stock(db, second["product_id"])) == (3, 0)
+    movements = db.fetch("SELECT product_id, amount, stock_after FROM stock_movements WHERE reason = $1",
+                         f"Order #{order_id}")
+    assert sorted(tuple(row) for row in movements) == sorted([
+        (first["product_id"], -2, 3), (second["product_id"], -3, 0),
+    ])
+
+
+def test_checkout_for_unknown_client_is_404(client, db, make_product):
+    product = make_product(stock_quantity=2)
+    orders = db.fetchval("SELECT COUNT(*) FROM orders")
+
+    response = client.post("/orders/checkout", json={
+        "client_id": 999999, "status": "Новый", "items": [{"product_id": product["product_id"], "quantity": 1}],
+    })
+
+    assert response.status_code == 404, response.text
+    assert db.fetchval("SELECT COUNT(*) FROM orders") == orders
+    assert _stock(db, product["product_id"]) == 2
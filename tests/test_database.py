@@ -0,0 +1,37 @@
+"""Выбор пула для чтения после записи (read-your-writes)."""
+from types import SimpleNamespace
+
+import database
+
+
+def _request(client_id):
+    return SimpleNamespace(headers={"X-Client-Id": client_id}, client=None)
+
+
+def test_writers_are_not_tracked_without_replicas(monkeypatch):
+    monkeypatch.setattr(database, "DATABASE_REPLICA_URLS", [])
+    monkeypatch.setattr(database, "_recent_writers", {})
+
+    for number in range(100):
+        database._mark_writer(_request(f"client-{number}"))
+
+    assert database._recent_writers == {}
+
+
+def test_expired_writers_are_dropped_on_next_write(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(database.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(database, "DATABASE_REPLICA_URLS", ["postgresql://replica/db"])
+    monkeypatch.setattr(database, "DB_READ_YOUR_WRITES_WINDOW", 5)
+    monkeypatch.setattr(database, "_recent_writers", {})
+
+    database._mark_writer(_request("a"))
+    now[0] += 3
+    database._mark_writer(_request("b"))
+    database._mark_writer(_request("a"))
+    assert list(database._recent_writers) == ["b", "a"]
+
+    now[0] += 6
+    database._mark_writer(_request("c"))
+
+    assert list(database._recent_writers) == ["c"]
@@ -0,0 +1,36 @@
+"""Потоковая выгрузка CSV (/export)."""
+import asyncio
+
+import pytest
+
+
+def test_export_uses_its_own_timeout(client, make_product, monkeypatch):
+    from database import StoreConnection
+    from routers import export
+
+    product = make_product()
+    timeouts = []
+    copy_from_query = StoreConnection.copy_from_query
+
+    async def tracked(self, *args, **kwargs):
+        timeouts.append(kwargs.get("timeout"))
+        return await copy_from_query(self, *args, **kwargs)
+
+    monkeypatch.setattr(StoreConnection, "copy_from_query", tracked)
+    response = client.get("/export/products.csv")
+
+    assert response.status_code == 200, response.text
+    assert product["article"] in response.text
+    # Без явного значения asyncpg ограничил бы выгрузку DB_COMMAND_TIMEOUT
+    assert timeouts == [export.EXPORT_TIMEOUT]
+
+
+def test_export_failure_after_headers_aborts_the_response(client, make_product, monkeypatch):
+    from routers import export
+
+    make_product()
+    monkeypatch.setattr(export, "EXPORT_TIMEOUT", 1e-6)
+
+    # BOM уходит клиенту до ошибки COPY: ответ не должен завершиться как целый файл
+    with pytest.raises(asyncio.TimeoutError):
+        client.get("/export/products.csv", params={"bom": True})
@@ -0,0 +1,76 @@
+"""Загрузка и выдача изображений."""
+import io
+
+from PIL import Image
+
+
+def _png(size=(40, 30), color=(10, 120, 200)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def _upload(client, data, filename, content_type):
+    response = client.post("/images/upload/", files={"file": (filename, data, content_type)})
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def test_upload_rejected_by_content_length_before_form_is_read(client, db, monkeypatch):
+    from routers import images
+
+    # Лимит меньше файла только у проверки заголовка: 413 приходит до разбора формы
+    monkeypatch.setattr(images, "IMAGE_MAX_REQUEST_SIZE", 100)
+    count = db.fetchval("SELECT COUNT(*) FROM images")
+
+    response = client.post("/images/upload/", files={"file": ("big.png", _png(color=(1, 2, 3)), "image/png")})
+
+    assert response.status_code == 413, response.text
+    assert db.fetchval("SELECT COUNT(*) FROM images") == count
+
+
+def test_upload_within_limit_is_saved(client, db):
+    response = client.post("/images/upload/", files={"file": ("ok.png", _png(color=(4, 5, 6)), "image/png")})
+
+    assert response.status_code == 200, response.text
+    image_id = response.json()["id"]
+    assert db.fetchval("SELECT content_type FROM images WHERE image_id = $1", image_id) == "image/png"
+
+
+def test_etag_names_original_format_when_webp_is_not_produced(client, db):
+    buffer = io.BytesIO()
+    Image.new("RGB", (20, 20), (7, 8, 9)).save(buffer, "GIF")
+    image_id = _upload(client, buffer.getvalue(), "ring.gif", "image/gif")
+    sha256 = db.fetchval("SELECT sha256 FROM images WHERE image_id = $1", image_id)
+
+    # GIF полного размера не перекодируется в WebP даже для клиента, принимающего WebP
+    response = client.get(f"/images/{image_id}", headers={"Accept": "image/webp,*/*"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/gif"
+    assert response.headers["etag"] == f'"{sha256}"'
+    assert client.get(f"/images/{image_id}", headers={"Accept": "*/*"}).headers["etag"] == response.headers["etag"]
+
+
+def test_etag_names_original_when_rendition_fails(client, db, monkeypatch):
+    from routers import images
+
+    image_id = _upload(client, _png(color=(11, 12, 13)), "ring.png", "image/png")
+    sha256 = db.fetchval("SELECT sha256 FROM images WHERE image_id = $1", image_id)
+
+    async def broken_rendition(*args):
+        raise OSError("cannot identify image file")
+
+    monkeypatch.setattr(images, "ensure_rendition", broken_rendition)
+    response = client.get(f"/images/{image_id}", headers={"Accept": "image/webp"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["etag"] == f'"{sha256}"'
+    revalidated = client.get(f"/images/{image_id}", headers={"Accept": "image/webp", "If-None-Match": response.headers["etag"]})
+    assert revalidated.status_code == 304
+
+    monkeypatch.undo()
+    webp = client.get(f"/images/{image_id}", headers={"Accept": "image/webp"})
+    assert webp.headers["content-type"] == "image/webp"
+    assert webp.headers["etag"] == f'"{sha256}.webp"'
@@ -0,0 +1,55 @@
+"""Миграции схемы на базе с данными исходной схемы."""
+import asyncio
+from urllib.parse import urlsplit, urlunsplit
+
+import asyncpg
+import pytest
+
+from conftest import TEST_DATABASE_URL
+
+MIGRATION_TEST_DATABASE = "jewerly_test_migrations"
+
+
+@pytest.fixture
+def empty_dsn(db):
+    db.execute(f"DROP DATABASE IF EXISTS {MIGRATION_TEST_DATABASE}")
+    db.execute(f"CREATE DATABASE {MIGRATION_TEST_DATABASE}")
+    yield urlunsplit(urlsplit(TEST_DATABASE_URL)._replace(path="/" + MIGRATION_TEST_DATABASE))
+    db.execute(f"DROP DATABASE IF EXISTS {MIGRATION_TEST_DATABASE}")
+
+
+def test_duplicate_articles_stop_unique_article_migration(empty_dsn):
+    from migrations import MIGRATIONS, migrate
+
+    async def run():
+        connection = await asyncpg.connect(empty_dsn)
+        try:
+            # База, созданная до уникальных артикулов, с повтором
+            await connection.execute(MIGRATIONS[0].sql)
+            await connection.execute("""
+                INSERT INTO products (name, article, type, material, insert_type, weight, price)
+                VALUES ('Кольцо', 'A-1', 'Кольцо', 'Золото', 'Нет', 1, 10),
+                       ('Кольцо 2', 'A-1', 'Кольцо', 'Золото', 'Нет', 1, 10),
+                       ('Серьги', 'B-1', 'Серьги', 'Серебро', 'Нет', 1, 10)
+            """)
+            await connection.execute("""
+                CREATE TABLE schema_migrations (
+                    version INTEGER PRIMARY KEY, description TEXT NOT NULL, applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+                );
+                INSERT INTO schema_migrations (version, description) VALUES (1, 'Исходная схема');
+            """)
+
+            with pytest.raises(asyncpg.RaiseError) as error:
+                await migrate(empty_dsn)
+
+            versions = [row["version"] for row in await connection.fetch("SELECT version FROM schema_migrations")]
+            return error.value.args[0], error.value.hint, max(versions)
+        finally:
+            await connection.close()
+
+    message, hint, last_version = asyncio.run(run())
+
+    assert message == "Duplicate product articles: 'A-1' (product_id 1, 2)"
+    assert "unique" in hint
+    # Миграции до уникального артикула применены, сама она откатилась
+    assert last_version == 6
@@ -0,0 +1,52 @@
+"""Реестр подготовленных запросов (database.StoreConnection)."""
+import asyncio
+
+import asyncpg
+
+from conftest import TEST_DATABASE_URL
+
+
+def test_dynamic_queries_do_not_evict_registry_statements(client):
+    from database import StoreConnection
+    from statements import STATEMENTS, get_statement_stats
+
+    async def run():
+        # Кэш только на два запроса: любой динамический запрос в кэше вытеснил бы реестр
+        connection = await asyncpg.connect(
+            TEST_DATABASE_URL, connection_class=StoreConnection, statement_cache_size=2
+        )
+        try:
+            # Первый запрос на новом соединении открывает транзакцию с уровнем изоляции
+            async with connection.transaction(isolation="repeatable_read", readonly=True):
+                assert await connection.fetchval_named("products.count") >= 0
+
+            for number in range(10):
+                assert await connection.fetchval_dynamic(f"SELECT {number} + $1::int", 1) == number + 1
+            assert await connection.fetchrow_dynamic("SELECT 1 AS one") == (1,)
+
+            prepared = await connection.fetch_dynamic("SELECT statement FROM pg_prepared_statements")
+            return {row["statement"] for row in prepared}
+        finally:
+            await connection.close()
+
+    calls = {row["name"]: row["calls"] for row in get_statement_stats()}
+    prepared = asyncio.run(run())
+
+    assert STATEMENTS["products.count"] in prepared
+    after = {row["name"]: row["calls"] for row in get_statement_stats()}
+    assert after["products.count"] == calls["products.count"] + 1
+
+
+def test_search_runs_through_registry(client, db, make_product):
+    from statements import get_statement_stats
+
+    product = make_product(name="Кольцо с аметистом")
+    has_trigram = db.fetchval("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")
+    name = "products.search_trigram" if has_trigram else "products.search_plain"
+    calls = {row["name"]: row["calls"] for row in get_statement_stats()}[name]
+
+    response = client.get("/products/search", params={"q": "аметист"})
+
+    assert response.status_code == 200, response.text
+    assert [row["product_id"] for row in response.json()] == [product["product_id"]]
+    assert {row["name"]: row["calls"] for row in get_statement_stats()}[name] == calls + 1
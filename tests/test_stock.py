@@ -0,0 +1,57 @@
+"""Пакетное изменение остатков (/products/stock/batch)."""
+
+
+def _stock(db, *product_ids):
+    rows = db.fetch("SELECT product_id, stock_quantity FROM products WHERE product_id = ANY($1::int[])",
+                    list(product_ids))
+    return {row["product_id"]: row["stock_quantity"] for row in rows}
+
+
+def _movements(db, product_id):
+    # Первое движение — начальный остаток при создании товара
+    rows = db.fetch("SELECT amount, stock_after, reason FROM stock_movements WHERE product_id = $1 "
+                    "ORDER BY movement_id", product_id)
+    return [tuple(row) for row in rows[1:]]
+
+
+def test_atomic_batch_with_shortage_changes_nothing(client, db, make_product):
+    first = make_product(stock_quantity=5)
+    second = make_product(stock_quantity=1)
+    ids = first["product_id"], second["product_id"]
+
+    response = client.post("/products/stock/batch", json={
+        "items": [{"product_id": ids[0], "amount": -2}, {"product_id": ids[1], "amount": -3},
+                  {"product_id": 999999, "amount": 1}],
+        "reason": "Инвентаризация",
+    })
+
+    assert response.status_code == 409, response.text
+    detail = response.json()["detail"]
+    assert [(item["product_id"], item["status"]) for item in detail["items"]] == [
+        (ids[1], "insufficient"), (999999, "not_found"),
+    ]
+    assert _stock(db, *ids) == {ids[0]: 5, ids[1]: 1}
+    assert _movements(db, ids[0]) == []
+
+
+def test_non_atomic_batch_applies_only_available_items(client, db, make_product):
+    first = make_product(stock_quantity=5)
+    second = make_product(stock_quantity=1)
+    ids = first["product_id"], second["product_id"]
+
+    response = client.post("/products/stock/batch", json={
+        "items": [{"product_id": ids[0], "amount": -2}, {"product_id": ids[1], "amount": -3},
+                  {"product_id": ids[0], "amount": -1}],
+        "reason": "Списание брака",
+        "atomic": False,
+    })
+
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert result["applied"] is True
+    assert {item["product_id"]: (item["status"], item["stock_quantity"]) for item in result["items"]} == {
+        ids[0]: ("ok", 2), ids[1]: ("insufficient", 1),
+    }
+    assert _stock(db, *ids) == {ids[0]: 2, ids[1]: 1}
+    assert _movements(db, ids[0]) == [(-3, 2, "Списание брака")]
+    assert _movements(db, ids[1]) == []
@@ -0,0 +1,21 @@
+"""Окно магазина: сообщения по ответам API (нужны PySide6 и requests)."""
+import pytest
+
+pytest.importorskip("PySide6")
+pytest.importorskip("requests")
+
+from UI.jewerly_store import stock_problems_message
+
+
+def test_stock_problems_message_names_short_items():
+    products = {1: {"product_id": 1, "name": "Кольцо"}}
+    items = [
+        {"product_id": 1, "quantity": 3, "stock_quantity": 1, "status": "insufficient"},
+        {"product_id": 7, "quantity": 1, "stock_quantity": None, "status": "not_found"},
+    ]
+
+    assert stock_problems_message(items, products) == (
+        "Недостаточно товара на складе:\n"
+        "Кольцо: в наличии 1, нужно 3\n"
+        "товар #7: товар не найден"
+    )
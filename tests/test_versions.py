@@ -0,0 +1,49 @@
+"""Версии ресурсов для ETag: номера транзакций вместо общего счётчика."""
+import asyncio
+
+import asyncpg
+
+from conftest import TEST_DATABASE_URL
+
+
+def test_etag_changes_after_update_and_delete(client, make_product):
+    product = make_product()
+    etag = client.get("/products/get/all/").headers["etag"]
+    assert client.get("/products/get/all/", headers={"If-None-Match": etag}).status_code == 304
+
+    assert client.patch(f"/products/update-stock/{product['product_id']}", json={"amount": 1}).status_code == 200
+    updated = client.get("/products/get/all/", headers={"If-None-Match": etag})
+    assert updated.status_code == 200
+    assert updated.headers["etag"] != etag
+
+    assert client.delete(f"/products/delete/{product['product_id']}").status_code == 200
+    deleted = client.get("/products/get/all/", headers={"If-None-Match": updated.headers["etag"]})
+    assert deleted.status_code == 200
+    assert product["product_id"] not in {row["product_id"] for row in deleted.json()}
+
+
+def test_no_etag_while_older_transaction_is_open(client, db, make_product):
+    product = make_product()
+    loop = asyncio.new_event_loop()
+    connection = loop.run_until_complete(asyncpg.connect(TEST_DATABASE_URL))
+    try:
+        # Открытая транзакция получила номер раньше, чем следующее изменение товаров
+        transaction = connection.transaction()
+        loop.run_until_complete(transaction.start())
+        loop.run_until_complete(connection.fetchval("SELECT pg_current_xact_id()"))
+
+        assert client.patch(f"/products/update-stock/{product['product_id']}", json={"amount": 1}).status_code == 200
+        response = client.get("/products/get/all/")
+        assert response.status_code == 200
+        assert "etag" not in response.headers
+        # Неустойчивая версия не сохраняет снимок каталога: данные свежие
+        stock = {row["product_id"]: row["stock_quantity"] for row in response.json()}
+        assert stock[product["product_id"]] == product["stock_quantity"] + 1
+
+        loop.run_until_complete(transaction.rollback())
+    finally:
+        loop.run_until_complete(connection.close())
+        loop.close()
+
+    assert "etag" in client.get("/products/get/all/").headers
+    assert db.fetchval("SELECT to_regclass('resource_versions')") is None
@@ -0,0 +1,71 @@
+"""Версии ресурсов для условных GET-запросов (ETag / If-None-Match).
+
+Триггеры помечают каждую изменённую строку номером транзакции, а
+удаления записывают в журнал resource_deletions (см. миграцию 12).
+Версия ресурса — наибольший такой номер, поэтому она меняется вместе с
+данными, одинакова для всех воркеров API и не требует общей строки,
+которую блокировал бы каждый писатель. Пока не завершена транзакция с
+меньшим номером, версия неустойчива (None) — ответ отдаётся без ETag.
+"""
+import asyncio
+import hashlib
+import logging
+
+from fastapi import Response
+
+logger = logging.getLogger(__name__)
+
+DELETIONS_MAINTENANCE_INTERVAL = 24 * 60 * 60
+
+
+def make_etag(resource, version, request):
+    # Разные параметры запроса (страница, фильтры) — разные представления
+    variant = hashlib.blake2b(str(request.url.query).encode(), digest_size=6).hexdigest()
+    return f'"{resource}-{version}-{variant}"'
+
+
+def etag_matches(request, etag):
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+
+async def get_version(connection, *resources):
+    return await connection.fetchval_named("versions.get", list(resources))
+
+
+async def get_watermark(connection):
+    """Номер, до которого включительно все транзакции завершены (для синхронизации по since)."""
+    return await connection.fetchval_named("versions.watermark")
+
+
+def check_not_modified(request, response, resource, version):
+    """Проставляет ETag ответа. Возвращает 304, если у клиента актуальная версия,
+    иначе None — тогда список нужно отдать как обычно."""
+    response.headers["Cache-Control"] = "no-cache"
+    if version is None:
+        return None
+    etag = make_etag(resource, version, request)
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    response.headers["ETag"] = etag
+    return None
+
+
+async def prune_deletions(pool):
+    """Оставляет в журнале удалений только последнюю запись каждого ресурса."""
+    async with pool.acquire() as connection:
+        await connection.execute_named("versions.prune_deletions")
+
+
+async def deletions_maintenance_loop(pool):
+    """Раз в сутки чистит журнал удалений."""
+    while True:
+        try:
+            await prune_deletions(pool)
+        except Exception:
+            logger.exception("Resource deletions maintenance failed")
+        await asyncio.sleep(DELETIONS_MAINTENANCE_INTERVAL)